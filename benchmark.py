@@ -0,0 +1,277 @@
+"""
+基准测试：
+  extract: 对比旧版（多次打开、每页多次提取）和单次提取两种方式的吞吐（pages/sec）。
+  cache:   对比从pdf解析一篇论文和从解析缓存加载的耗时。
+  review:  用本地假LLM（固定延迟）对比串行、并发和并发+合并审阅的墙钟时间，不需要联网。
+  generate: 在本地生成合成论文pdf（多栏、多章节、带图片，标题样式可选）。
+  suite:   在合成语料上逐阶段计时，输出JSON：pages/sec、峰值RSS和各阶段延迟的p50/p90/p99，
+           可以把两次提交的结果对比来发现性能回退。
+
+用法:
+    python benchmark.py extract paper1.pdf paper2.pdf ... [--repeat 3]
+    python benchmark.py cache paper1.pdf paper2.pdf ...
+    python benchmark.py review [--papers 30] [--latency 0.2] [--workers 8]
+    python benchmark.py generate corpus/ [--papers 10] [--pages 12] [--figures 4]
+    python benchmark.py suite [--corpus corpus/] [--papers 10] [--output result.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import tempfile
+import time
+
+import fitz
+
+from fake_llm import FakeCompletion
+from paper_cache import PaperCache
+from pdf_parser import Paper, file_digest
+from synthetic_corpus import HEADING_STYLES, make_corpus
+from utils import review_by_chatgpt
+
+
+def legacy_extract(path):
+    # 复现旧版Paper的访问模式：get_title两次dict遍历，parse_pdf重新打开后
+    # text遍历一次，_get_all_page_index一次，_get_all_page两次
+    doc = fitz.open(path)
+    for _ in range(2):
+        for page in doc:
+            page.get_text("dict")
+    doc = fitz.open(path)
+    for _ in range(4):
+        for page in doc:
+            page.get_text()
+    page_count = len(doc)
+    doc.close()
+    return page_count
+
+
+def single_pass_extract(path):
+    paper = Paper(path, title='placeholder')
+    paper._load_pages()
+    return len(paper.text_list)
+
+
+def run(func, paths, repeat):
+    best = None
+    for _ in range(repeat):
+        pages = 0
+        start = time.perf_counter()
+        for path in paths:
+            pages += func(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return pages, best
+
+
+def bench_extract(args):
+    results = {}
+    for name, func in [("before", legacy_extract), ("after", single_pass_extract)]:
+        with contextlib.redirect_stdout(io.StringIO()):
+            pages, elapsed = run(func, args.paths, args.repeat)
+        results[name] = pages / elapsed
+        print(f"{name:>6}: {pages} pages in {elapsed:.3f}s -> {pages / elapsed:.1f} pages/sec")
+    print(f"speedup: {results['after'] / results['before']:.2f}x")
+
+
+def bench_cache(args):
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = PaperCache(cache_dir)
+        for path in args.paths:
+            key = cache.key(file_digest(path))
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                state = Paper(path).to_dict()
+            parse_time = time.perf_counter() - start
+            cache.put(key, state)
+            start = time.perf_counter()
+            Paper.from_dict(cache.get(key))
+            load_time = time.perf_counter() - start
+            print(f"{path}: parse {parse_time * 1000:.1f}ms, cached load {load_time * 1000:.2f}ms")
+
+
+def synthetic_papers(count):
+    # 不解析pdf，直接构造带章节内容的Paper，只测审阅流程本身
+    paper_list = []
+    for i in range(count):
+        paper = Paper(path=f"synthetic-{i}.pdf", title=f"Synthetic Paper {i}")
+        paper.section_text_dict = {
+            "Abstract": "We study synthetic benchmarks. " * 20,
+            "Method": "The method has several steps. " * 200,
+            "Conclusion": "It works on 3 datasets. " * 50,
+            "title": paper.title,
+        }
+        paper_list.append(paper)
+    return paper_list
+
+
+def bench_review(args):
+    paper_list = synthetic_papers(args.papers)
+    file_names = [f"synthetic-{i}" for i in range(args.papers)]
+    results = {}
+    for name, workers, combined in [("serial", 1, False), ("concurrent", args.workers, False),
+                                    ("combined", args.workers, True)]:
+        completion = FakeCompletion(latency=args.latency)
+        with tempfile.TemporaryDirectory() as export_path:
+            start = time.perf_counter()
+            review_by_chatgpt(paper_list, api_key='', key_word="Benchmark", export_path=export_path,
+                              file_format='txt', file_names=file_names, max_workers=workers,
+                              completion=completion, combined=combined)
+            elapsed = time.perf_counter() - start
+        results[name] = elapsed
+        print(f"{name:>10}: {args.papers} papers, {completion.calls} calls, "
+              f"max in flight {completion.max_in_flight}, {elapsed:.2f}s")
+    print(f"speedup: {results['serial'] / results['concurrent']:.2f}x concurrent, "
+          f"{results['serial'] / results['combined']:.2f}x concurrent + combined")
+
+
+def bench_generate(args):
+    paths = make_corpus(args.directory, papers=args.papers, pages=args.pages, figures=args.figures,
+                        heading_styles=args.styles, columns=args.columns, seed=args.seed)
+    for path in paths:
+        print(path)
+
+
+def percentiles(samples):
+    # 最近秩法求分位数，单位毫秒
+    ordered = sorted(samples)
+    result = {}
+    for name, q in [("p50", 50), ("p90", 90), ("p99", 99)]:
+        rank = max(1, -(-q * len(ordered) // 100))
+        result[name] = round(ordered[rank - 1] * 1000, 3)
+    result["mean"] = round(sum(ordered) / len(ordered) * 1000, 3)
+    return result
+
+
+def time_stages(path, image_dir):
+    # 按parse_pdf的顺序逐个阶段计时；"paper"是完整的Paper(path)构造，"paper_front"是只解析前几页的惰性构造
+    timings = {}
+
+    def timed(name, func):
+        start = time.perf_counter()
+        result = func()
+        timings[name] = time.perf_counter() - start
+        return result
+
+    paper = timed("paper", lambda: Paper(path))
+    timed("paper_front", lambda: Paper(path, lazy=True))
+    staged = Paper(path, title='placeholder')
+    timed("load_pages", staged._load_pages)
+    timed("get_title", staged.get_title)
+    staged.all_text = ''.join(staged.text_list)
+    staged.page_offsets = [0]
+    for text in staged.text_list[:-1]:
+        staged.page_offsets.append(staged.page_offsets[-1] + len(text))
+    staged.section_page_dict = timed("get_all_page_index", staged._get_all_page_index)
+    timed("get_all_page", staged._get_all_page)
+    timed("get_image_path", lambda: paper.get_image_path(image_dir))
+    return paper, len(staged.text_list), timings
+
+
+def bench_suite(args):
+    with tempfile.TemporaryDirectory() as work_dir:
+        if args.corpus and os.path.isdir(args.corpus) and os.listdir(args.corpus):
+            paths = sorted(os.path.join(args.corpus, name) for name in os.listdir(args.corpus)
+                           if name.lower().endswith(".pdf"))
+        else:
+            paths = make_corpus(args.corpus or os.path.join(work_dir, "corpus"), papers=args.papers,
+                                pages=args.pages, figures=args.figures, heading_styles=args.styles,
+                                columns=args.columns, seed=args.seed)
+        image_dir = os.path.join(work_dir, "images")
+        os.makedirs(image_dir)
+
+        samples = {}
+        papers = []
+        total_pages = 0
+        start = time.perf_counter()
+        for path in paths:
+            with contextlib.redirect_stdout(io.StringIO()):
+                paper, pages, timings = time_stages(path, image_dir)
+            papers.append(paper)
+            total_pages += pages
+            for name, elapsed in timings.items():
+                samples.setdefault(name, []).append(elapsed)
+        parse_elapsed = time.perf_counter() - start
+        parse_time = sum(samples["paper"])
+
+        completion = FakeCompletion(latency=args.latency)
+        start = time.perf_counter()
+        report_paths = review_by_chatgpt(papers, api_key='', key_word="Benchmark",
+                                         export_path=os.path.join(work_dir, "review"), file_format='txt',
+                                         max_workers=args.workers, completion=completion,
+                                         progress=lambda message: None)
+        review_elapsed = time.perf_counter() - start
+
+    result = {
+        "python": platform.python_version(),
+        "pymupdf": fitz.VersionBind,
+        "corpus": {"papers": len(paths), "pages": total_pages, "figures": args.figures,
+                   "columns": args.columns, "heading_styles": list(args.styles), "seed": args.seed},
+        "parse": {"seconds": round(parse_elapsed, 3), "pages_per_sec": round(total_pages / parse_time, 1)},
+        "stages_ms": {name: percentiles(values) for name, values in samples.items()},
+        "review": {"seconds": round(review_elapsed, 3), "reports": len(report_paths),
+                   "calls": completion.calls, "latency": args.latency, "workers": args.workers,
+                   "max_in_flight": completion.max_in_flight},
+        # Linux下ru_maxrss单位是KB，macOS下是字节
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                             / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1),
+    }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+def add_corpus_arguments(parser, papers):
+    parser.add_argument("--papers", type=int, default=papers, help="number of synthetic papers")
+    parser.add_argument("--pages", type=int, default=12, help="pages per paper")
+    parser.add_argument("--figures", type=int, default=4, help="figures per paper")
+    parser.add_argument("--columns", type=int, default=2, help="text columns per page")
+    parser.add_argument("--styles", nargs="+", default=list(HEADING_STYLES), choices=HEADING_STYLES,
+                        help="heading styles, used in turn")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the corpus")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the paper parsing and review pipeline.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    extract_parser = subparsers.add_parser("extract", help="pdf extraction throughput")
+    extract_parser.add_argument("paths", nargs="+", help="pdf files to parse")
+    extract_parser.add_argument("--repeat", type=int, default=3, help="take the best of N runs")
+    extract_parser.set_defaults(func=bench_extract)
+
+    cache_parser = subparsers.add_parser("cache", help="parse time vs. cached load time")
+    cache_parser.add_argument("paths", nargs="+", help="pdf files to parse")
+    cache_parser.set_defaults(func=bench_cache)
+
+    review_parser = subparsers.add_parser("review", help="review wall-clock time against a fake LLM")
+    review_parser.add_argument("--papers", type=int, default=30, help="number of synthetic papers")
+    review_parser.add_argument("--latency", type=float, default=0.2, help="fake completion latency in seconds")
+    review_parser.add_argument("--workers", type=int, default=8, help="max papers reviewed in parallel")
+    review_parser.set_defaults(func=bench_review)
+
+    generate_parser = subparsers.add_parser("generate", help="write a synthetic pdf corpus")
+    generate_parser.add_argument("directory", help="output directory")
+    add_corpus_arguments(generate_parser, papers=10)
+    generate_parser.set_defaults(func=bench_generate)
+
+    suite_parser = subparsers.add_parser("suite", help="per-stage timings on a synthetic corpus, as JSON")
+    suite_parser.add_argument("--corpus", default=None,
+                              help="corpus directory; reused if it has pdfs, generated otherwise (default: temp dir)")
+    add_corpus_arguments(suite_parser, papers=10)
+    suite_parser.add_argument("--latency", type=float, default=0.05, help="fake completion latency in seconds")
+    suite_parser.add_argument("--workers", type=int, default=4, help="max papers reviewed in parallel")
+    suite_parser.add_argument("--output", default=None, help="also write the JSON result to this file")
+    suite_parser.set_defaults(func=bench_suite)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+命令行入口，不需要PyQt5，适合在无界面的批处理服务器上运行。
+
+    python cli.py review papers/ "more/*.pdf" --domain Biology --workers 8 --output ./review/
+"""
+import argparse
+import os
+import sys
+
+
+def review_setup(args):
+    """
+    由review/worker共用的命令行参数创建补全函数和run_review的参数，返回 (参数字典, 假服务)；
+    参数不全时打印错误并返回 (None, None)。
+    """
+    if args.debug:
+        # 在导入解析模块之前设置，解析子进程也会继承
+        os.environ["BRAINBOX_DEBUG"] = "1"
+    from llm_backend import stage_models
+
+    api_key = args.api_key or os.environ.get("OPENAI_API_KEY", '')
+    completion = None
+    fake_server = None
+    base_url = args.base_url
+    if args.fake_llm is not None:
+        from fake_llm import FakeCompletion
+        completion = FakeCompletion(latency=args.fake_llm, error_rate=args.fake_error_rate)
+    elif args.fake_server is not None:
+        # 本机起一个OpenAI兼容的假服务，走真实的HTTP后端和连接池
+        from fake_llm import FakeOpenAIServer
+        fake_server = FakeOpenAIServer(latency=args.fake_server, error_rate=args.fake_error_rate).start()
+        base_url = fake_server.base_url
+    elif not api_key and not args.replay_only and not args.base_url:
+        print("Please pass --api-key or set OPENAI_API_KEY.", file=sys.stderr)
+        return None, None
+    models = stage_models(args.model, summary=args.summary_model, method=args.method_model,
+                          conclusion=args.conclusion_model, condense=args.condense_model,
+                          combined=args.combined_model)
+    options = dict(api_key=api_key, output_dir=args.output, workers=args.workers, parse_workers=args.parse_workers,
+                   cache_dir=args.cache_dir, use_cache=not args.no_cache, replay_only=args.replay_only,
+                   resume=not args.no_resume, map_reduce=args.map_reduce,
+                   max_prompt_tokens=args.max_prompt_tokens, completion=completion,
+                   file_format=args.format, requests_per_minute=args.rpm,
+                   tokens_per_minute=args.tpm, max_retries=args.max_retries, max_in_flight=args.max_in_flight,
+                   trace_path=args.trace if args.trace != "none" else None,
+                   backend=args.backend, base_url=base_url, models=models,
+                   combined=args.combined,
+                   dedup_threshold=None if args.no_dedup else args.dedup_threshold,
+                   related_work=args.related_work, compress=not args.no_compress,
+                   triage=args.triage, store_path=args.store)
+    return options, fake_server
+
+
+def review_command(args):
+    from review_engine import collect_pdfs, run_review
+
+    paths = collect_pdfs(args.inputs)
+    if not paths:
+        print("No pdf files found.", file=sys.stderr)
+        return 1
+    options, fake_server = review_setup(args)
+    if options is None:
+        return 1
+    try:
+        report_paths = run_review(paths, domain=args.domain, **options)
+    finally:
+        if fake_server is not None:
+            fake_server.stop()
+    return 0 if len(report_paths) == len(paths) else 2
+
+
+def enqueue_command(args):
+    from review_engine import collect_pdfs
+    from work_queue import WorkQueue
+
+    paths = collect_pdfs(args.inputs)
+    if not paths:
+        print("No pdf files found.", file=sys.stderr)
+        return 1
+    queue = WorkQueue(args.queue)
+    try:
+        added = queue.enqueue([os.path.abspath(path) for path in paths], args.domain)
+        print(f"Enqueued {added} of {len(paths)} files; {queue.stats()}")
+    finally:
+        queue.close()
+    return 0
+
+
+def worker_command(args):
+    from work_queue import run_worker
+
+    options, fake_server = review_setup(args)
+    if options is None:
+        return 1
+    # 领域由每个任务自己带着
+    try:
+        run_worker(args.queue, worker_id=args.worker_id, batch=args.batch, lease_seconds=args.lease,
+                   max_attempts=args.max_attempts, wait=args.wait, **options)
+    finally:
+        if fake_server is not None:
+            fake_server.stop()
+    return 0
+
+
+def watch_command(args):
+    import signal
+    import threading
+    from watch_folder import run_daemon
+
+    if not os.path.isdir(args.directory):
+        print(f"{args.directory} is not a directory.", file=sys.stderr)
+        return 1
+    options, fake_server = review_setup(args)
+    if options is None:
+        return 1
+    stop = threading.Event()
+    # SIGTERM（如systemd停止服务）时不再接新文件，等在审的论文写完报告再退出
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    try:
+        run_daemon(args.directory, args.domain, recursive=args.recursive, settle=args.settle,
+                   poll_interval=args.poll_interval, use_inotify=not args.no_inotify, stop=stop, **options)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if fake_server is not None:
+            fake_server.stop()
+    return 0
+
+
+def queue_status_command(args):
+    from work_queue import FAILED, WorkQueue
+
+    queue = WorkQueue(args.queue)
+    try:
+        print(queue.stats())
+        for job in queue.jobs(FAILED):
+            print(f"failed after {job['attempts']} attempts: {job['path']}: {job['error']}")
+    finally:
+        queue.close()
+    return 0
+
+
+def search_command(args):
+    from review_engine import search_index
+
+    query = args.query
+    if os.path.isfile(query):
+        with open(query, encoding="utf-8", errors="ignore") as f:
+            query = f.read()
+    for score, record, text in search_index(query, cache_dir=args.cache_dir, k=args.k):
+        print(f"{score:.3f}  {record['title']} [{record['section']}]  {record['path']}")
+        print("       " + text[:200].replace("\n", " "))
+    return 0
+
+
+def reviews_command(args):
+    from review_store import ReviewStore
+
+    if not os.path.exists(args.store):
+        print(f"No review database at {args.store}.", file=sys.stderr)
+        return 1
+    store = ReviewStore(args.store)
+    filters = dict(domain=args.domain, min_score=args.min_score, max_score=args.max_score, order=args.order,
+                   limit=args.limit)
+    try:
+        if args.export:
+            count = store.export(args.export, file_format=args.format, **filters)
+            print(f"Exported {count} reviews to {args.export}.")
+            return 0
+        for row in store.query(**filters):
+            score = "  - " if row["score"] is None else f"{row['score']:4.1f}"
+            print(f"{score}  {row['title']}  [{row['domain']}, {row['mode']}]  {row['path']}")
+    finally:
+        store.close()
+    return 0
+
+
+def add_review_arguments(parser):
+    # review和worker共用的审阅参数
+    parser.add_argument("--api-key", default=None, help="OpenAI API key (default: $OPENAI_API_KEY)")
+    parser.add_argument("--output", default="./review/", help="directory for the review reports")
+    parser.add_argument("--format", default="txt", help="report file extension")
+    parser.add_argument("--workers", type=int, default=4, help="papers reviewed in parallel")
+    parser.add_argument("--parse-workers", type=int, default=None,
+                        help="pdf parsing processes (default: number of CPUs)")
+    parser.add_argument("--cache-dir", default="./cache", help="directory of the parse and answer caches")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the parse and answer caches")
+    parser.add_argument("--replay-only", action="store_true",
+                        help="only replay cached answers, never call the API")
+    parser.add_argument("--no-resume", action="store_true", help="ignore the checkpoint manifest")
+    parser.add_argument("--map-reduce", action="store_true",
+                        help="condense long sections in chunks instead of truncating them")
+    parser.add_argument("--combined", action="store_true",
+                        help="review each paper in one request instead of three (faster, fewer tokens)")
+    parser.add_argument("--triage", action="store_true",
+                        help="only parse the first pages and summarise each paper from its title and "
+                             "abstract (fast first pass over a large batch)")
+    parser.add_argument("--dedup-threshold", type=float, default=0.8,
+                        help="review near-duplicate papers (e.g. arXiv versions) with at least this "
+                             "estimated Jaccard similarity only once (0: exact duplicates only)")
+    parser.add_argument("--related-work", action="store_true",
+                        help="add related sections of previously processed papers to the conclusion prompt")
+    parser.add_argument("--no-dedup", action="store_true", help="review every file, even duplicates")
+    parser.add_argument("--no-compress", action="store_true",
+                        help="send section text as extracted, without dropping references, running "
+                             "headers/footers, captions and boilerplate")
+    parser.add_argument("--max-prompt-tokens", type=int, default=2500, help="token budget per call")
+    parser.add_argument("--rpm", type=int, default=3500, help="requests per minute allowed by the account")
+    parser.add_argument("--tpm", type=int, default=90000, help="tokens per minute allowed by the account")
+    parser.add_argument("--max-retries", type=int, default=6, help="retries for rate-limit and transient errors")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="LLM requests in flight at once, map-reduce chunks included (default: --workers)")
+    parser.add_argument("--backend", choices=["http", "openai"], default="http",
+                        help="LLM client: pooled HTTP client (default) or the openai SDK")
+    parser.add_argument("--base-url", default=None,
+                        help="base URL of an OpenAI-compatible API (default: https://api.openai.com/v1)")
+    parser.add_argument("--model", default="gpt-3.5-turbo", help="model for all stages")
+    parser.add_argument("--summary-model", default=None, help="model for the summary stage")
+    parser.add_argument("--method-model", default=None, help="model for the method stage")
+    parser.add_argument("--conclusion-model", default=None, help="model for the conclusion stage")
+    parser.add_argument("--condense-model", default=None, help="model for map-reduce condensing")
+    parser.add_argument("--combined-model", default=None, help="model for --combined reviews")
+    parser.add_argument("--fake-llm", type=float, default=None, metavar="LATENCY",
+                        help="use a local fake LLM with the given latency in seconds (no network)")
+    parser.add_argument("--fake-server", type=float, default=None, metavar="LATENCY",
+                        help="start a local OpenAI-compatible fake server with the given latency and "
+                             "review through the HTTP backend (no network)")
+    parser.add_argument("--fake-error-rate", type=float, default=0.0,
+                        help="fraction of fake LLM or fake server calls that fail with a 429 rate-limit error")
+    parser.add_argument("--trace", default='',
+                        help="JSONL file for timing, token and cost telemetry "
+                             "(default: OUTPUT/trace.jsonl, 'none' to disable)")
+    parser.add_argument("--store", default='',
+                        help="sqlite database of structured reviews (default: OUTPUT/reviews.sqlite)")
+    parser.add_argument("--debug", action="store_true", help="print pdf parsing debug events to stderr")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="brainbox", description="Review research papers with an LLM.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    review_parser = subparsers.add_parser("review", help="parse and review a batch of pdf files")
+    review_parser.add_argument("inputs", nargs="+", help="pdf files, directories or glob patterns")
+    review_parser.add_argument("--domain", default="Computer Science and Artificial Intelligence",
+                               help="research domain of the papers")
+    add_review_arguments(review_parser)
+    review_parser.set_defaults(func=review_command)
+
+    enqueue_parser = subparsers.add_parser("enqueue", help="add pdf files to a shared work queue")
+    enqueue_parser.add_argument("inputs", nargs="+", help="pdf files, directories or glob patterns")
+    enqueue_parser.add_argument("--queue", default="./queue.sqlite", help="sqlite work queue")
+    enqueue_parser.add_argument("--domain", default="Computer Science and Artificial Intelligence",
+                                help="research domain of the papers")
+    enqueue_parser.set_defaults(func=enqueue_command)
+
+    worker_parser = subparsers.add_parser("worker", help="review jobs from a shared work queue")
+    worker_parser.add_argument("--queue", default="./queue.sqlite", help="sqlite work queue")
+    worker_parser.add_argument("--worker-id", default=None, help="worker name (default: host-pid-random)")
+    worker_parser.add_argument("--batch", type=int, default=4, help="jobs claimed at a time")
+    worker_parser.add_argument("--lease", type=float, default=600,
+                               help="lease in seconds; jobs of a worker that stops renewing are re-queued")
+    worker_parser.add_argument("--max-attempts", type=int, default=3, help="attempts before a job is marked failed")
+    worker_parser.add_argument("--wait", action="store_true", help="keep polling for new jobs when the queue is empty")
+    add_review_arguments(worker_parser)
+    worker_parser.set_defaults(func=worker_command)
+
+    watch_parser = subparsers.add_parser("watch", help="review new pdf files as they appear in a directory")
+    watch_parser.add_argument("directory", help="directory to watch")
+    watch_parser.add_argument("--domain", default="Computer Science and Artificial Intelligence",
+                              help="research domain of the papers")
+    watch_parser.add_argument("--recursive", action="store_true", help="also watch subdirectories")
+    watch_parser.add_argument("--settle", type=float, default=2.0,
+                              help="seconds a file must stay unchanged before it is reviewed")
+    watch_parser.add_argument("--poll-interval", type=float, default=2.0, help="seconds between directory scans")
+    watch_parser.add_argument("--no-inotify", action="store_true",
+                              help="always poll the directory (e.g. on network filesystems)")
+    add_review_arguments(watch_parser)
+    watch_parser.set_defaults(func=watch_command)
+
+    status_parser = subparsers.add_parser("queue-status", help="show the job counts of a work queue")
+    status_parser.add_argument("--queue", default="./queue.sqlite", help="sqlite work queue")
+    status_parser.set_defaults(func=queue_status_command)
+
+    search_parser = subparsers.add_parser("search", help="find sections of processed papers similar to a text")
+    search_parser.add_argument("query", help="query text, or a path to a text file")
+    search_parser.add_argument("--cache-dir", default="./cache", help="directory of the caches and the section index")
+    search_parser.add_argument("-k", type=int, default=5, help="number of results")
+    search_parser.set_defaults(func=search_command)
+
+    reviews_parser = subparsers.add_parser("reviews", help="list, rank and export stored reviews")
+    reviews_parser.add_argument("--store", default="./review/reviews.sqlite", help="sqlite database of reviews")
+    reviews_parser.add_argument("--domain", default=None, help="only reviews in this research domain")
+    reviews_parser.add_argument("--min-score", type=float, default=None, help="only reviews scored at least this")
+    reviews_parser.add_argument("--max-score", type=float, default=None, help="only reviews scored at most this")
+    reviews_parser.add_argument("--order", choices=["score", "recent", "title"], default="score", help="sort order")
+    reviews_parser.add_argument("--limit", type=int, default=None, help="maximum number of reviews")
+    reviews_parser.add_argument("--export", default=None, metavar="FILE",
+                                help="write the selected reviews to one txt or md report instead of listing them")
+    reviews_parser.add_argument("--format", choices=["txt", "md"], default=None,
+                                help="export format (default: from the file extension)")
+    reviews_parser.set_defaults(func=reviews_command)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
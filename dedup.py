@@ -0,0 +1,122 @@
+"""
+审阅前的重复论文检测：同一篇论文被选了两次，或者同一篇论文的多个arXiv版本，只审阅一次。
+- 完全重复：pdf文件的sha256相同，或者抽取出的正文（去掉空白后）的sha256相同；
+- 近似重复：对正文做MinHash签名（k个词的shingle），用numpy一次算出全部哈希函数的最小值，
+  再用LSH分桶找候选，估计的Jaccard相似度不低于阈值的视为重复。
+扫描版、纯图片的pdf抽不出正文（或只有几个词），只按文件hash判断，不按正文比较，否则它们会全被当成同一篇。
+"""
+import hashlib
+import re
+import zlib
+
+import numpy as np
+
+# 大于2^32的素数；系数a小于2^31、shingle哈希小于2^32，a*x+b不会溢出uint64
+_PRIME = np.uint64(4294967311)
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def paper_text(paper):
+    # 优先用解析得到的全文，没有时（如手工构造的Paper）拼接各章节文本
+    text = getattr(paper, "all_text", None)
+    if text is None:
+        text = "\n".join(str(value) for value in paper.section_text_dict.values())
+    return text
+
+
+def text_hash(text):
+    return hashlib.sha256(re.sub(r"\s+", '', text).encode("utf-8")).hexdigest()
+
+
+def shingle_hashes(text, shingle=5):
+    # 连续shingle个词组成一个shingle，用crc32映射成32位整数，去重后返回uint64数组
+    words = _WORD.findall(text.lower())
+    if len(words) < shingle:
+        words = words + [''] * (shingle - len(words))
+    hashes = {zlib.crc32(' '.join(words[i:i + shingle]).encode("utf-8"))
+              for i in range(len(words) - shingle + 1)}
+    return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+
+class MinHasher:
+    def __init__(self, num_perm=128, shingle=5, seed=1, batch=4096):
+        """
+        num_perm: 哈希函数个数（签名长度），越大估计越准；shingle: 每个shingle的词数。
+        batch: 每次参与矩阵运算的shingle数，限制 num_perm x batch 的临时数组大小。
+        """
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 2 ** 31, size=num_perm).astype(np.uint64)[:, None]
+        self.b = rng.randint(0, 2 ** 32, size=num_perm).astype(np.uint64)[:, None]
+        self.num_perm = num_perm
+        self.shingle = shingle
+        self.batch = batch
+
+    def signature(self, text):
+        values = shingle_hashes(text, self.shingle)
+        signature = np.full(self.num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+        for start in range(0, len(values), self.batch):
+            # 一次算出所有哈希函数在这批shingle上的值，再按行取最小
+            chunk = values[start:start + self.batch][None, :]
+            np.minimum(signature, ((self.a * chunk + self.b) % _PRIME).min(axis=1), out=signature)
+        return signature
+
+
+def jaccard(signature1, signature2):
+    # 两个MinHash签名相同位置相等的比例是Jaccard相似度的无偏估计
+    return float(np.mean(signature1 == signature2))
+
+
+class Deduplicator:
+    """
+    逐篇判断论文是否与之前见过的论文重复，适合边解析边审阅的流式批次：
+        canonical = dedup.check(paper, name)   # 返回重复的那篇的name，不重复时返回None并记住这篇
+    """
+
+    def __init__(self, threshold=0.8, num_perm=128, bands=32, shingle=5, min_words=50):
+        """
+        threshold: 估计的Jaccard相似度不低于它就视为近似重复；None表示只检测完全重复。
+        bands: LSH分桶数，num_perm必须能被它整除；每个桶的行数越少，召回越高、候选越多。
+        min_words: 正文少于这么多词时不做正文hash和MinHash比较，只比较pdf文件hash。
+        """
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.threshold = threshold
+        self.min_words = min_words
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm=num_perm, shingle=shingle)
+        self.exact = {}
+        self.signatures = {}
+        self.buckets = [{} for _ in range(bands)]
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def check(self, paper, name):
+        text = paper_text(paper)
+        has_text = len(_WORD.findall(text.lower())) >= self.min_words
+        keys = [text_hash(text)] if has_text else []
+        if getattr(paper, "source_hash", None):
+            keys.append(paper.source_hash)
+        for key in keys:
+            if key in self.exact:
+                return self.exact[key]
+        signature = None
+        if self.threshold is not None and has_text:
+            signature = self.hasher.signature(text)
+            band_keys = self._band_keys(signature)
+            candidates = set()
+            for bucket, band_key in zip(self.buckets, band_keys):
+                candidates.update(bucket.get(band_key, ()))
+            best = max(candidates, key=lambda candidate: jaccard(signature, self.signatures[candidate]),
+                       default=None)
+            if best is not None and jaccard(signature, self.signatures[best]) >= self.threshold:
+                return best
+        # 不重复：记住这篇，作为以后重复论文的代表
+        for key in keys:
+            self.exact[key] = name
+        if signature is not None:
+            self.signatures[name] = signature
+            for bucket, band_key in zip(self.buckets, band_keys):
+                bucket.setdefault(band_key, []).append(name)
+        return None
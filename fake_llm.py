@@ -0,0 +1,171 @@
+"""
+本地假的LLM，不联网、不花钱，用于测试和基准测试审阅流程的并发效果：
+- FakeCompletion: 进程内的补全函数；
+- FakeOpenAIServer: 本机上的OpenAI兼容HTTP服务（/v1/chat/completions，支持流式），
+  用llm_backend.HTTPBackend连上去，可以连同连接池和HTTP开销一起测吞吐。
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+
+
+class FakeRateLimitError(Exception):
+    # 模拟openai的429限流错误，带http_status和Retry-After响应头
+    http_status = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__("Rate limit reached (fake)")
+        self.headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+
+
+class FakeCompletion:
+    """
+    可调用对象，签名与utils.openai_completion一致：completion(messages, model, on_delta=None, **params) -> str。
+    每次调用sleep latency秒模拟网络往返，并统计调用次数和最大同时在途请求数。
+    传入on_delta时模拟流式输出：把回答按单词分段，在latency内均匀地逐段回调。
+    error_rate: 按这个比例随机抛出FakeRateLimitError，用于测试重试和退避。
+    """
+
+    def __init__(self, latency=0.5, reply="Fake review output.", error_rate=0.0, retry_after=None):
+        self.latency = latency
+        self.reply = reply
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, messages, model="gpt-3.5-turbo", on_delta=None, **params):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.error_rate and random.random() < self.error_rate:
+                raise FakeRateLimitError(self.retry_after)
+            result = f"[{model}] {self.reply} ({len(messages[1]['content'])} chars of context)"
+            if on_delta is None:
+                time.sleep(self.latency)
+                return result
+            pieces = [word + ' ' for word in result.split(' ')]
+            pieces[-1] = pieces[-1].rstrip(' ')
+            for piece in pieces:
+                time.sleep(self.latency / len(pieces))
+                on_delta(piece)
+            return result
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class _FakeOpenAIHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1，连接默认keep-alive，可以验证客户端的连接复用
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server.owner
+        if not self.path.rstrip('/').endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        server.count_connection(self.client_address)
+        stream = bool(request.pop("stream", False))
+        started = [False]
+
+        def send_delta(chunk):
+            # 流式：第一段生成出来时才发响应头（之前还可能返回429），之后每段立即作为一个服务端推送事件发出
+            if not started[0]:
+                started[0] = True
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+            event = {"choices": [{"index": 0, "delta": {"content": chunk}}]}
+            self._write_chunk(f"data: {json.dumps(event)}\n\n")
+
+        try:
+            # 复用FakeCompletion的延迟、错误注入和并发统计
+            result = server.completion(request["messages"], model=request.get("model", "gpt-3.5-turbo"),
+                                       on_delta=send_delta if stream else None)
+        except FakeRateLimitError as e:
+            self._send_json(429, {"error": {"message": str(e), "type": "rate_limit"}}, e.headers)
+            return
+        if not stream:
+            self._send_json(200, {"object": "chat.completion", "model": request.get("model"),
+                                  "choices": [{"index": 0, "message": {"role": "assistant", "content": result},
+                                               "finish_reason": "stop"}]})
+            return
+        if not started[0]:
+            send_delta('')
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+
+class FakeOpenAIServer:
+    """
+    在后台线程里运行的OpenAI兼容服务，参数同FakeCompletion；port=0表示随机端口。
+    用法:
+        with FakeOpenAIServer(latency=0.2) as server:
+            backend = HTTPBackend(base_url=server.base_url)
+    server.completion是内部的FakeCompletion（调用次数、最大在途数），server.connections是客户端用过的连接数。
+    """
+
+    def __init__(self, latency=0.5, reply="Fake review output.", error_rate=0.0, retry_after=None,
+                 host="127.0.0.1", port=0):
+        self.completion = FakeCompletion(latency=latency, reply=reply, error_rate=error_rate,
+                                         retry_after=retry_after)
+        self._httpd = ThreadingHTTPServer((host, port), _FakeOpenAIHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.owner = self
+        self._thread = None
+        self._peers = set()
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def connections(self):
+        with self._lock:
+            return len(self._peers)
+
+    def count_connection(self, client_address):
+        with self._lock:
+            self._peers.add(client_address)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,134 @@
+"""
+可替换的LLM后端。每个后端都是一个补全函数，签名与utils.openai_completion一致：
+    backend(messages, model="gpt-3.5-turbo", on_delta=None, **params) -> str
+- http:   直接请求OpenAI兼容的 /chat/completions 接口，不经过openai模块的全局状态；
+          每个线程一个requests.Session，连接keep-alive复用，多线程并发调用互不干扰；
+          base_url可以指向任何OpenAI兼容的服务（包括fake_llm.FakeOpenAIServer）。
+- openai: 旧版openai SDK（openai.ChatCompletion），保留作对照。
+- fake:   进程内的fake_llm.FakeCompletion，不联网。
+"""
+import asyncio
+import json
+import threading
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+DEFAULT_MODEL = "gpt-3.5-turbo"
+# 审阅的各个阶段，可以分别指定模型，如summary用便宜的模型、conclusion用强的模型
+STAGES = ("summary", "method", "conclusion", "condense", "combined")
+
+
+class LLMHTTPError(Exception):
+    # 带http_status和响应头，scheduler据此判断能否重试和Retry-After
+    def __init__(self, http_status, message, headers=None):
+        super().__init__(f"HTTP {http_status}: {message}")
+        self.http_status = http_status
+        self.headers = dict(headers or {})
+
+
+class HTTPBackend:
+    def __init__(self, api_key='', base_url=DEFAULT_BASE_URL, timeout=120, pool_size=16):
+        """
+        timeout: 默认的请求超时（秒），调用时传入request_timeout会覆盖。
+        pool_size: 每个Session对同一主机保持的keep-alive连接数上限。
+        """
+        self.api_key = api_key
+        self.url = base_url.rstrip('/') + "/chat/completions"
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            # 延迟导入，只在真正发请求时才加载requests
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            if self.api_key:
+                session.headers["Authorization"] = f"Bearer {self.api_key}"
+            self._local.session = session
+        return session
+
+    def __call__(self, messages, model=DEFAULT_MODEL, on_delta=None, request_timeout=None, **params):
+        payload = dict(params, model=model, messages=messages)
+        if on_delta is not None:
+            payload["stream"] = True
+        response = self._session().post(self.url, json=payload, stream=on_delta is not None,
+                                        timeout=request_timeout or self.timeout)
+        with response:
+            if response.status_code != 200:
+                raise LLMHTTPError(response.status_code, response.text[:500], response.headers)
+            if on_delta is None:
+                return ''.join(choice["message"]["content"] or '' for choice in response.json()["choices"])
+            # 服务端推送事件：每行 "data: {...}"，以 "data: [DONE]" 结束；
+            # 读到响应末尾而不是在[DONE]处提前退出，连接才能放回连接池复用
+            result = ''
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    continue
+                choices = json.loads(data).get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content") or ''
+                if delta:
+                    result += delta
+                    on_delta(delta)
+            return result
+
+    async def acall(self, messages, model=DEFAULT_MODEL, **params):
+        # 供asyncio代码使用：在线程池里执行，每个线程有自己的Session
+        return await asyncio.to_thread(self, messages, model=model, **params)
+
+    def close(self):
+        # 只能关闭当前线程的Session，其余线程的Session随线程结束回收
+        session = getattr(self._local, "session", None)
+        if session is not None:
+            session.close()
+            self._local.session = None
+
+
+def create_backend(name="http", api_key='', base_url=None, **kwargs):
+    """
+    按名字创建后端：http（默认）、openai或fake。
+    kwargs传给后端的构造函数，如http的timeout/pool_size，fake的latency/error_rate。
+    """
+    if name == "http":
+        return HTTPBackend(api_key=api_key, base_url=base_url or DEFAULT_BASE_URL, **kwargs)
+    if name == "openai":
+        import functools
+        from utils import openai_completion
+        return functools.partial(openai_completion, api_key=api_key)
+    if name == "fake":
+        from fake_llm import FakeCompletion
+        return FakeCompletion(**kwargs)
+    raise ValueError(f"unknown LLM backend {name!r}, expected http, openai or fake")
+
+
+_default_backends = {}
+_default_lock = threading.Lock()
+
+
+def default_backend(api_key=''):
+    # 同一个api_key共用一个HTTPBackend，连接在各次调用之间复用
+    with _default_lock:
+        backend = _default_backends.get(api_key)
+        if backend is None:
+            backend = _default_backends[api_key] = HTTPBackend(api_key=api_key)
+        return backend
+
+
+def stage_models(model=DEFAULT_MODEL, **overrides):
+    """
+    返回 阶段 -> 模型名 的字典：所有阶段默认用model，overrides里非空的项覆盖对应阶段，
+    如 stage_models("gpt-3.5-turbo", conclusion="gpt-4")。
+    """
+    unknown = set(overrides) - set(STAGES)
+    if unknown:
+        raise ValueError(f"unknown stages {sorted(unknown)}, expected some of {STAGES}")
+    models = {stage: model for stage in STAGES}
+    models.update({stage: name for stage, name in overrides.items() if name})
+    return models
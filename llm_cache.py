@@ -0,0 +1,99 @@
+"""
+LLM补全结果的本地缓存（sqlite）。
+key = sha256(model + 完整messages + 其余参数)，相同的请求直接返回缓存答案，不再调用API。
+支持TTL过期、按条数的LRU淘汰，以及只读缓存、不发请求的 replay_only 模式。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class CacheMiss(Exception):
+    # replay_only 模式下请求不在缓存中
+    pass
+
+
+class CompletionCache:
+    def __init__(self, db_path='./cache/completions.sqlite', ttl=None, max_entries=20000, replay_only=False):
+        """
+        ttl: 缓存有效期（秒），None表示永不过期
+        max_entries: 最多保留的条数，超出后删除最久未访问的
+        replay_only: 只从缓存回放，未命中时抛出CacheMiss而不是调用API
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.replay_only = replay_only
+        self._lock = threading.Lock()
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                created_at REAL,
+                accessed_at REAL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_completions_accessed ON completions(accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(model, messages, params):
+        payload = json.dumps({"model": model, "messages": messages, "params": params},
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return response
+
+    def put(self, key, model, response):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?)",
+                               (key, model, response, now, now))
+            count = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute("""
+                    DELETE FROM completions WHERE key IN (
+                        SELECT key FROM completions ORDER BY accessed_at LIMIT ?)""",
+                                   (count - self.max_entries,))
+            self._conn.commit()
+
+    def wrap(self, completion):
+        # 返回带缓存的补全函数，签名与completion一致
+        def cached_completion(messages, model="gpt-3.5-turbo", on_delta=None, **params):
+            # 流式回调不影响回答内容，不参与key计算
+            key = self.key(model, messages, params)
+            response = self.get(key)
+            if response is not None:
+                if on_delta is not None:
+                    on_delta(response)
+                return response
+            if self.replay_only:
+                raise CacheMiss(f"completion not cached (model={model}, key={key[:12]})")
+            response = completion(messages=messages, model=model, on_delta=on_delta, **params)
+            self.put(key, model, response)
+            return response
+
+        return cached_completion
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
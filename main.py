@@ -1,8 +1,6 @@
 from PyQt5.QtWidgets import QApplication, QMainWindow, QFileDialog, QPushButton, QLineEdit, QLabel,QComboBox
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
-import openai
-from pdf_parser import Paper
-from utils import review_by_chatgpt
+from review_engine import run_review
 
 
 class ReviewThread(QThread):
@@ -15,19 +13,9 @@ class ReviewThread(QThread):
         self.research_domain = research_domain
 
     def run(self):
-        paper_list = []
-        file_names = []
-        for file_path in self.file_paths:
-            file_name = file_path.split('/')[-1].split('.')[0]
-            file_names.append(file_name)
-            with open(file_path, "rb") as f:
-                paper = Paper(path=file_path)
-                paper_list.append(paper)
-                self.status_update.emit(f"Finished loading {file_name}.")
-
-        self.status_update.emit("Start reviewing papers.")
-        review_by_chatgpt(paper_list, key_word=self.research_domain, api_key=self.api_key, export_path='./review/', file_format='txt', file_names=file_names)
-        self.status_update.emit("All files have been reviewed.")
+        # GUI只是审阅引擎的一个客户端，进度通过status_update信号回到界面
+        run_review(self.file_paths, domain=self.research_domain, api_key=self.api_key, output_dir='./review/',
+                   progress=self.status_update.emit)
 
 
 class MainWindow(QMainWindow):
@@ -68,7 +56,9 @@ class MainWindow(QMainWindow):
         self.status_label = QLabel("", self)
         self.status_label.move(20, 220)
         self.status_label.setAlignment(Qt.AlignCenter)
-        self.status_label.resize(360, 30)
+        # 最后一行状态带有整批的调用数、token数、费用和耗时摘要，比较长，自动换行
+        self.status_label.setWordWrap(True)
+        self.status_label.resize(460, 60)
 
 
     def select_files(self):
@@ -99,7 +89,10 @@ class MainWindow(QMainWindow):
         self.status_label.setText(status)
 
     def show_notification(self):
-        self.status_label.setText("All files have been reviewed.")
+        # 审阅引擎正常结束时最后一行就是带摘要的完成提示，保留它；中途出错时才补上结束提示
+        status = self.status_label.text()
+        if not status.startswith("All files have been reviewed"):
+            self.status_label.setText(f"{status}\nReview finished." if status else "Review finished.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,84 @@
+"""
+按内容寻址的论文解析结果磁盘缓存。
+key = sha256(pdf字节) + 解析器版本，value = Paper.to_dict() 的 zlib 压缩 JSON。
+超过容量上限时按最近访问时间（文件mtime）做LRU淘汰。
+"""
+import json
+import os
+import threading
+import zlib
+
+from pdf_parser import PARSER_VERSION
+
+
+class PaperCache:
+    def __init__(self, cache_dir='./cache/papers', max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, source_hash):
+        # 解析器版本变化后旧缓存自然失效
+        return f"{source_hash}-v{PARSER_VERSION}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".json.z")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                state = json.loads(zlib.decompress(f.read()))
+        except (OSError, ValueError, zlib.error):
+            return None
+        # 更新mtime作为最近访问时间，供LRU淘汰使用
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return state
+
+    def put(self, key, state):
+        path = self._path(key)
+        data = zlib.compress(json.dumps(state, ensure_ascii=False).encode("utf-8"), 6)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, _, size in self._entries())
+            else:
+                self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".json.z"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def _evict(self):
+        # 从最久未访问的开始删除，直到总大小回到上限的90%以内
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._total_bytes = total
+
+    def clear(self):
+        for _, path, _ in self._entries():
+            os.remove(path)
+        with self._lock:
+            self._total_bytes = 0
@@ -1,21 +1,171 @@
 import fitz, io, os
-from PIL import Image
+from collections import Counter, namedtuple
+from collections.abc import Mapping
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
+import multiprocessing
 import re
+import shutil
+import threading
+import time
+
+from telemetry import debug
+
+# 解析逻辑变化时递增，使旧的解析缓存失效
+PARSER_VERSION = 3
+# 惰性模式下默认先解析的页数：标题和摘要几乎总在前一两页
+FRONT_PAGES = 2
+# PyMuPDF不能在多个线程里同时解析文档；惰性论文在审阅线程里补充加载剩余页面时串行进行
+_load_lock = threading.Lock()
+
+# 常见的章节名称，用来识别不加粗、不编号的标题，并把标题统一成规范写法
+SECTION_NAMES = ["Abstract",
+                 'Introduction', 'Related Work', 'Background', "Related works",
+                 "Preliminary", "Preliminaries", "Problem Formulation", "Problem Statement",
+                 'Methods', 'Methodology', "Method", 'Approach', 'Approaches',
+                 # exp
+                 "Materials and Methods", "Experiment Settings", "Experimental Results",
+                 'Experiment', "Evaluation", "Experiments",
+                 "Results", 'Findings', 'Data Analysis',
+                 "Discussion", "Results and Discussion", "Conclusion", "Conclusions",
+                 'References', "Conclusion Remarks", "Acknowledgments", "Acknowledgements"]
+_CANONICAL_NAMES = {name.lower(): name for name in SECTION_NAMES}
+# 摘要、关键词等前置内容经常和正文写在同一行，如 "Abstract—We propose ..."，按行首匹配
+_FRONT_MATTER = re.compile(r"^(abstract|keywords|key words|index terms)\b[\s:.\u2014\u2013-]*", re.I)
+_FRONT_MATTER_NAMES = {"abstract": "Abstract", "keywords": "Keywords", "key words": "Keywords",
+                       "index terms": "Index Terms"}
+# "3 Method"、"3.1 Encoder"、"IV. EXPERIMENTS"；编号后必须有点或空白，避免把"3D"、"Introduction"的首字母当成编号
+_NUMBERED = re.compile(r"^(?:(\d{1,2}(?:\.\d{1,2})*)|([IVX]{1,5}))(?:\.\s*|\s+)(\S.*)$")
+_NUMBER_ONLY = re.compile(r"^(?:(\d{1,2})|([IVX]{1,5}))\.?$")
+_ROMAN = {"I": 1, "II": 2, "III": 3, "IV": 4, "V": 5, "VI": 6, "VII": 7, "VIII": 8, "IX": 9, "X": 10,
+          "XI": 11, "XII": 12, "XIII": 13, "XIV": 14, "XV": 15}
+
+# 标题索引的一项：name为规范化后的章节名，page为页码，start为标题行在all_text中的偏移，
+# body为正文起始偏移，level为层级（1为一级标题）
+Heading = namedtuple("Heading", ["name", "page", "start", "body", "level"])
+
+
+def clean_section_text(text):
+    # 去掉断词连字符和换行；数字（实验结果）保留
+    return text.replace('-\n', '').replace('\n', ' ')
+
+
+class SectionTexts(Mapping):
+    """
+    章节名 -> 章节文本 的只读映射，访问时才从all_text按偏移切出并清洗，不保存各章节文本的副本。
+    额外的键（如"title"）通过update加入，原样返回。
+    """
+
+    def __init__(self, all_text, spans, extra=None):
+        self.all_text = all_text
+        self.spans = spans
+        self.extra = dict(extra or {})
+
+    def __getitem__(self, name):
+        if name in self.extra:
+            return self.extra[name]
+        start, end = self.spans[name]
+        return clean_section_text(self.all_text[start:end])
+
+    def raw(self, name):
+        # 未清洗的章节文本（保留换行），供prompt_compression逐行处理
+        if name in self.extra:
+            return self.extra[name]
+        start, end = self.spans[name]
+        return self.all_text[start:end]
+
+    def __iter__(self):
+        yield from self.spans
+        for name in self.extra:
+            if name not in self.spans:
+                yield name
+
+    def __len__(self):
+        return len(self.spans) + len([name for name in self.extra if name not in self.spans])
+
+    def __contains__(self, name):
+        return name in self.spans or name in self.extra
+
+    def update(self, other):
+        self.extra.update(other)
+
+
+class LazySectionTexts(Mapping):
+    """
+    惰性模式的章节映射：只解析了前几页时，前几页里已经完整的章节（后面已出现下一个标题）直接返回；
+    访问其他章节、遍历到这些章节之后、或者需要章节总数时，才调用paper.load_remaining()解析剩余页面，
+    之后全部转给完整的SectionTexts。遍历时先产出已完整的章节，所以只取第一个章节（摘要）不会触发加载。
+    """
+
+    def __init__(self, paper, front_spans, extra=None):
+        self.paper = paper
+        self.front = SectionTexts(paper.all_text, front_spans, extra)
+        self.full = None
+
+    def _full(self):
+        if self.full is None:
+            self.paper.load_remaining()
+            self.full = self.paper.full_section_texts
+        return self.full
+
+    @property
+    def spans(self):
+        return self.front.spans if self.full is None else self.full.spans
+
+    def __getitem__(self, name):
+        if self.full is None and name in self.front:
+            return self.front[name]
+        return self._full()[name]
+
+    def raw(self, name):
+        if self.full is None and name in self.front:
+            return self.front.raw(name)
+        return self._full().raw(name)
+
+    def __iter__(self):
+        seen = set()
+        if self.full is None:
+            for name in self.front.spans:
+                seen.add(name)
+                yield name
+        for name in self._full():
+            if name not in seen:
+                yield name
+
+    def __len__(self):
+        return len(self._full())
+
+    def __contains__(self, name):
+        return (self.full is None and name in self.front) or name in self._full()
+
+    def update(self, other):
+        self.front.update(other)
+        if self.full is not None:
+            self.full.update(other)
 
 
 class Paper:
-    def __init__(self, path, title='', url='', abs='', authers=[]):
-        # 初始化函数，根据pdf路径初始化Paper对象
+    def __init__(self, path, title='', url='', abs='', authers=[], lazy=False, front_pages=FRONT_PAGES):
+        """
+        初始化函数，根据pdf路径初始化Paper对象。
+        lazy: 为True时只解析前front_pages页（标题和摘要），其余页面在访问后面的章节时才解析，
+              适合只看前置内容的快速分拣（triage），也让第一次LLM调用更早开始。
+        """
         self.url = url  # 文章链接
         self.path = path  # pdf路径
         self.section_names = []  # 段落标题
         self.section_texts = {}  # 段落内容
+        self.source_hash = None  # pdf内容的sha256，由parse_papers填写
+        self.timings = {}  # 解析各阶段耗时（秒）
+        self.partial = False  # 惰性模式下还有页面没有解析
+        self.title = title
         if title == '':
-            self.pdf = fitz.open(self.path)  # pdf文档
-            self.title = self.get_title()
-            self.parse_pdf()
-        else:
-            self.title = title
+            if lazy:
+                self.parse_front(front_pages)
+            else:
+                self.parse_pdf()
         self.authers = authers
         self.abs = abs
         self.roman_num = ["I", "II", 'III', "IV", "V", "VI", "VII", "VIII", "IIX", "IX", "X"]
@@ -23,78 +173,214 @@ class Paper:
         self.first_image = ''
 
     def parse_pdf(self):
-        self.pdf = fitz.open(self.path)  # pdf文档
-        self.text_list = [page.get_text() for page in self.pdf]
-        self.all_text = ' '.join(self.text_list)
+        # 只打开一次pdf，每页只提取一次，后面的标题、章节索引和切分都复用这份页面模型
+        # 各阶段耗时记在self.timings里（秒），随to_dict跨进程传回，由telemetry汇总
+        start = time.perf_counter()
+        self._load_pages()
+        self.timings["load_pages"] = time.perf_counter() - start
+        if self.title == '':
+            start = time.perf_counter()
+            self.title = self.get_title()
+            self.timings["get_title"] = time.perf_counter() - start
+        start = time.perf_counter()
+        self.all_text = ''.join(self.text_list)
+        # 每页在all_text中的起始偏移，页面文本可随时由all_text切出
+        self.page_offsets = [0]
+        for text in self.text_list[:-1]:
+            self.page_offsets.append(self.page_offsets[-1] + len(text))
         self.section_page_dict = self._get_all_page_index()  # 段落与页码的对应字典
-        print("section_page_dict", self.section_page_dict)
+        self.timings["section_index"] = time.perf_counter() - start
+        debug("section_page_dict", path=self.path, section_page_dict=self.section_page_dict)
+        start = time.perf_counter()
         self.section_text_dict = self._get_all_page()  # 段落与内容的对应字典
         self.section_text_dict.update({"title": self.title})
-        self.pdf.close()
+        self.timings["section_slice"] = time.perf_counter() - start
+        self.partial = False
+        # 页面文本和版面信息只在解析时使用，解析完就释放，只保留all_text一份文本
+        del self.text_list, self.block_list
 
-    def get_image_path(self, image_path=''):
+    def parse_front(self, pages=FRONT_PAGES):
         """
-        将PDF中的第一张图保存到image.png里面，存到本地目录，返回文件名称，供gitee读取
-        :param filename: 图片所在路径，"C:\\Users\\Administrator\\Desktop\\nwd.pdf"
+        惰性模式：只解析前pages页，标题只在这几页里找，章节索引也只建到这几页；
+        页数不超过pages的短文档直接完整解析。
+        """
+        start = time.perf_counter()
+        self.page_count = self._load_pages(stop=pages)
+        self.timings["load_front_pages"] = time.perf_counter() - start
+        if self.page_count <= pages:
+            self.parse_pdf()
+            return
+        start = time.perf_counter()
+        self.title = self.get_title()
+        self.timings["get_title"] = time.perf_counter() - start
+        start = time.perf_counter()
+        self._index_loaded_pages()
+        # 最后一个章节可能延续到后面的页面，只有后面出现了下一个标题的章节才算完整
+        front_spans = {name: span for name, span in self.section_spans.items() if span[1] < len(self.all_text)}
+        self.section_text_dict = LazySectionTexts(self, front_spans, {"title": self.title})
+        self.timings["section_index"] = time.perf_counter() - start
+        self.partial = True
+
+    def _index_loaded_pages(self):
+        self.all_text = ''.join(self.text_list)
+        self.page_offsets = [0]
+        for text in self.text_list[:-1]:
+            self.page_offsets.append(self.page_offsets[-1] + len(text))
+        self.section_page_dict = self._get_all_page_index()
+
+    def load_remaining(self):
+        """
+        解析惰性模式下还没解析的页面，重建完整的章节索引，结果放在self.full_section_texts；
+        已经完整时什么也不做。标题保持前几页得到的结果。
+        在同一进程里时接着已解析的页面继续，跨进程传来的（没有版面信息）从头解析。
+        """
+        with _load_lock:
+            if not self.partial:
+                return
+            start = time.perf_counter()
+            if not hasattr(self, "block_list"):
+                self.text_list, self.block_list = [], []
+            self._load_pages()
+            self.timings["load_pages"] = time.perf_counter() - start
+            start = time.perf_counter()
+            self._index_loaded_pages()
+            self.full_section_texts = self._get_all_page()
+            self.full_section_texts.update({"title": self.title})
+            self.timings["section_slice"] = time.perf_counter() - start
+            self.partial = False
+            del self.text_list, self.block_list
+        debug("load_remaining", path=self.path, section_page_dict=self.section_page_dict)
+
+    def to_dict(self):
+        # 可pickle的解析结果，不包含打开的fitz文档，用于跨进程传递；章节文本只以偏移保存，不重复存储
+        return {
+            "path": self.path,
+            "source_hash": self.source_hash,
+            "title": self.title,
+            "section_page_dict": self.section_page_dict,
+            "all_text": self.all_text,
+            "page_offsets": self.page_offsets,
+            "section_spans": self.section_spans,
+            "timings": self.timings,
+            "partial": self.partial,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        # 由to_dict的结果重建Paper，不再重新解析pdf（传入非空title跳过parse_pdf）
+        paper = cls(state["path"], title=state["title"] or ' ')
+        paper.title = state["title"]
+        paper.source_hash = state.get("source_hash")
+        paper.section_page_dict = state["section_page_dict"]
+        paper.all_text = state["all_text"]
+        paper.page_offsets = state["page_offsets"]
+        paper.section_spans = {name: tuple(span) for name, span in state["section_spans"].items()}
+        paper.timings = dict(state.get("timings", {}))
+        paper.partial = state.get("partial", False)
+        if paper.partial:
+            front_spans = {name: span for name, span in paper.section_spans.items() if span[1] < len(paper.all_text)}
+            paper.section_text_dict = LazySectionTexts(paper, front_spans, {"title": paper.title})
+        else:
+            paper.section_text_dict = SectionTexts(paper.all_text, paper.section_spans, {"title": paper.title})
+        return paper
+
+    def _load_pages(self, stop=None):
+        """
+        单次遍历pdf，每页只做一次版面分析，同时保留纯文本和字体/span版面信息。
+        self.text_list[i]: 第i页的纯文本（与page.get_text()一致，由文字块逐行拼出，字符偏移与版面信息一一对应）
+        self.block_list[i]: 第i页的文字块列表（与page.get_text("dict")["blocks"]中的文字块一致）
+        已有text_list时接着已解析的页面继续；stop: 只解析到第stop页（不含），None表示到最后一页。
+        返回文档的总页数。
+        """
+        if not hasattr(self, "text_list"):
+            self.text_list = []
+            self.block_list = []
+        with fitz.open(self.path) as doc:
+            for page_index in range(len(self.text_list), min(stop or doc.page_count, doc.page_count)):
+                blocks = doc[page_index].get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]
+                self.block_list.append(blocks)
+                self.text_list.append(''.join(line_text + '\n' for _, line_text in self._iter_lines(blocks)))
+            return doc.page_count
+
+    @staticmethod
+    def _iter_lines(blocks):
+        # 逐行产出 (line, 该行文本)，与page.get_text()的纯文本按行一一对应
+        for block in blocks:
+            if block["type"] == 0:
+                for line in block["lines"]:
+                    yield line, ''.join(span["text"] for span in line["spans"])
+
+    def get_image_path(self, image_path='', thumbnail_dir=None):
+        """
+        将PDF中最大的一张图缩放后保存到image.xxx里面，存到本地目录，返回文件名称，供gitee读取
+        只读取每个图片xref的宽高元数据来挑选最大的图，每个xref只看一次，只解码选中的那一张，
+        内存和耗时不随图片数量增长。
         :param image_path: 图片提取后的保存路径
-        :return:
+        :param thumbnail_dir: 可选的缩略图缓存目录，按pdf内容的hash缓存，命中时不再打开pdf
+        :return: (图片路径, 扩展名)，没有图片时返回 (None, None)
         """
-        # open file
+        if thumbnail_dir is not None:
+            os.makedirs(thumbnail_dir, exist_ok=True)
+            doc_hash = self.source_hash or file_digest(self.path)
+            for cached_name in os.listdir(thumbnail_dir):
+                if cached_name.startswith(doc_hash + '.'):
+                    ext = cached_name.rsplit('.', 1)[1]
+                    im_path = os.path.join(image_path, f"image.{ext}")
+                    shutil.copyfile(os.path.join(thumbnail_dir, cached_name), im_path)
+                    return im_path, ext
+
+        from PIL import Image
         max_size = 0
-        image_list = []
+        max_xref = None
+        seen_xrefs = set()
         with fitz.Document(self.path) as my_pdf_file:
-            # 遍历所有页面
-            for page_number in range(1, len(my_pdf_file) + 1):
-                # 查看独立页面
-                page = my_pdf_file[page_number - 1]
-                # 查看当前页所有图片
-                images = page.get_images()
-                # 遍历当前页面所有图片
-                for image_number, image in enumerate(page.get_images(), start=1):
-                    # 访问图片xref
-                    xref_value = image[0]
-                    # 提取图片信息
-                    base_image = my_pdf_file.extract_image(xref_value)
-                    # 访问图片
-                    image_bytes = base_image["image"]
-                    # 获取图片扩展名
-                    ext = base_image["ext"]
-                    # 加载图片
-                    image = Image.open(io.BytesIO(image_bytes))
-                    image_size = image.size[0] * image.size[1]
-                    if image_size > max_size:
-                        max_size = image_size
-                    image_list.append(image)
-        for image in image_list:
-            image_size = image.size[0] * image.size[1]
-            if image_size == max_size:
-                image_name = f"image.{ext}"
-                im_path = os.path.join(image_path, image_name)
-                print("im_path:", im_path)
-
-                max_pix = 480
-                origin_min_pix = min(image.size[0], image.size[1])
-
-                if image.size[0] > image.size[1]:
-                    min_pix = int(image.size[1] * (max_pix / image.size[0]))
-                    newsize = (max_pix, min_pix)
-                else:
-                    min_pix = int(image.size[0] * (max_pix / image.size[1]))
-                    newsize = (min_pix, max_pix)
-                image = image.resize(newsize)
+            # 遍历所有页面，get_images(full=True)的每一项为 (xref, smask, width, height, ...)
+            for page in my_pdf_file:
+                for image in page.get_images(full=True):
+                    xref_value, width, height = image[0], image[2], image[3]
+                    # 多页共用的图片只看一次
+                    if xref_value in seen_xrefs:
+                        continue
+                    seen_xrefs.add(xref_value)
+                    if width * height > max_size:
+                        max_size = width * height
+                        max_xref = xref_value
+            if max_xref is None:
+                return None, None
+            # 只提取和解码最大的那一张
+            base_image = my_pdf_file.extract_image(max_xref)
+        ext = base_image["ext"]
+        image = Image.open(io.BytesIO(base_image["image"]))
+
+        max_pix = 480
+        if image.size[0] > image.size[1]:
+            min_pix = int(image.size[1] * (max_pix / image.size[0]))
+            newsize = (max_pix, min_pix)
+        else:
+            min_pix = int(image.size[0] * (max_pix / image.size[1]))
+            newsize = (min_pix, max_pix)
+        # JPEG可以直接按目标尺寸的近似值解码，省去解码整张大图
+        image.draft(image.mode, newsize)
+        image = image.resize(newsize)
+        if ext not in ("png", "jpeg", "jpg"):
+            # jpx、jb2等格式PIL不一定能写，统一存成png
+            ext = "png"
+            if image.mode not in ("RGB", "RGBA", "L"):
+                image = image.convert("RGB")
 
-                image.save(open(im_path, "wb"))
-                return im_path, ext
-        return None, None
+        image_name = f"image.{ext}"
+        im_path = os.path.join(image_path, image_name)
+        image.save(im_path)
+        if thumbnail_dir is not None:
+            shutil.copyfile(im_path, os.path.join(thumbnail_dir, f"{doc_hash}.{ext}"))
+        return im_path, ext
 
     # 定义一个函数，根据字体的大小，识别每个章节名称，并返回一个列表
     def get_chapter_names(self, ):
-        # # 打开一个pdf文件
-        doc = fitz.open(self.path)  # pdf文档
-        text_list = [page.get_text() for page in doc]
-        all_text = ''
-        for text in text_list:
-            all_text += text
+        if not hasattr(self, 'all_text'):
+            self._load_pages()
+            self.all_text = ''.join(self.text_list)
+        all_text = self.all_text
         # # 创建一个空列表，用于存储章节名称
         chapter_names = []
         for line in all_text.split('\n'):
@@ -105,19 +391,16 @@ class Paper:
                 if 1 < len(space_split_list) < 5:
                     if 1 < len(point_split_list) < 5 and (
                             point_split_list[0] in self.roman_num or point_split_list[0] in self.digit_num):
-                        print("line:", line)
+                        debug("chapter_name", line=line)
                         chapter_names.append(line)
 
         return chapter_names
 
     def get_title(self):
-        doc = self.pdf  # 打开pdf文件
         max_font_size = 0  # 初始化最大字体大小为0
         max_string = ""  # 初始化最大字体大小对应的字符串为空
         max_font_sizes = [0]
-        for page in doc:  # 遍历每一页
-            text = page.get_text("dict")  # 获取页面上的文本信息
-            blocks = text["blocks"]  # 获取文本块列表
+        for blocks in self.block_list:  # 遍历每一页的文本块列表
             for block in blocks:  # 遍历每个文本块
                 if block["type"] == 0:  # 如果是文字类型
                     if len(block["lines"][0]["spans"])>0:
@@ -126,13 +409,11 @@ class Paper:
                         if font_size > max_font_size:  # 如果字体大小大于当前最大值
                             max_font_size = font_size  # 更新最大值
                             max_string = block["lines"][0]["spans"][0]["text"]  # 更新最大值对应的字符串
-                            print(max_string)
+                            debug("title_candidate", text=max_string, font_size=font_size)
         max_font_sizes.sort()
-        print("max_font_sizes", max_font_sizes[-10:])
+        debug("max_font_sizes", font_sizes=max_font_sizes[-10:])
         cur_title = ''
-        for page in doc:  # 遍历每一页
-            text = page.get_text("dict")  # 获取页面上的文本信息
-            blocks = text["blocks"]  # 获取文本块列表
+        for blocks in self.block_list:  # 遍历每一页的文本块列表
             for block in blocks:  # 遍历每个文本块
                 if block["type"] == 0:  # 如果是文字类型
                     cur_string = ''
@@ -158,132 +439,273 @@ class Paper:
         title = cur_title.replace('\n', ' ')
         return title
 
+    def _body_font_size(self):
+        # 正文字号：按字符数加权出现最多的字号
+        sizes = Counter()
+        for blocks in self.block_list:
+            for line, _ in self._iter_lines(blocks):
+                for span in line["spans"]:
+                    sizes[round(span["size"], 1)] += len(span["text"].strip())
+        return sizes.most_common(1)[0][0] if sizes else 0
+
+    @staticmethod
+    def _line_style(line):
+        # 行的字号（取最大）和是否整行加粗，忽略空白span
+        spans = [span for span in line["spans"] if span["text"].strip()]
+        if not spans:
+            return 0, False
+        size = max(span["size"] for span in spans)
+        bold = all(span["flags"] & 16 or "Bold" in span["font"] or "BX" in span["font"] for span in spans)
+        return size, bold
+
+    def _build_heading_index(self):
+        """
+        对整篇文档只扫描一遍文字块，根据字号、加粗和编号识别章节标题，记录每个标题在all_text中的精确偏移。
+        规则：
+          1. 行首是Abstract/Keywords/Index Terms的，作为前置章节（可与正文在同一行）；
+          2. 整行（去掉编号后）是常见章节名、并且带编号或加粗/字号突出的，作为章节标题，与原来的按名称查找兼容；
+             同名标题先到的不一定胜出：带编号的、字号更大的、加粗的出现会替换前面较弱的一次，
+             这样引言里一个恰好叫Method的表头不会顶替真正的“2 Method”；
+          3. 带编号且字号大于正文或加粗的短行，作为标题，可以识别以算法名命名的章节。
+             编号只占一行、标题在下一行的也合并识别；一级编号必须递增，过滤表格、列表里的编号。
+        """
+        body_size = self._body_font_size()
+        headings = []
+        seen_names = set()
+        strengths = {}  # 一级章节名 -> 已收录那次出现的强度
+        last_number = 0
+        page_offset = 0
+        for page_index, blocks in enumerate(self.block_list):
+            lines = list(self._iter_lines(blocks))
+            offset = page_offset
+            pending_number = None  # 单独成行的编号，等待与下一行合并
+            for line, line_text in lines:
+                line_start = offset
+                offset += len(line_text) + 1
+                stripped = line_text.strip()
+                if not stripped:
+                    continue
+                size, bold = self._line_style(line)
+                emphasized = bold or size >= body_size + 0.9
+
+                front = _FRONT_MATTER.match(stripped)
+                if front:
+                    name = _FRONT_MATTER_NAMES[front.group(1).lower()]
+                    if name not in seen_names:
+                        seen_names.add(name)
+                        body = line_start + line_text.index(stripped) + front.end()
+                        headings.append(Heading(name, page_index, line_start, body, 1))
+                    pending_number = None
+                    continue
+
+                if pending_number is not None and len(stripped) <= 80:
+                    number, number_start = pending_number
+                    numbered = (number[0], number[1], stripped)
+                    heading_start = number_start
+                else:
+                    numbered = _NUMBERED.match(stripped)
+                    numbered = numbered.groups() if numbered else None
+                    heading_start = line_start
+                pending_number = None
+
+                only_number = _NUMBER_ONLY.match(stripped)
+                if only_number and emphasized:
+                    pending_number = (only_number.groups(), line_start)
+                    continue
+
+                title = numbered[2] if numbered else stripped
+                title = title.strip(' :.')
+                if len(stripped) > 80 or len(title.split()) > 12 or not title:
+                    continue
+                canonical = _CANONICAL_NAMES.get(title.lower())
+                level = 1
+                number = None
+                if numbered:
+                    arabic, roman = numbered[0], numbered[1]
+                    if arabic:
+                        level = arabic.count('.') + 1
+                        number = int(arabic.split('.')[0])
+                    else:
+                        number = _ROMAN.get(roman)
+                if canonical is None:
+                    # 非常见章节名：必须带编号、字号突出或加粗，且标题以字母或汉字开头
+                    if not (numbered and emphasized and number and (title[0].isupper() or not title[0].isascii())):
+                        continue
+                elif not (numbered or (emphasized and size >= body_size - 0.5)):
+                    # 常见章节名也要带编号或加粗/字号突出，正文、小字号表格里的同名单词不算
+                    continue
+                if level == 1 and number and number <= last_number:
+                    continue
+                name = canonical or re.sub(r"\s+", ' ', title)
+                if level == 1:
+                    strength = (bool(numbered), size >= body_size + 0.9, bold)
+                    if name in seen_names:
+                        if name not in strengths or strength <= strengths[name]:
+                            continue
+                        # 更强的出现替换前面那次，仍按出现顺序排在最后
+                        headings = [heading for heading in headings if heading.name != name or heading.level != 1]
+                    seen_names.add(name)
+                    strengths[name] = strength
+                    if number:
+                        last_number = number
+                headings.append(Heading(name, page_index, heading_start, heading_start, level))
+            page_offset += len(self.text_list[page_index])
+        return headings
+
     def _get_all_page_index(self):
-        # 定义需要寻找的章节名称列表
-        section_list = ["Abstract",
-                        'Introduction', 'Related Work', 'Background', "Related works",
-                        "Preliminary", "Problem Formulation", "Problem Statement"
-                        'Methods', 'Methodology', "Method", 'Approach', 'Approaches'
-                        # exp
-                        "Materials and Methods", "Experiment Settings", "Experimental Results"
-                        'Experiment', "Experimental Results", "Evaluation", "Experiments",
-                        "Results", 'Findings', 'Data Analysis',
-                        "Discussion", "Results and Discussion", "Conclusion",
-                        'References', "Conclusion Remarks"]
-        # 初始化一个字典来存储找到的章节和它们在文档中出现的页码
+        """
+        建立标题索引self.heading_index和各一级章节在all_text中的区间self.section_spans，
+        返回章节名与页码的对应字典。
+        """
+        self.heading_index = self._build_heading_index()
+        sections = [heading for heading in self.heading_index if heading.level == 1]
+        self.section_spans = {}
         section_page_dict = {}
-        # 遍历每一页文档
-        for page_index, page in enumerate(self.pdf):
-            # 获取当前页面的文本内容
-            cur_text = page.get_text()
-            cur_text = re.sub(r'\d+','',cur_text)
-            cur_text = cur_text.strip()
-            # print(cur_text)
-            # 遍历需要寻找的章节名称列表
-            for section_name in section_list:
-                # 将章节名称转换成大写形式
-                section_name_upper = section_name.upper()
-                # 如果当前页面包含"Abstract"这个关键词
-                if "Abstract" == section_name and section_name in cur_text:
-                    if section_name not in list(section_page_dict.keys()):
-                        # 将"Abstract"和它所在的页码加入字典中
-                        section_page_dict[section_name] = page_index
-                # 如果当前页面包含章节名称，则将章节名称和它所在的页码加入字典中
-                else:
-                    if section_name + '\n' in cur_text:
-                        if section_name not in list(section_page_dict.keys()):
-                            section_page_dict[section_name] = page_index
-                    elif section_name_upper + '\n' in cur_text:
-                        if section_name not in list(section_page_dict.keys()):
-                            section_page_dict[section_name] = page_index
-        # 返回所有找到的章节名称及它们在文档中出现的页码
+        for index, heading in enumerate(sections):
+            end = sections[index + 1].start if index + 1 < len(sections) else len(self.all_text)
+            self.section_spans[heading.name] = (heading.body, end)
+            section_page_dict[heading.name] = heading.page
         return section_page_dict
 
     def _get_all_page(self):
         """
-        获取PDF文件中每个页面的文本信息，并将文本信息按照章节组织成字典返回。
+        按标题索引中的偏移切出每个章节的文本，并将文本信息按照章节组织成字典返回。
+        章节文本在访问时才切出和清洗。
 
         Returns:
-            section_dict (dict): 每个章节的文本信息字典，key为章节名，value为章节文本。
+            section_dict (SectionTexts): 每个章节的文本信息字典，key为章节名，value为章节文本。
         """
-        text = ''
-        text_list = []
-        section_dict = {}
-
-        # 先处理Abstract章节
-        for page_index, page in enumerate(self.pdf):
-            cur_text = page.get_text()
-            # 如果该页面是Abstract章节所在页面
-            if page_index == list(self.section_page_dict.values())[0]:
-                abs_str = "Abstract"
-                # 获取Abstract章节的起始位置
-                first_index = cur_text.find(abs_str)
-                # 查找下一个章节的关键词，这里是Introduction
-                intro_str = "Introduction"
-                key_str = 'Keywords'
-                if intro_str in cur_text:
-                    second_index = cur_text.find(intro_str)
-                elif intro_str.upper() in cur_text:
-                    second_index = cur_text.find(intro_str.upper())
-                else:
-                    if key_str in cur_text:
-                        second_index = cur_text.find(key_str)
-                    else:
-                        second_index = cur_text.find(key_str.upper())
+        return SectionTexts(self.all_text, self.section_spans)
 
 
-                # 将Abstract章节内容加入字典中
-                abs_str_texts = cur_text[first_index+len(abs_str)+1:second_index].replace('-\n','').replace('\n', ' ').split('I.')[0].split("II.")[0]
-                abs_str_texts = re.sub(r"\d+",'',abs_str_texts)
-                section_dict[abs_str] = abs_str_texts
+def file_digest(path, chunk_size=1 << 20):
+    # 计算pdf文件内容的sha256
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
 
-        # 再处理其他章节：
-        text_list = [page.get_text() for page in self.pdf]
-        for sec_index, sec_name in enumerate(self.section_page_dict):
-            print(sec_index, sec_name, self.section_page_dict[sec_name])
-            if sec_index <= 0:
-                continue
-            else:
-                # 直接考虑后面的内容：
-                start_page = self.section_page_dict[sec_name]
-                if sec_index < len(list(self.section_page_dict.keys())) - 1:
-                    end_page = self.section_page_dict[list(self.section_page_dict.keys())[sec_index + 1]]
-                else:
-                    end_page = len(text_list)
-                print("start_page, end_page:", start_page, end_page)
-                cur_sec_text = ''
-                if end_page - start_page == 0:
-                    if sec_index < len(list(self.section_page_dict.keys())) - 1:
-                        next_sec = list(self.section_page_dict.keys())[sec_index + 1]
-                        if text_list[start_page].find(sec_name) == -1:
-                            start_i = text_list[start_page].find(sec_name.upper())
-                        else:
-                            start_i = text_list[start_page].find(sec_name)
-                        if text_list[start_page].find(next_sec) == -1:
-                            end_i = text_list[start_page].find(next_sec.upper())
-                        else:
-                            end_i = text_list[start_page].find(next_sec)
-                        cur_sec_text += text_list[start_page][start_i:end_i]
-                else:
-                    for page_i in range(start_page, end_page):
-                        #                         print("page_i:", page_i)
-                        if page_i == start_page:
-                            if text_list[start_page].find(sec_name) == -1:
-                                start_i = text_list[start_page].find(sec_name.upper())
-                            else:
-                                start_i = text_list[start_page].find(sec_name)
-                            cur_sec_text += text_list[page_i][start_i:]
-                        elif page_i < end_page:
-                            cur_sec_text += text_list[page_i]
-                        elif page_i == end_page:
-                            if sec_index < len(list(self.section_page_dict.keys())) - 1:
-                                next_sec = list(self.section_page_dict.keys())[sec_index + 1]
-                                if text_list[start_page].find(next_sec) == -1:
-                                    end_i = text_list[start_page].find(next_sec.upper())
-                                else:
-                                    end_i = text_list[start_page].find(next_sec)
-                                cur_sec_text += text_list[page_i][:end_i]
-                cur_contents = cur_sec_text.replace('-\n', '').replace('\n', ' ')
-                cur_contents = re.sub(r"\d+",'',cur_contents)
-                section_dict[sec_name] = cur_contents
-        return section_dict
\ No newline at end of file
+
+def parse_paper(path, source_hash=None, lazy=False):
+    # 进程池worker：解析一篇pdf（lazy时只解析前几页），只返回可pickle的结果
+    paper = Paper(path=path, lazy=lazy)
+    paper.source_hash = source_hash
+    return paper.to_dict()
+
+
+class ParsePool:
+    """
+    解析用的进程池（spawn），可以在多次parse_papers之间共用：常驻的watch_folder/work_queue每来一批pdf
+    不必重新启动解析进程。第一次提交任务时才启动进程，全部命中缓存时不启动。
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        with self._lock:
+            if self._executor is not None:
+                try:
+                    return self._executor.submit(fn, *args)
+                except BrokenProcessPool:
+                    # 有解析进程崩溃（段错误、内存不足被杀掉）后整个进程池不能再用，换一个新的
+                    self._executor.shutdown(wait=False)
+            # 用spawn而不是fork，避免在带Qt线程的进程里fork
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._executor.submit(fn, *args)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+
+def parse_papers(paths, max_workers=None, cache=None, max_pending=None, lazy=False, pool=None):
+    """
+    用进程池并行解析多篇pdf，按完成顺序逐个产出 (path, paper, error)，是一个惰性生成器：
+    调用方每取走一篇才会提交新的解析任务。
+    解析失败的pdf产出 (path, None, error)，不会中断整批。
+    解析进程崩溃（段错误、内存不足被杀掉）时进程池里在途的任务都会失败：换一个新的进程池，
+    把这些pdf逐个单独重新解析，第二次还让进程崩溃的那个pdf产出错误，其余的照常解析。
+    cache: 可选的paper_cache.PaperCache，命中的pdf直接从缓存加载，不再提交给进程池。
+    max_pending: 同时在解析或等待被取走的pdf数上限，默认是进程数的2倍。
+    lazy: 只解析每篇的前几页（见Paper的lazy），后面的章节在访问时才在当前进程里解析；
+          只解析了前几页的结果不写入缓存，缓存里完整的结果照常使用。
+    pool: 可选的ParsePool，传入时用它解析（用完不关闭，max_workers不起作用），否则新建一个、解析完关闭。
+    """
+    own_pool = pool is None
+    pool = pool or ParsePool(max_workers)
+    # 同时提交的解析任务有上限，解析结果被取走后才补充新任务，内存只与并发数有关、与整批大小无关
+    max_pending = max_pending or pool.max_workers * 2
+    paths = iter(paths)
+    exhausted = False
+    futures = {}
+    # 进程池崩溃时在途的 (path, source_hash)，逐个单独重新解析（isolated是正在单独解析的任务）；
+    # crashes: 每个pdf遇到崩溃的次数
+    retry = deque()
+    isolated = set()
+    crashes = Counter()
+    try:
+        while True:
+            if retry and not futures:
+                path, source_hash = retry.popleft()
+                future = pool.submit(parse_paper, path, source_hash, lazy)
+                futures[future] = (path, source_hash)
+                isolated.add(future)
+            while not retry and not isolated and not exhausted and len(futures) < max_pending:
+                path = next(paths, None)
+                if path is None:
+                    exhausted = True
+                    break
+                try:
+                    source_hash = file_digest(path)
+                except OSError as e:
+                    yield path, None, e
+                    continue
+                # 缓存命中的直接产出，不提交给进程池
+                start = time.perf_counter()
+                state = cache.get(cache.key(source_hash)) if cache is not None else None
+                if state is not None:
+                    state["path"] = path
+                    paper = Paper.from_dict(state)
+                    # 缓存命中时只有加载耗时，原始解析耗时不再计入
+                    paper.timings = {"cache_load": time.perf_counter() - start}
+                    yield path, paper, None
+                    continue
+                futures[pool.submit(parse_paper, path, source_hash, lazy)] = (path, source_hash)
+            if not futures:
+                return
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, source_hash = futures.pop(future)
+                isolated.discard(future)
+                try:
+                    state = future.result()
+                except BrokenProcessPool:
+                    crashes[path] += 1
+                    if crashes[path] >= 2:
+                        yield path, None, RuntimeError("the parse worker process died (crash or out of memory) "
+                                                       "while parsing this file")
+                    else:
+                        retry.append((path, source_hash))
+                    continue
+                except Exception as e:
+                    yield path, None, e
+                    continue
+                if cache is not None and not state.get("partial"):
+                    cache.put(cache.key(state["source_hash"]), state)
+                yield path, Paper.from_dict(state), None
+    finally:
+        if own_pool:
+            pool.shutdown()
@@ -0,0 +1,190 @@
+"""
+送给LLM之前压缩章节文本，去掉对审阅没有价值的内容，减少每次调用的输入token（延迟和费用随之下降）：
+- 参考文献：从"References"/"Bibliography"行开始到章节结束；
+- 每页重复出现的页眉页脚（按页统计页首页尾的行，数字归一化后出现在足够多页上的）以及页首页尾的页码行；
+- 图表标题（"Figure 3:"、"Fig. 2."、"Table 1:" 开头的行，以及最多两行小写开头的续行，遇到句号、空行或数据行为止）；
+- 版权、arXiv编号、"Preprint"、会议说明等模板文字，脚注里的链接；
+- 正文中的数字引用标记 [12] / [3, 5-7]（[0, 1]、"∈ [1, 5]"这类区间不算）和网址；
+- 断词连字符和换行。
+数字（实验结果）全部保留。所有规则都是预先编译的正则，对每个章节只逐行扫描一遍。
+"""
+from collections import Counter
+from collections.abc import Mapping
+import re
+
+from token_budget import count_tokens
+
+_REFERENCES = re.compile(r"^(?:\d{1,2}\.?\s+|[IVX]{1,4}\.\s+)?(?:references|bibliography|reference)\s*$", re.I)
+_CAPTION = re.compile(r"^(?:figure|fig\.|table|tab\.)\s*[A-Z]?\d+[a-z]?\s*[:.|]", re.I)
+_BOILERPLATE = re.compile(
+    r"^(?:arxiv:\s*\d{4}\.\d{4,5}|preprint\b|under review\b|published as a conference paper"
+    r"|proceedings of\b|permission to make digital|copyright\b|©|\(c\)\s*\d{4}|licensed under"
+    r"|\d{1,2}\s*(?:https?://|www\.)|equal contribution|corresponding author|code is available)", re.I)
+_PAGE_NUMBER = re.compile(r"^(?:page\s*)?\d{1,4}(?:\s*(?:/|of)\s*\d{1,4})?$", re.I)
+# 引用编号从1开始；以0开头的[0, 1]、[0.5, 1]是数值区间
+_CITATION = re.compile(r"\s*\[[1-9]\d{0,2}(?:\s*[,;–-]\s*[1-9]\d{0,2})*\]")
+# 方括号前是这些词或符号时是区间，如 "x ∈ [1, 5]"、"in the range [2, 8]"
+_RANGE_CUE = re.compile(r"(?:[=∈≤≥<>]|\b(?:range|interval|between|within))\s*$", re.I)
+_URL = re.compile(r"https?://\S+|www\.\S+")
+# 表格的数据行：至少两个独立的数
+_NUMERIC_ROW = re.compile(r"(?:^|\s)[-+]?\d+(?:\.\d+)?%?(?=\s|$)(?:.*?(?:^|\s)[-+]?\d+(?:\.\d+)?%?(?=\s|$))")
+# 图表标题最多再吃掉几行续行
+_CAPTION_LINES = 2
+_SPACES = re.compile(r"\s+")
+_DIGITS = re.compile(r"\d+")
+
+
+def _strip_citation(match):
+    if _RANGE_CUE.search(match.string[max(match.start() - 12, 0):match.start()]):
+        return match.group(0)
+    return ''
+
+
+def _normalize(line):
+    # 页眉页脚里常带页码，数字归一化后再比较
+    return _DIGITS.sub('#', line.strip().lower())
+
+
+class PromptCompressor:
+    def __init__(self, references=True, repeated_lines=True, captions=True, boilerplate=True, citations=True,
+                 edge_lines=3, min_page_fraction=0.3):
+        """
+        各开关决定去掉哪类内容。
+        edge_lines: 每页页首、页尾各看几行来找页眉页脚；
+        min_page_fraction: 一行（数字归一化后）至少出现在这个比例的页上（且不少于2页）才算页眉页脚。
+        """
+        self.references = references
+        self.repeated_lines = repeated_lines
+        self.captions = captions
+        self.boilerplate = boilerplate
+        self.citations = citations
+        self.edge_lines = edge_lines
+        self.min_page_fraction = min_page_fraction
+
+    def page_edges(self, all_text, page_offsets):
+        """
+        由全文和每页起始偏移统计每页页首/页尾的行，返回 (重复行集合, 页码行偏移集合)：
+        重复行是数字归一化后出现在足够多页上的行；页码行是页首页尾只有一个数字的行在all_text中的起始偏移。
+        只有一个数字的行只在页首页尾才当作页码去掉，正文和表格里的数字保留。
+        """
+        if not self.repeated_lines or not page_offsets:
+            return set(), set()
+        counts = Counter()
+        numbers = set()
+        bounds = list(page_offsets) + [len(all_text)]
+        for start, end in zip(bounds, bounds[1:]):
+            lines = []
+            position = start
+            for line in all_text[start:end].split('\n'):
+                if line.strip():
+                    lines.append((position, line))
+                position += len(line) + 1
+            edges = lines[:self.edge_lines] + lines[-self.edge_lines:]
+            numbers.update(position for position, line in edges if _PAGE_NUMBER.match(line.strip()))
+            counts.update({_normalize(line) for _, line in edges})
+        min_pages = max(2, int(len(page_offsets) * self.min_page_fraction))
+        repeated = {line for line, count in counts.items() if count >= min_pages
+                    and not _PAGE_NUMBER.match(line.replace('#', '1'))}
+        return repeated if len(page_offsets) > 1 else set(), numbers
+
+    def compress(self, text, repeated=frozenset(), page_numbers=frozenset(), offset=0):
+        """
+        压缩一段原始章节文本（保留换行的），返回清洗后的单行文本。
+        repeated / page_numbers: page_edges的结果；offset: text在all_text中的起始偏移，用于对应页码行。
+        """
+        kept = []
+        # 还可以当作图表标题续行去掉的行数
+        caption = 0
+        position = offset
+        for line in text.split('\n'):
+            line_start = position
+            position += len(line) + 1
+            stripped = line.strip()
+            if not stripped:
+                caption = 0
+                continue
+            if self.references and _REFERENCES.match(stripped):
+                # 参考文献之后直到章节结束都不要
+                break
+            if caption and stripped[:1].islower() and not _NUMERIC_ROW.search(stripped):
+                # 图表标题的续行（接着上一行的句子，小写开头），到句号为止；表头、表格的数据行和新段落保留
+                caption = 0 if stripped.endswith('.') else caption - 1
+                continue
+            caption = 0
+            if self.captions and _CAPTION.match(stripped):
+                caption = 0 if stripped.endswith('.') else _CAPTION_LINES
+                continue
+            if line_start in page_numbers or (repeated and _normalize(stripped) in repeated):
+                continue
+            if self.boilerplate and _BOILERPLATE.match(stripped):
+                continue
+            if self.citations:
+                stripped = _URL.sub('', _CITATION.sub(_strip_citation, stripped))
+            if kept and kept[-1].endswith('-') and stripped[:1].islower():
+                # 断词连字符：与上一行拼接
+                kept[-1] = kept[-1][:-1] + stripped
+            else:
+                kept.append(stripped)
+        return _SPACES.sub(' ', ' '.join(kept)).strip()
+
+    def wrap(self, paper):
+        """返回一个代替paper送去审阅的CompressedPaper：章节文本换成压缩视图，其余属性不变。"""
+        return CompressedPaper(paper, self)
+
+
+class CompressedPaper:
+    # 除section_text_dict外的属性（title、path、all_text等）都转给原来的Paper
+
+    def __init__(self, paper, compressor):
+        self.paper = paper
+        self.section_text_dict = CompressedSections(paper, compressor)
+
+    def __getattr__(self, name):
+        return getattr(self.paper, name)
+
+
+class CompressedSections(Mapping):
+    """
+    章节名 -> 压缩后的章节文本，访问时才压缩，结果缓存；
+    stats记录每个访问过的章节压缩前后的token数，用于汇报每篇论文省下的token。
+    """
+
+    def __init__(self, paper, compressor):
+        self.sections = paper.section_text_dict
+        self.compressor = compressor
+        all_text = getattr(paper, "all_text", None)
+        self.repeated, self.page_numbers = set(), set()
+        if all_text:
+            self.repeated, self.page_numbers = compressor.page_edges(all_text, getattr(paper, "page_offsets", None))
+        self.cache = {}
+        self.stats = {}
+
+    def __getitem__(self, name):
+        if name not in self.cache:
+            raw = self.sections.raw(name) if hasattr(self.sections, "raw") else self.sections[name]
+            if name == "title" or not isinstance(raw, str):
+                self.cache[name] = raw
+            else:
+                spans = getattr(self.sections, "spans", {})
+                offset = spans[name][0] if name in spans else -1
+                compressed = self.compressor.compress(raw, self.repeated, self.page_numbers if offset >= 0 else (),
+                                                      offset)
+                # 压缩前按原来的清洗结果计，即不压缩时会送进prompt的文本
+                self.stats[name] = (count_tokens(self.sections[name]), count_tokens(compressed))
+                self.cache[name] = compressed
+        return self.cache[name]
+
+    def __iter__(self):
+        return iter(self.sections)
+
+    def __len__(self):
+        return len(self.sections)
+
+    def __contains__(self, name):
+        return name in self.sections
+
+    def tokens_saved(self):
+        # 返回 (压缩前token数, 压缩后token数)，只统计访问过的章节
+        before = sum(original for original, _ in self.stats.values())
+        after = sum(compressed for _, compressed in self.stats.values())
+        return before, after
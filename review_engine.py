@@ -0,0 +1,186 @@
+"""
+不依赖PyQt5的批量审阅入口，供命令行、批处理服务器和GUI共用。
+导入本模块很轻：PyMuPDF、openai等重模块只在真正解析和调用时才加载。
+
+    from review_engine import collect_pdfs, run_review
+    run_review(collect_pdfs(["papers/", "more/*.pdf"]), domain="Biology", api_key="sk-...", workers=8)
+"""
+import glob
+import os
+
+
+def collect_pdfs(inputs):
+    """
+    把目录、通配符和文件路径展开成去重后的pdf路径列表，目录会递归查找。
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = glob.glob(os.path.join(item, "**", "*.pdf"), recursive=True)
+        elif glob.has_magic(item):
+            matches = glob.glob(item, recursive=True)
+        else:
+            matches = [item]
+        paths.extend(sorted(match for match in matches if match.lower().endswith(".pdf")))
+    seen = set()
+    unique_paths = []
+    for path in paths:
+        real_path = os.path.realpath(path)
+        if real_path not in seen:
+            seen.add(real_path)
+            unique_paths.append(path)
+    return unique_paths
+
+
+def file_stem(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def search_index(query, cache_dir='./cache', k=5):
+    """在cache_dir下的章节索引里查找与query最相似的章节，返回 [(相似度, 行信息, 正文片段), ...]。"""
+    from section_index import SectionIndex
+    index = SectionIndex(os.path.join(cache_dir, "index"))
+    return [(score, record, index.text(row)) for score, row, record in index.search(query, k=k)]
+
+
+def run_review(paths, domain, api_key='', output_dir='./review/', workers=4, parse_workers=None,
+               cache_dir='./cache', use_cache=True, replay_only=False, resume=True, map_reduce=False,
+               max_prompt_tokens=2500, completion=None, file_format='txt', progress=print,
+               requests_per_minute=3500, tokens_per_minute=90000, max_retries=6, max_in_flight=None, trace_path='',
+               backend="http", base_url=None, models=None, combined=False, dedup_threshold=0.8,
+               related_work=False, compress=True, triage=False, store_path='', index_sections=True,
+               scheduler=None, parse_pool=None, store=None, on_failure=None):
+    """
+    解析并审阅一批pdf，返回写出的报告路径列表。
+    workers: 同时审阅的论文数（LLM并发上限）；parse_workers: 解析进程数，None表示CPU核数。
+    use_cache: 是否使用解析缓存和LLM回答缓存；replay_only: 只用缓存里的回答，不调用API。
+    resume: 是否按output_dir下的清单跳过已完成的论文和阶段。
+    completion: 可替换的补全函数；None时按backend创建（见llm_backend.create_backend），
+                base_url可指向任何OpenAI兼容的服务。
+    models: 可选的 阶段 -> 模型名 字典（见llm_backend.stage_models），如summary用便宜模型、conclusion用强模型。
+    combined: 每篇论文只发一次请求完成三部分审阅（更快、更省token），默认仍是三步串行。
+    dedup_threshold: 审阅前检测重复论文，估计的Jaccard相似度不低于它的近似重复版本只审阅一次；
+                     0表示只检测完全重复，None表示不去重。
+    related_work: 在conclusion阶段的prompt里加入本地章节索引中其他论文的相关内容。
+                  使用缓存时，解析出的每篇论文都会加入cache_dir/index下的章节索引（见section_index）。
+    triage: 快速分拣：每篇只解析前几页（见pdf_parser.Paper的lazy），只根据标题和摘要写summary；
+            不加入章节索引（否则要解析全文）。
+    compress: 章节文本送进prompt前去掉参考文献、页眉页脚、图表标题和模板文字（见prompt_compression）。
+    requests_per_minute / tokens_per_minute / max_retries: 账号配额和重试次数，所有请求共用一个调度器。
+    max_in_flight: 同时在途的LLM请求数上限（包括map-reduce的分块请求），默认等于workers。
+    scheduler / parse_pool: 可选的、在多次调用之间共用的scheduler.RequestScheduler和pdf_parser.ParsePool
+                            （见shared_review_options），传入scheduler时上面四个参数不起作用。
+    index_sections: 使用缓存时把解析出的论文加入章节索引；多个进程共用cache_dir时（见work_queue）要关掉。
+    store_path: 审阅结果的sqlite库（见review_store），默认是output_dir/reviews.sqlite，None表示不写。
+    store: 可选的已经打开的ReviewStore（或有同样add方法的对象），传入时store_path不起作用，用完不关闭。
+    trace_path: 计时、token和费用的JSONL跟踪文件，默认写到output_dir/trace.jsonl，None表示不写文件。
+    progress: 进度回调，接收一行状态文本；最后一行带有整批的调用数、token数、估算费用和耗时摘要。
+    on_failure: 可选回调 on_failure(path, error)，某个pdf解析或审阅失败时以传入的路径和异常调用。
+    """
+    from llm_backend import create_backend
+    from pdf_parser import parse_papers
+    from prompt_compression import PromptCompressor
+    from scheduler import RequestScheduler
+    from telemetry import Telemetry
+    from utils import review_by_chatgpt
+
+    paper_cache = None
+    completion_cache = None
+    index = None
+    if (use_cache or replay_only) and index_sections:
+        from section_index import SectionIndex
+        index = SectionIndex(os.path.join(cache_dir, "index"))
+    if use_cache or replay_only:
+        from llm_cache import CompletionCache
+        from paper_cache import PaperCache
+        paper_cache = PaperCache(os.path.join(cache_dir, "papers"))
+        completion_cache = CompletionCache(os.path.join(cache_dir, "completions.sqlite"), replay_only=replay_only)
+    if scheduler is None:
+        scheduler = RequestScheduler(requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute,
+                                     max_retries=max_retries, max_in_flight=max_in_flight or workers)
+    # 共用的调度器从创建起一直在计数，摘要里只算这一批的
+    stats_before = scheduler.stats()
+    dedup = None
+    if dedup_threshold is not None:
+        from dedup import Deduplicator
+        dedup = Deduplicator(threshold=dedup_threshold or None)
+    if completion is None:
+        completion = create_backend(backend, api_key=api_key, base_url=base_url)
+    if trace_path == '':
+        trace_path = os.path.join(output_dir, "trace.jsonl")
+    telemetry = Telemetry(trace_path)
+    own_store = store is None and store_path is not None
+    if own_store:
+        from review_store import ReviewStore
+        store = ReviewStore(store_path or os.path.join(output_dir, "reviews.sqlite"))
+    manifest = None
+    if resume:
+        from review_manifest import ReviewManifest
+        manifest = ReviewManifest(output_dir)
+
+    def parsed_papers():
+        # 多进程并行解析，按完成顺序汇报进度；单个pdf解析失败只跳过该文件。
+        # 这是一个生成器，审阅环节取一篇才解析一篇，论文一解析完就开始审阅
+        for file_path, paper, error in parse_papers(paths, max_workers=parse_workers, cache=paper_cache,
+                                                    lazy=triage, pool=parse_pool):
+            file_name = file_stem(file_path)
+            if error is not None:
+                progress(f"Failed to load {file_name}: {error}")
+                if on_failure is not None:
+                    on_failure(file_path, error)
+                continue
+            telemetry.record_parse(file_name, paper.timings)
+            if index is not None and not triage:
+                index.add_paper(paper)
+            progress(f"Finished loading {file_name} ({sum(paper.timings.values()):.2f}s).")
+            yield paper
+
+    progress("Start reviewing papers.")
+    try:
+        report_paths = review_by_chatgpt(parsed_papers(), api_key=api_key, key_word=domain, export_path=output_dir,
+                                         file_format=file_format, max_workers=workers,
+                                         completion=completion, cache=completion_cache, manifest=manifest,
+                                         max_prompt_tokens=max_prompt_tokens, map_reduce=map_reduce,
+                                         progress=progress, scheduler=scheduler, telemetry=telemetry,
+                                         models=models, combined=combined, dedup=dedup,
+                                         compressor=PromptCompressor() if compress else None, triage=triage,
+                                         store=store,
+                                         on_failure=on_failure,
+                                         related=index.related_context if related_work and index is not None else None)
+    finally:
+        telemetry.close()
+        if index is not None:
+            index.close()
+        if own_store:
+            store.close()
+    stats = {name: count - stats_before[name] for name, count in scheduler.stats().items()}
+    progress(f"All files have been reviewed ({len(report_paths)}/{len(paths)} reports, "
+             f"{stats['retried']} retries, {stats['failed']} failed; {telemetry.summary_line()}).")
+    return report_paths
+
+
+def shared_review_options(review_options, workers=None):
+    """
+    给多次调用run_review的常驻进程（watch_folder、work_queue）用：按review_options创建一次补全后端、
+    请求调度器和解析进程池，放进review_options，之后每次调用都复用它们。
+    这样并发的调用一起遵守rpm/tpm配额和在途请求数上限，HTTP连接池和解析进程也不必每篇重建。
+    workers: 进程里同时在审的论文数，作为解析进程数和默认的在途请求数上限；None时按review_options。
+    返回解析进程池，调用方用完后调用它的shutdown()。
+    """
+    from llm_backend import create_backend
+    from pdf_parser import ParsePool
+    from scheduler import RequestScheduler
+
+    if review_options.get("completion") is None:
+        review_options["completion"] = create_backend(review_options.get("backend", "http"),
+                                                      api_key=review_options.get("api_key", ''),
+                                                      base_url=review_options.get("base_url"))
+    if review_options.get("scheduler") is None:
+        review_options["scheduler"] = RequestScheduler(
+            requests_per_minute=review_options.pop("requests_per_minute", 3500),
+            tokens_per_minute=review_options.pop("tokens_per_minute", 90000),
+            max_retries=review_options.pop("max_retries", 6),
+            max_in_flight=review_options.pop("max_in_flight", None) or workers or review_options.get("workers", 4))
+    if review_options.get("parse_pool") is None:
+        review_options["parse_pool"] = ParsePool(workers or review_options.get("parse_workers"))
+    return review_options["parse_pool"]
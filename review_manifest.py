@@ -0,0 +1,92 @@
+"""
+批量审阅的断点续跑清单。
+记录每篇论文每个阶段（summary、method、conclusion）是否完成以及输出文件位置，
+重新运行时跳过已完成的阶段，只为剩下的请求付费。
+清单是追加写入的JSONL，每完成一个阶段或一份报告只追加一行，不重写整个清单；
+打开时按顺序重放各行（后面的记录覆盖前面的），崩溃时写了一半的最后一行忽略。
+"""
+import hashlib
+import json
+import os
+import threading
+
+STAGES = ("summary", "method", "conclusion")
+
+
+class ReviewManifest:
+    def __init__(self, export_path, name="manifest.jsonl"):
+        self.export_path = export_path
+        self.manifest_path = os.path.join(export_path, name)
+        self.stage_dir = os.path.join(export_path, ".stages")
+        self._lock = threading.Lock()
+        os.makedirs(self.stage_dir, exist_ok=True)
+        self.papers = {}
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._apply(json.loads(line))
+                    except (ValueError, KeyError):
+                        continue
+        except OSError:
+            pass
+
+    @staticmethod
+    def paper_key(paper, file_name, key_word, mode="full"):
+        # 同一篇pdf换研究领域或审阅模式（完整、合并、分拣）审阅是另一项任务，所以key里带上领域和模式；
+        # 没有内容哈希时对完整路径取哈希，不同目录下同名的pdf不会共用一个key
+        source = getattr(paper, "source_hash", None)
+        if not source:
+            location = os.path.abspath(getattr(paper, "path", None) or file_name)
+            source = hashlib.sha1(location.encode("utf-8")).hexdigest()
+        domain = hashlib.sha1(f"{key_word}#{mode}".encode("utf-8")).hexdigest()[:8]
+        return f"{source[:16]}-{domain}"
+
+    def _apply(self, record):
+        entry = self._entry(record["key"], record.get("file_name"))
+        if "stage" in record:
+            entry["stages"][record["stage"]] = {"done": True, "output": record["output"]}
+        if "report" in record:
+            entry["report"] = record["report"]
+
+    def _append(self, record):
+        # 记录一行并更新内存里的清单；调用方持有self._lock
+        self._apply(record)
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _entry(self, key, file_name=None):
+        entry = self.papers.setdefault(key, {"file_name": file_name, "stages": {}, "report": None})
+        if file_name is not None:
+            entry["file_name"] = file_name
+        return entry
+
+    def get_stage(self, key, stage):
+        # 已完成则返回该阶段的输出文本，否则返回None
+        with self._lock:
+            record = self.papers.get(key, {}).get("stages", {}).get(stage)
+        if not record or not record.get("done"):
+            return None
+        try:
+            with open(record["output"], encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def mark_stage(self, key, stage, text, file_name=None):
+        output = os.path.join(self.stage_dir, key, stage + ".txt")
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text)
+        with self._lock:
+            self._append({"key": key, "file_name": file_name, "stage": stage, "output": output})
+
+    def get_report(self, key):
+        # 已写出完整报告的论文返回报告路径
+        with self._lock:
+            report = self.papers.get(key, {}).get("report")
+        return report if report and os.path.exists(report) else None
+
+    def mark_report(self, key, report_path, file_name=None):
+        with self._lock:
+            self._append({"key": key, "file_name": file_name, "report": report_path})
@@ -0,0 +1,210 @@
+"""
+审阅结果的结构化存储（sqlite）：每篇论文一行，包含标题、关键词、各阶段输出、从conclusion里解析出的0~10分、
+耗时、token数和pdf内容hash，可以直接按领域筛选、按分数排序，不用再grep文本报告。
+写入先放在缓冲区，攒够一批再在一个事务里提交；txt/markdown汇总报告按需从库里生成。
+
+    store = ReviewStore("./review/reviews.sqlite")
+    for row in store.query(domain="Biology", min_score=7, limit=20):
+        print(row["score"], row["title"])
+    store.export("top.md", domain="Biology", min_score=7)
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# 评分项的标签 "Score: 7.5"、"Score (0~10): 8/10"、"- (4): Score: **6**"；正文里的"F1 score by 3.2"不算
+_SCORE = re.compile(r"score(?:\s*\(?\s*0\s*(?:~|-|–|to)\s*10\s*\)?)?\s*[:：]\s*\**\s*(\d{1,2}(?:\.\d+)?)", re.I)
+# 没有标签时的写法："a score of 6 out of 10"、"6/10"
+_OUT_OF_TEN = re.compile(r"(\d{1,2}(?:\.\d+)?)\s*(?:/|out of)\s*10\b", re.I)
+_KEYWORDS = re.compile(r"keywords?\s*[:：]\s*(.+)", re.I)
+COLUMNS = ("paper_key", "source_hash", "domain", "mode", "name", "path", "title", "keywords", "summary", "method",
+           "conclusion", "score", "report_path", "timings", "review_s", "calls", "prompt_tokens",
+           "completion_tokens", "cost", "created_at")
+
+
+def parse_score(text):
+    # 从conclusion里解析0~10的分数：取最后一个带Score标签的数，没有时取最后一个"x/10"，都没有或超出范围时返回None
+    for pattern in (_SCORE, _OUT_OF_TEN):
+        scores = [float(match.group(1)) for match in pattern.finditer(text or '')]
+        scores = [score for score in scores if 0 <= score <= 10]
+        if scores:
+            return scores[-1]
+    return None
+
+
+def review_mode(triage=False, combined=False):
+    # 审阅模式，与ReviewStore.add的mode一致：分拣只有summary，合并模式一次请求，否则是三步完整审阅
+    return "triage" if triage else "combined" if combined else "full"
+
+
+def parse_keywords(text):
+    match = _KEYWORDS.search(text or '')
+    return match.group(1).strip().rstrip(';.') if match else ''
+
+
+class ReviewStore:
+    def __init__(self, db_path='./review/reviews.sqlite', batch_size=32):
+        """
+        batch_size: 缓冲多少条审阅结果后在一个事务里写入；flush()/close()时写入剩余的。
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending = []
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS reviews (
+                id INTEGER PRIMARY KEY,
+                paper_key TEXT NOT NULL,
+                source_hash TEXT,
+                domain TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                name TEXT,
+                path TEXT,
+                title TEXT,
+                keywords TEXT,
+                summary TEXT,
+                method TEXT,
+                conclusion TEXT,
+                score REAL,
+                report_path TEXT,
+                timings TEXT,
+                review_s REAL,
+                calls INTEGER,
+                prompt_tokens INTEGER,
+                completion_tokens INTEGER,
+                cost REAL,
+                created_at REAL,
+                UNIQUE (paper_key, domain, mode)
+            )""")
+        # 按领域筛选、按分数排序，以及按pdf hash判断是否审阅过
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_reviews_domain_score ON reviews(domain, score DESC)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_reviews_score ON reviews(score DESC)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_reviews_source_hash ON reviews(source_hash)")
+        self._conn.commit()
+
+    def add(self, paper, name, domain, stages, mode="full", report_path=None, totals=None):
+        """
+        记录一篇论文的审阅结果。stages: {阶段: 输出}；totals: telemetry.Telemetry.paper_summary的结果。
+        同一篇论文（pdf hash）在同一领域、同一模式下重复审阅时覆盖旧的结果。
+        """
+        totals = totals or {}
+        summary = stages.get("summary", '')
+        conclusion = stages.get("conclusion", '')
+        source_hash = getattr(paper, "source_hash", None)
+        row = {
+            "paper_key": source_hash or getattr(paper, "path", None) or name,
+            "source_hash": source_hash,
+            "domain": domain,
+            "mode": mode,
+            "name": name,
+            "path": getattr(paper, "path", None),
+            "title": paper.title,
+            "keywords": parse_keywords(summary),
+            "summary": summary,
+            "method": stages.get("method", ''),
+            "conclusion": conclusion,
+            "score": parse_score(conclusion),
+            "report_path": report_path,
+            "timings": json.dumps(getattr(paper, "timings", {}) or {}),
+            "review_s": totals.get("review_s"),
+            "calls": totals.get("calls"),
+            "prompt_tokens": totals.get("prompt_tokens"),
+            "completion_tokens": totals.get("completion_tokens"),
+            "cost": totals.get("cost"),
+            "created_at": time.time(),
+        }
+        with self._lock:
+            self._pending.append(tuple(row[column] for column in COLUMNS))
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        placeholders = ", ".join("?" * len(COLUMNS))
+        updates = ", ".join(f"{column} = excluded.{column}" for column in COLUMNS[4:])
+        with self._conn:
+            self._conn.executemany(f"INSERT INTO reviews ({', '.join(COLUMNS)}) VALUES ({placeholders}) "
+                                   f"ON CONFLICT (paper_key, domain, mode) DO UPDATE SET {updates}", self._pending)
+        self._pending = []
+
+    def reviewed(self, source_hash, domain=None, mode=None):
+        # 这份pdf（按内容hash）是否已经审阅过；domain、mode为None时不限领域、模式
+        return self.latest(source_hash, domain, mode) is not None
+
+    def latest(self, source_hash, domain=None, mode=None):
+        # 这份pdf最近一次的审阅结果（dict），没有时返回None；只做过分拣的pdf在mode="full"时不算审阅过
+        self.flush()
+        sql = "SELECT * FROM reviews WHERE source_hash = ?"
+        args = [source_hash]
+        for column, value in (("domain", domain), ("mode", mode)):
+            if value is not None:
+                sql += f" AND {column} = ?"
+                args.append(value)
+        with self._lock:
+            row = self._conn.execute(sql + " ORDER BY created_at DESC LIMIT 1", args).fetchone()
+        return dict(row) if row is not None else None
+
+    def query(self, domain=None, min_score=None, max_score=None, mode=None, order="score", limit=None):
+        """
+        返回符合条件的审阅结果（dict列表）。
+        order: "score"按分数从高到低（没有分数的排在最后），"recent"按时间从新到旧，"title"按标题。
+        """
+        conditions, args = [], []
+        for column, operator, value in (("domain", "=", domain), ("mode", "=", mode),
+                                        ("score", ">=", min_score), ("score", "<=", max_score)):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                args.append(value)
+        sql = "SELECT * FROM reviews"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        orders = {"score": "score IS NULL, score DESC, title", "recent": "created_at DESC", "title": "title"}
+        if order not in orders:
+            raise ValueError(f"unknown order {order!r}, expected one of {sorted(orders)}")
+        sql += " ORDER BY " + orders[order]
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        self.flush()
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, args)]
+
+    def export(self, file_name, file_format=None, **filters):
+        """
+        按query的条件从库里生成一份汇总报告，file_format为"md"或"txt"（默认按扩展名），返回写出的篇数。
+        """
+        from utils import export_to_markdown
+
+        file_format = file_format or os.path.splitext(file_name)[1].lstrip('.') or "txt"
+        rows = self.query(**filters)
+        parts = []
+        for rank, row in enumerate(rows, 1):
+            score = "n/a" if row["score"] is None else f"{row['score']:g}"
+            if file_format == "md":
+                parts.append(f"## {rank}. {row['title']}\n\n"
+                             f"- Score: {score}\n- Domain: {row['domain']}\n- Keywords: {row['keywords']}\n"
+                             f"- Source: {row['path']}\n")
+            else:
+                parts.append(f"## Paper:{rank}\n{row['title']}\nScore: {score}  Domain: {row['domain']}\n"
+                             f"Source: {row['path']}\n")
+            parts.extend(text for text in (row["summary"], row["method"], row["conclusion"]) if text)
+        export_to_markdown("\n\n".join(parts) + "\n", file_name)
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._conn.close()
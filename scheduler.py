@@ -0,0 +1,156 @@
+"""
+所有LLM调用共用的请求调度器：
+- 令牌桶限制每分钟请求数（RPM）和每分钟token数（TPM），让吞吐贴近账号配额而不触发429；
+- 遇到限流和临时错误时按带抖动的指数退避重试，服务端给出Retry-After时按其等待，且所有调用一起暂停；
+- 每次调用带超时；
+- 统计排队、在途、重试、完成和失败的调用数。
+"""
+import random
+import threading
+import time
+
+from token_budget import count_tokens
+
+# 可以重试的HTTP状态码和异常类名（不导入openai，按名字判断openai.error里的异常）
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"RateLimitError", "APIError", "Timeout", "APIConnectionError", "ServiceUnavailableError",
+                    "TryAgain", "TimeoutError", "ConnectionError"}
+
+
+def is_retryable(exc):
+    status = getattr(exc, "http_status", None) or getattr(exc, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(exc).__mro__)
+
+
+def retry_after(exc):
+    # 从异常携带的响应头里读取Retry-After（秒），没有时返回None
+    headers = getattr(exc, "headers", None) or {}
+    try:
+        value = headers.get("Retry-After") or headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        # 阻塞直到桶里有足够的令牌；超过桶容量的请求按容量计
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RequestScheduler:
+    def __init__(self, requests_per_minute=3500, tokens_per_minute=90000, max_retries=6, base_delay=1.0,
+                 max_delay=60.0, timeout=120, max_in_flight=None, completion_tokens=500):
+        """
+        max_retries: 单次调用最多重试次数；base_delay/max_delay: 指数退避的初始和最大等待（秒）。
+        timeout: 单次请求超时（秒），以request_timeout参数传给补全函数。
+        max_in_flight: 同时在途的请求上限，None表示不限制。
+        completion_tokens: 调用方未指定max_tokens时，按这个数估计回答的token数计入TPM。
+        """
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.completion_tokens = completion_tokens
+        self._slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self.counts = {"queued": 0, "in_flight": 0, "retried": 0, "completed": 0, "failed": 0}
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def _count(self, name, delta=1):
+        with self._lock:
+            self.counts[name] += delta
+
+    def _wait_for_pause(self):
+        while True:
+            with self._lock:
+                wait = self._paused_until - time.monotonic()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def _backoff(self, attempt, exc):
+        delay = retry_after(exc)
+        if delay is not None:
+            # 服务端明确要求等待时，所有调用一起暂停
+            with self._lock:
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            return delay
+        # 带完全抖动的指数退避
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _estimate_tokens(self, messages, params):
+        prompt_tokens = sum(count_tokens(message.get("content", '')) for message in messages)
+        return prompt_tokens + params.get("max_tokens", self.completion_tokens)
+
+    def call(self, completion, messages, model="gpt-3.5-turbo", on_delta=None, **params):
+        tokens = self._estimate_tokens(messages, params)
+        delivered = [False]
+
+        def tracked_delta(delta):
+            delivered[0] = True
+            on_delta(delta)
+
+        self._count("queued")
+        attempt = 0
+        while True:
+            self._wait_for_pause()
+            self.request_bucket.acquire(1)
+            self.token_bucket.acquire(tokens)
+            if self._slots is not None:
+                self._slots.acquire()
+            if attempt == 0:
+                self._count("queued", -1)
+            self._count("in_flight")
+            try:
+                result = completion(messages=messages, model=model,
+                                    on_delta=tracked_delta if on_delta is not None else None,
+                                    request_timeout=self.timeout, **params)
+            except Exception as e:
+                # 已经流式输出了一部分时不能透明重试，否则报告里会出现重复内容
+                if attempt >= self.max_retries or not is_retryable(e) or delivered[0]:
+                    self._count("failed")
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                self._count("retried")
+            else:
+                self._count("completed")
+                return result
+            finally:
+                self._count("in_flight", -1)
+                if self._slots is not None:
+                    self._slots.release()
+            time.sleep(delay)
+
+    def wrap(self, completion):
+        # 返回经过调度的补全函数，签名与completion一致
+        def scheduled_completion(messages, model="gpt-3.5-turbo", **params):
+            return self.call(completion, messages, model=model, **params)
+
+        return scheduled_completion
@@ -0,0 +1,238 @@
+"""
+本地的章节检索索引：处理过的每篇论文的每个章节都加入索引，之后可以查询"与X相似的论文/章节"，
+也可以为conclusion阶段找相关工作作为上下文。不需要任何网络服务。
+
+特征用哈希技巧（词 -> crc32 -> 2^18个桶），每个章节只保留TF-IDF最高的top_k个词（对数词频），
+以定长数组存成numpy memmap，文档频率也存在memmap里；查询时IDF用最新的文档频率现算，
+对所有章节一次向量化打分，几万篇论文的索引也只要几十毫秒。
+索引随论文解析增量追加，同一篇论文（按pdf内容hash）只加入一次。
+
+目录结构：
+    meta.json       维度、top_k、已用行数
+    terms.i32       (容量, top_k) 每个章节的词桶编号
+    weights.f32     (容量, top_k) 对应的对数词频，不足top_k个词时补0
+    df.i32          (维度,) 每个词桶出现在多少个章节里
+    rows.jsonl      每行一个章节：论文key、标题、路径、章节名、正文片段在texts.bin中的位置
+    texts.bin       章节正文片段（utf-8），用于返回结果和拼接上下文
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+INDEX_VERSION = 1
+_WORD = re.compile(r"[a-z][a-z0-9]{2,}")
+_STOPWORDS = set("""the and for that with this from are was were which these those have has had not but can
+    our their its than then into also such each more most other some over only both between using used use
+    based all any may may been being would could should there where when while what who how they them""".split())
+
+
+def tokenize(text):
+    return [word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS]
+
+
+class SectionIndex:
+    def __init__(self, directory='./cache/index', dims=2 ** 18, top_k=64, snippet_chars=1500):
+        """
+        dims: 哈希桶数（2的幂）；top_k: 每个章节保留的词数；snippet_chars: 每个章节保存的正文长度。
+        已有索引时dims和top_k以meta.json为准。
+        """
+        self.directory = directory
+        self.snippet_chars = snippet_chars
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != INDEX_VERSION:
+                raise ValueError(f"index in {directory} has version {meta.get('version')}, expected {INDEX_VERSION}")
+        else:
+            meta = {"version": INDEX_VERSION, "dims": dims, "top_k": top_k, "count": 0, "capacity": 0}
+        self.dims = meta["dims"]
+        self.top_k = meta["top_k"]
+        self.count = meta["count"]
+        self.capacity = meta["capacity"]
+        self.df = self._open("df.i32", np.int32, (self.dims,))
+        self.terms = self.weights = None
+        if self.capacity:
+            self.terms = self._open("terms.i32", np.int32, (self.capacity, self.top_k))
+            self.weights = self._open("weights.f32", np.float32, (self.capacity, self.top_k))
+        self.rows = []
+        rows_path = os.path.join(directory, "rows.jsonl")
+        if os.path.exists(rows_path):
+            with open(rows_path, encoding="utf-8") as f:
+                # 上次写到一半中断时，只认meta.json里记录的行数
+                self.rows = [json.loads(line) for _, line in zip(range(self.count), f)]
+        # 论文key -> 编号，每行对应的论文编号，用于向量化地排除某篇论文
+        self.papers = {}
+        self.row_papers = []
+        self._scoring = None
+        for row in self.rows:
+            self.row_papers.append(self.papers.setdefault(row["paper"], len(self.papers)))
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _open(self, name, dtype, shape):
+        # 文件不足shape大小时先补齐（新增部分为0），再以读写方式映射
+        path = self._path(name)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _grow(self, needed):
+        # 容量按2倍增长，避免每加一篇论文都重新映射
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, self.capacity * 2, 1024)
+        for array in (self.terms, self.weights):
+            if array is not None:
+                array.flush()
+        self.terms = self._open("terms.i32", np.int32, (capacity, self.top_k))
+        self.weights = self._open("weights.f32", np.float32, (capacity, self.top_k))
+        self.capacity = capacity
+
+    def _hash(self, words):
+        mask = self.dims - 1
+        return np.fromiter((zlib.crc32(word.encode("utf-8")) & mask for word in words), dtype=np.int64,
+                           count=len(words))
+
+    def _vector(self, text):
+        # 返回 (词桶编号, 对数词频)，按当前的IDF保留最重要的top_k个
+        buckets = self._hash(tokenize(text))
+        if len(buckets) == 0:
+            return buckets, np.zeros(0, dtype=np.float32)
+        buckets, counts = np.unique(buckets, return_counts=True)
+        tf = 1 + np.log(counts)
+        if len(buckets) > self.top_k:
+            keep = np.argpartition(-(tf * self._idf(buckets)), self.top_k)[:self.top_k]
+            buckets, tf = buckets[keep], tf[keep]
+        return buckets, tf.astype(np.float32)
+
+    def _idf(self, buckets=None):
+        df = self.df if buckets is None else self.df[buckets]
+        return np.log((1 + self.count) / (1 + df.astype(np.float32))) + 1
+
+    @staticmethod
+    def paper_key(paper):
+        return getattr(paper, "source_hash", None) or hashlib.sha256(paper.path.encode("utf-8")).hexdigest()
+
+    def add_paper(self, paper):
+        """把一篇论文的所有章节加入索引，已经加入过的论文直接跳过；返回新加入的章节数。"""
+        key = self.paper_key(paper)
+        sections = [(name, str(paper.section_text_dict[name])) for name in paper.section_text_dict
+                    if name != "title" and name != "References"]
+        with self._lock:
+            if key in self.papers:
+                return 0
+            self._grow(self.count + len(sections))
+            with open(self._path("texts.bin"), "ab") as texts, \
+                    open(self._path("rows.jsonl"), "a", encoding="utf-8") as rows:
+                for name, text in sections:
+                    buckets, tf = self._vector(text)
+                    row = self.count
+                    self.terms[row] = 0
+                    self.weights[row] = 0
+                    self.terms[row, :len(buckets)] = buckets
+                    self.weights[row, :len(tf)] = tf
+                    self.df[buckets] += 1
+                    snippet = text[:self.snippet_chars].encode("utf-8")
+                    record = {"paper": key, "title": paper.title, "path": paper.path, "section": name,
+                              "offset": texts.tell(), "length": len(snippet)}
+                    texts.write(snippet)
+                    rows.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    self.rows.append(record)
+                    self.row_papers.append(len(self.papers))
+                    self.count += 1
+            self.papers[key] = len(self.papers)
+            self._save_meta()
+        return len(sections)
+
+    def _save_meta(self):
+        for array in (self.terms, self.weights, self.df):
+            if array is not None:
+                array.flush()
+        tmp_path = self._path("meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "dims": self.dims, "top_k": self.top_k,
+                       "count": self.count, "capacity": self.capacity}, f)
+        os.replace(tmp_path, self._path("meta.json"))
+
+    def text(self, row):
+        record = self.rows[row]
+        with open(self._path("texts.bin"), "rb") as f:
+            f.seek(record["offset"])
+            return f.read(record["length"]).decode("utf-8", errors="ignore")
+
+    def search(self, query, k=5, exclude_paper=None, sections=None):
+        """
+        返回与query最相似的k个章节：[(相似度, 行号, 行信息), ...]，相似度是TF-IDF余弦。
+        exclude_paper: 排除这篇论文（论文key）的章节；sections: 只在这些章节名里找。
+        """
+        with self._lock:
+            count = self.count
+            if count == 0:
+                return []
+            query_buckets, query_tf = self._vector(query)
+            if len(query_buckets) == 0:
+                return []
+            terms, weights, idf = self._scoring_matrix()
+            query_weights = np.zeros(self.dims, dtype=np.float32)
+            query_weights[query_buckets] = query_tf * idf[query_buckets]
+            query_weights /= np.linalg.norm(query_weights[query_buckets])
+            # 每个章节的top_k个词到查询向量里取权重，一次算出所有章节的余弦相似度
+            scores = np.einsum("ij,ij->i", weights, query_weights[terms])
+            rows = self.rows[:count]
+            if exclude_paper in self.papers:
+                scores[np.array(self.row_papers[:count]) == self.papers[exclude_paper]] = -1
+        if sections is not None:
+            scores[[row["section"] not in sections for row in rows]] = -1
+        k = min(k, count)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(float(scores[row]), int(row), rows[row]) for row in best if scores[row] > 0]
+
+    def _scoring_matrix(self):
+        # 按当前IDF加权并归一化的章节向量；索引没有变化时复用，连续查询只剩一次gather和点积
+        if self._scoring is None or self._scoring[0] != self.count:
+            idf = self._idf()
+            terms = np.asarray(self.terms[:self.count])
+            weights = np.asarray(self.weights[:self.count]) * idf[terms]
+            norms = np.linalg.norm(weights, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            self._scoring = (self.count, terms, weights / norms, idf)
+        return self._scoring[1:]
+
+    def related_context(self, paper, max_chars=1500, k=3):
+        """
+        为conclusion阶段找其他论文里最相关的章节，拼成一段上下文；索引里没有相关内容时返回空字符串。
+        用这篇论文的第一个章节（通常是摘要或引言）作为查询。
+        """
+        names = [name for name in paper.section_text_dict if name != "title"]
+        if not names:
+            return ''
+        query = str(paper.section_text_dict[names[0]])
+        results = self.search(query, k=k * 3, exclude_paper=self.paper_key(paper))
+        parts = []
+        seen_papers = set()
+        per_result = max(max_chars // k, 200)
+        for score, row, record in results:
+            # 同一篇论文的其他版本（标题相同）不算相关工作
+            if record["paper"] in seen_papers or record["title"] == paper.title:
+                continue
+            seen_papers.add(record["paper"])
+            parts.append(f"- {record['title']} ({record['section']}): {self.text(row)[:per_result]}")
+            if len(parts) == k:
+                break
+        return "\n".join(parts)
+
+    def close(self):
+        with self._lock:
+            self._save_meta()
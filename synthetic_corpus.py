@@ -0,0 +1,179 @@
+"""
+用PyMuPDF自带的写入功能在本地生成合成论文pdf，供基准测试使用，不需要真实论文。
+页数、栏数、图片数和标题样式都可控制，相同参数和seed生成的文件内容完全相同。
+"""
+import os
+import random
+
+import fitz
+
+HEADING_STYLES = ("numbered", "roman", "plain", "algorithm")
+_ROMAN = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X"]
+_WORDS = ("the model learns robust features from noisy data with sparse attention and graph layers "
+          "improving accuracy over strong baselines on three benchmarks while reducing memory and latency "
+          "we evaluate each component in ablation studies and report mean results over five seeds").split()
+_SECTIONS = ["Introduction", "Related Work", "Method", "Experiments", "Discussion", "Conclusion"]
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+MARGIN = 54
+BODY_SIZE = 9.5
+LINE_HEIGHT = 12
+
+
+class _Layout:
+    # 简单的多栏排版：按行往下排，栏满换栏，页满换页；每页的文字先攒在TextWriter里，换页时一次写入
+    def __init__(self, doc, columns, header):
+        self.doc = doc
+        self.columns = columns
+        self.header = header
+        self.column_width = (PAGE_WIDTH - 2 * MARGIN - (columns - 1) * 18) / columns
+        self.fonts = {"helv": fitz.Font("helv"), "hebo": fitz.Font("hebo")}
+        self.page = None
+        self.writer = None
+        self.column = 0
+        self.y = 0
+        self.new_page()
+
+    def flush(self):
+        if self.writer is not None:
+            self.writer.write_text(self.page)
+
+    def new_page(self):
+        self.flush()
+        self.page = self.doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        self.writer = fitz.TextWriter(self.page.rect)
+        number = len(self.doc)
+        # 每页重复出现的页眉和页脚
+        self.text((MARGIN, 36), self.header, fontsize=8)
+        self.text((PAGE_WIDTH / 2, PAGE_HEIGHT - 30), str(number), fontsize=8)
+        self.column = 0
+        self.y = MARGIN + 12
+
+    def text(self, point, text, fontsize=BODY_SIZE, fontname="helv"):
+        self.writer.append(point, text, font=self.fonts[fontname], fontsize=fontsize)
+
+    def x(self):
+        return MARGIN + self.column * (self.column_width + 18)
+
+    def reserve(self, height):
+        if self.y + height > PAGE_HEIGHT - MARGIN:
+            if self.column + 1 < self.columns:
+                self.column += 1
+                self.y = MARGIN + 12
+            else:
+                self.new_page()
+
+    def line(self, text, fontsize=BODY_SIZE, fontname="helv", height=LINE_HEIGHT):
+        self.reserve(height)
+        self.text((self.x(), self.y), text, fontsize=fontsize, fontname=fontname)
+        self.y += height
+
+    def paragraph(self, rng, sentences):
+        chars_per_line = int(self.column_width / (BODY_SIZE * 0.5))
+        words = []
+        for _ in range(sentences):
+            sentence = rng.choices(_WORDS, k=rng.randint(8, 18))
+            sentence[0] = sentence[0].capitalize()
+            if rng.random() < 0.3:
+                sentence.append(f"by {rng.randint(1, 40)}.{rng.randint(0, 9)}%")
+            words.extend(sentence)
+            words[-1] += '.'
+        current = ''
+        for word in words:
+            if current and len(current) + 1 + len(word) > chars_per_line:
+                self.line(current)
+                current = word
+            else:
+                current = f"{current} {word}" if current else word
+        if current:
+            self.line(current)
+        self.y += LINE_HEIGHT / 2
+
+    def figure(self, rng, number):
+        height = 110
+        self.reserve(height + 2 * LINE_HEIGHT)
+        width, pixel_height = rng.randint(120, 900), rng.randint(90, 700)
+        color = bytes((rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+        pixmap = fitz.Pixmap(fitz.csRGB, width, pixel_height, color * (width * pixel_height), False)
+        rect = fitz.Rect(self.x(), self.y, self.x() + self.column_width, self.y + height)
+        self.page.insert_image(rect, pixmap=pixmap, keep_proportion=True)
+        self.y += height + LINE_HEIGHT
+        self.line(f"Figure {number}: Results of the model on benchmark {number}.", fontsize=8)
+
+
+def _heading(style, index, name):
+    if style == "roman":
+        return f"{_ROMAN[index]}. {name.upper()}"
+    if style == "plain":
+        return name
+    return f"{index + 1} {name}"
+
+
+def make_synthetic_pdf(path, pages=12, figures=4, heading_style="numbered", columns=2, seed=0):
+    """
+    生成一篇合成论文：首页大字号标题、作者、摘要，然后是若干带标题的章节、图片和参考文献。
+    heading_style: numbered（"1 Introduction"）、roman（"I. INTRODUCTION"）、plain（不编号的加粗标题）、
+                   algorithm（方法章节以算法名命名，如"3 GraphMem: Sparse Memory Networks"）
+    返回实际生成的页数。
+    """
+    if heading_style not in HEADING_STYLES:
+        raise ValueError(f"unknown heading style {heading_style!r}, expected one of {HEADING_STYLES}")
+    rng = random.Random(seed)
+    doc = fitz.open()
+    layout = _Layout(doc, columns, header="Preprint. Under review.")
+    title = f"Synthetic Paper {seed}: Robust Sparse Attention for Graph Learning"
+    layout.text((MARGIN, layout.y + 10), title, fontsize=17, fontname="hebo")
+    layout.y += 34
+    layout.line("Alice Author, Bob Writer, Carol Researcher", fontsize=10)
+    layout.y += 6
+    layout.line("Abstract", fontsize=11, fontname="hebo", height=16)
+    layout.paragraph(rng, 6)
+
+    sections = list(_SECTIONS)
+    if heading_style == "algorithm":
+        sections[2] = "GraphMem: Sparse Memory Networks"
+    figure_pages = sorted(rng.sample(range(pages), min(figures, pages))) if figures else []
+    figure_number = 0
+    for index, name in enumerate(sections):
+        layout.y += 4
+        layout.line(_heading(heading_style, index, name), fontsize=11, fontname="hebo", height=16)
+        # 每个章节大致占 pages/章节数 页
+        end_page = max(1, round((index + 1) * (pages - 1) / len(sections)))
+        while len(doc) <= end_page:
+            if figure_number < len(figure_pages) and len(doc) - 1 >= figure_pages[figure_number]:
+                figure_number += 1
+                layout.figure(rng, figure_number)
+            layout.paragraph(rng, rng.randint(3, 7))
+    while figure_number < len(figure_pages):
+        figure_number += 1
+        layout.figure(rng, figure_number)
+
+    layout.y += 4
+    layout.line("References", fontsize=11, fontname="hebo", height=16)
+    reference = 0
+    while len(doc) < pages or layout.column < columns - 1 or layout.y < PAGE_HEIGHT - 2 * MARGIN:
+        reference += 1
+        layout.line(f"[{reference}] A. Author and B. Author. A paper about {rng.choice(_WORDS)}. "
+                    f"In Proc. Conf., {rng.randint(2010, 2023)}.", fontsize=8, height=10)
+        if len(doc) > pages:
+            break
+    layout.flush()
+    if len(doc) > pages:
+        doc.delete_page(-1)
+    page_count = len(doc)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    return page_count
+
+
+def make_corpus(directory, papers=10, pages=12, figures=4, heading_styles=HEADING_STYLES, columns=2, seed=0):
+    """在directory下生成papers篇合成论文，标题样式轮流使用，返回pdf路径列表。"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(papers):
+        style = heading_styles[index % len(heading_styles)]
+        path = os.path.join(directory, f"synthetic-{seed + index:04d}-{style}.pdf")
+        make_synthetic_pdf(path, pages=pages, figures=figures, heading_style=style, columns=columns,
+                           seed=seed + index)
+        paths.append(path)
+    return paths
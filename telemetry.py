@@ -0,0 +1,183 @@
+"""
+审阅流程的计时、token和费用统计：
+- pdf解析各阶段（提取页面、标题、章节索引、章节切分）的耗时，由Paper自己记录在paper.timings里；
+- 每篇论文每个阶段（summary/method/conclusion）的墙钟时间；
+- 每次实际发出的LLM请求的耗时、prompt/completion token数和估算费用（缓存命中的不计费）。
+按论文和整批汇总，逐条写入JSONL跟踪文件，并给出一行摘要供GUI状态栏和命令行显示。
+
+另外提供一个可开关的调试钩子debug()，替代解析代码里零散的print：
+未开启时只是一次全局变量判断，开销可以忽略；设置环境变量BRAINBOX_DEBUG=1（子进程也会继承）
+或调用set_debug_hook()即可打开。
+"""
+from contextlib import contextmanager
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+
+from token_budget import count_tokens
+
+# 每1K token的美元价格（输入, 输出），按模型名前缀匹配，只用于估算
+PRICES = {
+    "gpt-3.5-turbo-16k": (0.003, 0.004),
+    "gpt-3.5-turbo": (0.0015, 0.002),
+    "gpt-4-32k": (0.06, 0.12),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.005, 0.015),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4": (0.03, 0.06),
+}
+# 每条消息的格式开销（role、分隔符等）
+MESSAGE_OVERHEAD = 4
+
+_debug_hook = None
+# 当前正在审阅的 (论文名, 阶段)，由Telemetry.stage设置，供同一调用链里的请求统计使用
+_current_stage = contextvars.ContextVar("brainbox_stage", default=(None, None))
+
+
+def set_debug_hook(hook):
+    """hook(event, fields)，传None关闭。"""
+    global _debug_hook
+    _debug_hook = hook
+
+
+def debug(event, **fields):
+    if _debug_hook is not None:
+        _debug_hook(event, fields)
+
+
+def _print_debug(event, fields):
+    print(event, fields, file=sys.stderr)
+
+
+if os.environ.get("BRAINBOX_DEBUG"):
+    set_debug_hook(_print_debug)
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    # 最长前缀匹配，未知模型返回0
+    for name in sorted(PRICES, key=len, reverse=True):
+        if model.startswith(name):
+            prompt_price, completion_price = PRICES[name]
+            return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+    return 0.0
+
+
+def _new_totals():
+    return {"parse_s": 0.0, "review_s": 0.0, "calls": 0, "llm_s": 0.0,
+            "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0, "tokens_saved": 0}
+
+
+class Telemetry:
+    def __init__(self, trace_path=None):
+        """
+        trace_path: JSONL跟踪文件路径（追加写入），None表示只在内存中汇总。
+        """
+        self._lock = threading.Lock()
+        self._file = None
+        if trace_path:
+            if os.path.dirname(trace_path):
+                os.makedirs(os.path.dirname(trace_path), exist_ok=True)
+            self._file = open(trace_path, "a", encoding="utf-8")
+        self.papers = {}
+        self.totals = _new_totals()
+        self.started = time.perf_counter()
+
+    def record(self, event, paper=None, **fields):
+        # 写一条跟踪记录，并把数值累加到该论文和整批的汇总里
+        with self._lock:
+            totals = [self.totals]
+            if paper is not None:
+                totals.append(self.papers.setdefault(paper, _new_totals()))
+            for name in ("parse_s", "review_s", "llm_s", "prompt_tokens", "completion_tokens", "cost", "tokens_saved"):
+                if name in fields:
+                    for total in totals:
+                        total[name] += fields[name]
+            if event == "llm_call":
+                for total in totals:
+                    total["calls"] += 1
+            if self._file is not None:
+                record = {"ts": round(time.time(), 3), "event": event, "paper": paper}
+                record.update(fields)
+                self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self._file.flush()
+
+    def record_parse(self, paper, timings):
+        # timings来自Paper.timings（在解析进程里记录），各阶段耗时单位为秒
+        self.record("parse", paper=paper, parse_s=round(sum(timings.values()), 4),
+                    stages={name: round(value, 4) for name, value in timings.items()})
+
+    @contextmanager
+    def stage(self, paper, stage):
+        # 计时一篇论文的一个审阅阶段；期间发出的LLM请求都记在这篇论文和这个阶段名下
+        token = _current_stage.set((paper, stage))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            _current_stage.reset(token)
+            self.record("stage", paper=paper, stage=stage, seconds=round(time.perf_counter() - start, 4))
+
+    def finish_paper(self, paper, seconds):
+        # 一篇论文审阅完成，写出该论文的汇总
+        self.record("paper_done", paper=paper, review_s=seconds)
+        summary = self.paper_summary(paper)
+        if self._file is not None:
+            with self._lock:
+                self._file.write(json.dumps({"ts": round(time.time(), 3), "event": "paper_summary",
+                                             "paper": paper, **_rounded(summary)}, ensure_ascii=False) + "\n")
+                self._file.flush()
+        return summary
+
+    def paper_summary(self, paper):
+        with self._lock:
+            return dict(self.papers.get(paper, _new_totals()))
+
+    def wrap(self, completion):
+        # 返回记录耗时、token数和估算费用的补全函数，签名与completion一致；
+        # 包在最底层的补全函数外面（缓存和调度器之下），只统计实际发出的请求，重试的每次都单独记录
+        def tracked_completion(messages, model="gpt-3.5-turbo", **params):
+            paper, stage = _current_stage.get()
+            prompt_tokens = sum(count_tokens(message.get("content", '')) + MESSAGE_OVERHEAD for message in messages)
+            start = time.perf_counter()
+            try:
+                result = completion(messages=messages, model=model, **params)
+            except Exception as e:
+                self.record("llm_error", paper=paper, stage=stage, model=model,
+                            seconds=round(time.perf_counter() - start, 4), error=repr(e))
+                raise
+            elapsed = time.perf_counter() - start
+            completion_tokens = count_tokens(result)
+            self.record("llm_call", paper=paper, stage=stage, model=model, llm_s=round(elapsed, 4),
+                        prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                        cost=round(estimate_cost(model, prompt_tokens, completion_tokens), 6))
+            return result
+
+        return tracked_completion
+
+    def summary(self):
+        with self._lock:
+            summary = _rounded(self.totals)
+            summary["papers"] = len(self.papers)
+        summary["wall_s"] = round(time.perf_counter() - self.started, 3)
+        return summary
+
+    def summary_line(self):
+        s = self.summary()
+        saved = f", {s['tokens_saved']} saved by compression" if s["tokens_saved"] else ''
+        return (f"{s['calls']} LLM calls, {s['prompt_tokens']} prompt + {s['completion_tokens']} completion tokens"
+                f"{saved}, ~${s['cost']:.4f}; parse {s['parse_s']:.1f}s, LLM {s['llm_s']:.1f}s, wall {s['wall_s']:.1f}s")
+
+    def close(self):
+        if self._file is not None:
+            self.record("batch_summary", summary=self.summary())
+            with self._lock:
+                self._file.close()
+                self._file = None
+
+
+def _rounded(totals):
+    return {name: round(value, 6 if name == "cost" else 4) if isinstance(value, float) else value
+            for name, value in totals.items()}
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+# 模块都在仓库根目录下，测试直接导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubPaper:
+    # 不解析pdf，直接给出章节文本；各篇长度不同，假LLM的回答里带着上下文长度，能看出报告对应哪篇
+    def __init__(self, index):
+        self.path = f"paper-{index}.pdf"
+        self.title = f"Paper {index}"
+        self.section_text_dict = {
+            "Abstract": "We study synthetic benchmarks. " * (10 + index),
+            "Method": "The method has several steps. " * (20 + index),
+            "Conclusion": "It works on 3 datasets. " * (5 + index),
+        }
+
+
+@pytest.fixture(scope="session")
+def pdfs(tmp_path_factory):
+    # 整个测试会话共用的一小批合成论文（需要PyMuPDF）
+    pytest.importorskip("fitz")
+    from synthetic_corpus import make_corpus
+
+    return make_corpus(str(tmp_path_factory.mktemp("corpus")), papers=6, pages=3, figures=0)
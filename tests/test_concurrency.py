@@ -0,0 +1,64 @@
+import os
+import time
+
+from conftest import StubPaper
+from fake_llm import FakeCompletion
+from utils import review_by_chatgpt
+
+LATENCY = 0.05
+PAPERS = 8
+
+
+def _review(export_path, workers):
+    completion = FakeCompletion(latency=LATENCY)
+    names = [f"paper-{index}" for index in range(PAPERS)]
+    start = time.perf_counter()
+    report_paths = review_by_chatgpt([StubPaper(index) for index in range(PAPERS)], api_key='', key_word="Test",
+                                     export_path=str(export_path), file_format="txt", file_names=names,
+                                     max_workers=workers, completion=completion, progress=lambda line: None)
+    elapsed = time.perf_counter() - start
+    reports = {}
+    for path in report_paths:
+        name = next(name for name in names if f"-{name}-" in os.path.basename(path))
+        with open(path, encoding="utf-8") as f:
+            reports[name] = f.read()
+    return reports, elapsed, completion
+
+
+def test_concurrent_review_is_faster_with_unchanged_reports(tmp_path):
+    serial, serial_s, serial_completion = _review(tmp_path / "serial", workers=1)
+    concurrent, concurrent_s, completion = _review(tmp_path / "concurrent", workers=PAPERS)
+    # 8篇 x 3步：串行约24个延迟，并发约3个
+    assert concurrent_s < serial_s / 3
+    assert serial_completion.max_in_flight == 1
+    assert 1 < completion.max_in_flight <= PAPERS
+    # 每篇报告的内容、编号和三段的顺序都与串行审阅一致
+    assert len(concurrent) == PAPERS
+    assert concurrent == serial
+    for index in range(PAPERS):
+        assert concurrent[f"paper-{index}"].startswith(f"## Paper:{index + 1}\n")
+
+
+def test_in_flight_requests_are_bounded_by_max_workers(tmp_path):
+    _, _, completion = _review(tmp_path, workers=3)
+    assert completion.max_in_flight <= 3
+    assert completion.calls == PAPERS * 3
+
+
+def test_map_reduce_chunks_share_the_in_flight_limit(tmp_path):
+    from scheduler import RequestScheduler
+
+    completion = FakeCompletion(latency=LATENCY)
+    papers = [StubPaper(index) for index in range(4)]
+    for paper in papers:
+        # 方法和结论章节远超预算，要分块压缩
+        paper.section_text_dict["Method"] = "The method has several distinct steps. " * 800
+        paper.section_text_dict["Conclusion"] = "It works on 3 datasets in every setting. " * 800
+    review_by_chatgpt(papers, api_key='', key_word="Test", export_path=str(tmp_path), file_format="txt",
+                      file_names=[f"paper-{index}" for index in range(4)], max_workers=4, completion=completion,
+                      map_reduce=True, max_prompt_tokens=1000,
+                      scheduler=RequestScheduler(tokens_per_minute=10 ** 9, max_in_flight=4),
+                      progress=lambda line: None)
+    # 每篇都有分块请求，但同时在途的请求数不超过调度器的上限
+    assert completion.calls > 4 * 3
+    assert completion.max_in_flight <= 4
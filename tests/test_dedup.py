@@ -0,0 +1,73 @@
+from dedup import Deduplicator
+
+WORDS = ("sparse attention reduces the quadratic cost of transformers on long documents while keeping "
+         "accuracy close to dense attention across summarization question answering and retrieval benchmarks ")
+
+
+class _Paper:
+    def __init__(self, text, source_hash):
+        self.all_text = text
+        self.source_hash = source_hash
+
+
+def test_image_only_pdfs_are_not_folded_together():
+    dedup = Deduplicator()
+    # 扫描版pdf抽不出正文，只按文件hash判断
+    assert dedup.check(_Paper('', "scan-1"), "scan1") is None
+    assert dedup.check(_Paper(' \n', "scan-2"), "scan2") is None
+    assert dedup.check(_Paper('', "scan-1"), "scan1-copy") == "scan1"
+
+
+def test_identical_and_near_duplicate_text_is_folded():
+    dedup = Deduplicator()
+    text = WORDS * 10
+    assert dedup.check(_Paper(text, "v1"), "v1") is None
+    assert dedup.check(_Paper(text, "v1-renamed"), "copy") == "v1"
+    assert dedup.check(_Paper(text + "an extra acknowledgement sentence", "v2"), "v2") == "v1"
+
+
+class _Reviewed:
+    # review_by_chatgpt用的论文：不同目录下的pdf可以同名
+    def __init__(self, path, topic):
+        self.path = path
+        self.title = f"A study of {topic}"
+        self.section_text_dict = {"Abstract": f"We study {topic}. " + WORDS * 3, "Method": WORDS * 5,
+                                  "Conclusion": f"{topic} works. " * 5}
+
+
+def _review_folded(tmp_path, completion):
+    from utils import review_by_chatgpt
+
+    papers = [_Reviewed("a/paper.pdf", "graphs"), _Reviewed("b/paper.pdf", "proteins"),
+              _Reviewed("c/paper.pdf", "graphs")]
+    failures = []
+    report_paths = review_by_chatgpt(papers, api_key='', key_word="Test", export_path=str(tmp_path),
+                                     file_format="txt", max_workers=2, completion=completion, dedup=Deduplicator(),
+                                     progress=lambda line: None, on_failure=lambda path, error: failures.append(path))
+    return report_paths, failures
+
+
+def test_same_file_names_in_different_folders_are_not_confused(tmp_path):
+    from fake_llm import FakeCompletion
+
+    report_paths, failures = _review_folded(tmp_path, FakeCompletion(latency=0))
+    assert failures == []
+    # c/paper.pdf是a/paper.pdf的副本，并入a的报告；b只是同名，单独审阅
+    assert len(report_paths) == 3 and len(set(report_paths)) == 2
+    notes = [open(path, encoding="utf-8").read().count("Folded duplicates") for path in set(report_paths)]
+    assert sorted(notes) == [0, 1]
+
+
+def test_duplicates_of_a_failed_paper_are_reported_as_failed(tmp_path):
+    from fake_llm import FakeCompletion
+
+    fake = FakeCompletion(latency=0)
+
+    def completion(messages, model, on_delta=None, **params):
+        if "graphs" in messages[1]["content"]:
+            raise ValueError("the model refused")
+        return fake(messages, model, on_delta=on_delta, **params)
+
+    report_paths, failures = _review_folded(tmp_path, completion)
+    assert len(report_paths) == 1
+    assert sorted(failures) == ["a/paper.pdf", "c/paper.pdf"]
@@ -0,0 +1,59 @@
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+from pdf_parser import Paper
+from synthetic_corpus import make_synthetic_pdf
+
+SECTIONS = ["Abstract", "Introduction", "Related Work", "Method", "Experiments", "Discussion", "Conclusion",
+            "References"]
+BODY = "The model learns robust features from noisy data with sparse attention and graph layers."
+
+
+def write_pdf(path, lines):
+    # lines: (文字, 字号, 是否加粗)，从上往下每行一条
+    doc = fitz.open()
+    page = doc.new_page(width=612, height=792)
+    y = 60
+    for text, size, bold in lines:
+        if y > 740:
+            page = doc.new_page(width=612, height=792)
+            y = 60
+        page.insert_text((54, y), text, fontsize=size, fontname="hebo" if bold else "helv")
+        y += size + 6
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def paper_with_table(path, heading, header_bold):
+    # 引言里有一张表，表头单元格恰好是"Method"，真正的方法章节在后面
+    lines = [("A Synthetic Paper About Sparse Attention", 17, True), ("Abstract", 11, True)]
+    lines += [(BODY, 9.5, False)] * 3
+    lines += [(heading(1, "Introduction"), 11, True)] + [(BODY, 9.5, False)] * 4
+    lines += [("Method", 9.5, header_bold), ("Accuracy", 9.5, header_bold), ("Ours 91.2", 9.5, False)]
+    lines += [(BODY, 9.5, False)] * 3
+    lines += [(heading(2, "Method"), 11, True)] + [("We encode the graph with sparse layers.", 9.5, False)] * 4
+    lines += [(heading(3, "Conclusion"), 11, True)] + [("It works on three datasets.", 9.5, False)] * 4
+    return write_pdf(path, lines)
+
+
+@pytest.mark.parametrize("style", ["numbered", "roman", "plain"])
+def test_synthetic_headings_are_found_in_order(tmp_path, style):
+    path = str(tmp_path / f"{style}.pdf")
+    make_synthetic_pdf(path, pages=3, figures=1, heading_style=style)
+    paper = Paper(path=path)
+    assert [heading.name for heading in paper.heading_index if heading.level == 1] == SECTIONS
+    starts = [paper.section_spans[name][0] for name in SECTIONS]
+    assert starts == sorted(set(starts))
+
+
+@pytest.mark.parametrize("heading", [lambda index, name: f"{index} {name}", lambda index, name: name],
+                         ids=["numbered", "plain"])
+@pytest.mark.parametrize("header_bold", [False, True], ids=["plain-cell", "bold-cell"])
+def test_table_word_equal_to_a_section_name_is_not_a_heading(tmp_path, heading, header_bold):
+    paper = Paper(path=paper_with_table(str(tmp_path / "table.pdf"), heading, header_bold))
+    assert list(paper.section_spans) == ["Abstract", "Introduction", "Method", "Conclusion"]
+    method = paper.section_text_dict["Method"]
+    assert "We encode the graph" in method and "Ours 91.2" not in method
+    assert "Ours 91.2" in paper.section_text_dict["Introduction"]
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+pytest.importorskip("fitz")
+
+import pdf_parser
+
+
+def crashing_parse(path, source_hash=None, lazy=False):
+    # 在解析子进程里模拟段错误或被OOM杀掉：进程直接退出
+    if "crash" in os.path.basename(path):
+        os._exit(1)
+    return pdf_parser.parse_paper(path, source_hash, lazy)
+
+
+def test_crashed_parse_worker_reports_the_file_and_continues(tmp_path, pdfs, monkeypatch):
+    crash = str(tmp_path / "crash.pdf")
+    with open(pdfs[0], "rb") as source, open(crash, "wb") as target:
+        target.write(source.read())
+    # 子进程用spawn启动，按模块名和函数名找到这个测试模块里的crashing_parse
+    monkeypatch.setattr(pdf_parser, "parse_paper", crashing_parse)
+    results = {path: (paper, error) for path, paper, error in
+               pdf_parser.parse_papers([pdfs[1], crash, pdfs[2], pdfs[3]], max_workers=2)}
+    assert set(results) == {pdfs[1], crash, pdfs[2], pdfs[3]}
+    paper, error = results[crash]
+    assert paper is None and "died" in str(error)
+    for path in pdfs[1:4]:
+        paper, error = results[path]
+        assert error is None and paper.section_text_dict
+
+
+def test_shared_pool_recovers_after_a_crash(tmp_path, pdfs, monkeypatch):
+    crash = str(tmp_path / "crash.pdf")
+    with open(pdfs[0], "rb") as source, open(crash, "wb") as target:
+        target.write(source.read())
+    monkeypatch.setattr(pdf_parser, "parse_paper", crashing_parse)
+    with pdf_parser.ParsePool(2) as pool:
+        assert list(pdf_parser.parse_papers([crash], pool=pool))[0][1] is None
+        # 同一个进程池在崩溃后还能继续用
+        (path, paper, error), = pdf_parser.parse_papers([pdfs[1]], pool=pool)
+        assert error is None and paper is not None
+
+
+@pytest.mark.parametrize("style", ["numbered", "roman", "plain"])
+def test_lazy_parse_matches_the_eager_parse(tmp_path, style):
+    from synthetic_corpus import make_synthetic_pdf
+
+    path = str(tmp_path / f"{style}.pdf")
+    make_synthetic_pdf(path, pages=8, figures=2, heading_style=style)
+    eager = pdf_parser.Paper(path=path)
+    (_, shipped, error), = pdf_parser.parse_papers([path], max_workers=1, lazy=True)
+    assert error is None
+    # 同一进程里接着解析，以及跨进程传回、从头解析剩余页面的两种情况
+    for lazy in (pdf_parser.Paper(path=path, lazy=True), shipped):
+        assert lazy.partial
+        assert lazy.title == eager.title
+        assert lazy.section_text_dict["Abstract"] == eager.section_text_dict["Abstract"]
+        # 只取摘要不会解析剩余的页面
+        assert lazy.partial
+        for name in ("Method", "Conclusion"):
+            assert lazy.section_text_dict[name] == eager.section_text_dict[name]
+        assert not lazy.partial
+        assert list(lazy.section_text_dict) == list(eager.section_text_dict)
+        assert lazy.section_spans == eager.section_spans
@@ -0,0 +1,43 @@
+from review_manifest import ReviewManifest
+
+
+class _Paper:
+    source_hash = "0123456789abcdef0123"
+
+
+def test_stages_are_appended_and_replayed(tmp_path):
+    manifest = ReviewManifest(str(tmp_path))
+    key = manifest.paper_key(_Paper(), "paper", "Biology")
+    manifest.mark_stage(key, "summary", "the summary")
+    manifest.mark_stage(key, "method", "the method")
+    report = tmp_path / "report.txt"
+    report.write_text("report")
+    manifest.mark_report(key, str(report), "paper")
+    # 每个阶段只追加一行，不重写整个清单
+    assert len((tmp_path / "manifest.jsonl").read_text().splitlines()) == 3
+    with open(tmp_path / "manifest.jsonl", "a") as f:
+        f.write('{"key": "torn')
+    reopened = ReviewManifest(str(tmp_path))
+    assert reopened.get_stage(key, "summary") == "the summary"
+    assert reopened.get_stage(key, "conclusion") is None
+    assert reopened.get_report(key) == str(report)
+
+
+def test_review_modes_have_separate_keys(tmp_path):
+    paper = _Paper()
+    keys = {ReviewManifest.paper_key(paper, "paper", "Biology", mode) for mode in ("full", "combined", "triage")}
+    assert len(keys) == 3
+    assert ReviewManifest.paper_key(paper, "paper", "Biology") != ReviewManifest.paper_key(paper, "paper", "Physics")
+
+
+def test_papers_without_a_hash_are_keyed_by_full_path():
+    class Unhashed:
+        source_hash = None
+
+        def __init__(self, path):
+            self.path = path
+
+    first = Unhashed("a/a-very-long-shared-prefix-paper.pdf")
+    second = Unhashed("b/a-very-long-shared-prefix-paper.pdf")
+    assert ReviewManifest.paper_key(first, "x", "Biology") != ReviewManifest.paper_key(second, "x", "Biology")
+    assert ReviewManifest.paper_key(first, "x", "Biology") == ReviewManifest.paper_key(first, "y", "Biology")
@@ -0,0 +1,50 @@
+from review_store import ReviewStore, parse_score
+
+CONCLUSION = """8. Conclusion:
+
+- (1): The work proposes a compact encoder for biomedical entity linking.
+- (2): Strengths:
+    -a. Innovation: a new contrastive objective;
+    -b. Performance: improves the F1 score by 3.2 points over the strongest baseline;
+- (3): Weaknesses:
+    -a. Workload: evaluated on only two datasets;
+- (4): Score: 6/10;
+    -Justifications: solid but incremental.
+- (5): Detailed Feedback:
+    - a. Report variance over seeds.
+"""
+
+
+def test_parse_score_uses_the_score_label():
+    # 正文里"F1 score by 3.2"不能当成分数
+    assert parse_score(CONCLUSION) == 6
+
+
+def test_parse_score_formats():
+    assert parse_score("- (4): Score: 7.5;") == 7.5
+    assert parse_score("- (4): Score (0~10): 8/10;") == 8
+    assert parse_score("- (4): Score: **9**") == 9
+    assert parse_score("I would give it a score of 6 out of 10.") == 6
+    assert parse_score("The accuracy score rose to 12.") is None
+    assert parse_score('') is None
+
+
+class _Paper:
+    source_hash = "abc123"
+    path = "paper.pdf"
+    title = "A Paper"
+
+
+def test_query_filters_and_orders_by_parsed_score(tmp_path):
+    store = ReviewStore(str(tmp_path / "reviews.sqlite"))
+    store.add(_Paper(), "paper", "Biology", {"conclusion": CONCLUSION})
+    other = _Paper()
+    other.source_hash = "def456"
+    store.add(other, "other", "Biology", {"conclusion": "- (4): Score: 8;"})
+    assert [row["score"] for row in store.query(domain="Biology")] == [8, 6]
+    assert [row["name"] for row in store.query(min_score=7)] == ["other"]
+    # 只做过分拣的论文在完整审阅模式下不算审阅过
+    store.add(_Paper(), "paper", "Physics", {"summary": "1. Title: A Paper"}, mode="triage")
+    assert store.reviewed("abc123", "Physics")
+    assert not store.reviewed("abc123", "Physics", mode="full")
+    store.close()
@@ -0,0 +1,107 @@
+import pytest
+
+import scheduler
+from fake_llm import FakeCompletion, FakeRateLimitError
+from scheduler import RequestScheduler
+
+MESSAGES = [{"role": "system", "content": "You are a reviewer."}, {"role": "user", "content": "Review this paper."}]
+
+
+class FakeClock:
+    # 代替scheduler里的time模块：sleep只把时钟往前拨，测试不真的等待，结果也不受机器快慢影响
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        # 真实的sleep至少睡一个很短的时间；否则浮点误差下令牌差一点点时会原地空转
+        self.now += max(seconds, 1e-6)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler, "time", clock)
+    return clock
+
+
+def timed(completion, clock, times):
+    # 记下每次实际发出请求时的时钟
+    def call(messages, model, on_delta=None, **params):
+        times.append(clock.now)
+        return completion(messages, model, on_delta=on_delta, **params)
+
+    return call
+
+
+def test_requests_per_minute_limit(clock):
+    limiter = RequestScheduler(requests_per_minute=60, tokens_per_minute=10 ** 9)
+    times = []
+    completion = limiter.wrap(timed(FakeCompletion(latency=0), clock, times))
+    for _ in range(150):
+        completion(MESSAGES)
+    start = times[0]
+    # 令牌桶：开头最多突发一分钟的配额，之后每秒一个
+    for index, at in enumerate(times):
+        assert index + 1 <= 60 + (at - start) + 1e-6
+    assert times[-1] - start == pytest.approx(90)
+    assert limiter.stats()["completed"] == 150
+
+
+def test_tokens_per_minute_limit(clock):
+    limiter = RequestScheduler(requests_per_minute=10 ** 6, tokens_per_minute=6000)
+    times = []
+    completion = limiter.wrap(timed(FakeCompletion(latency=0), clock, times))
+    per_call = limiter._estimate_tokens(MESSAGES, {"max_tokens": 1000})
+    for _ in range(20):
+        completion(MESSAGES, max_tokens=1000)
+    start = times[0]
+    for index, at in enumerate(times):
+        assert (index + 1) * per_call <= 6000 + (at - start) * 100 + 1e-6
+    # 开头突发5次，之后每次要攒够per_call个token
+    assert times[-1] - start == pytest.approx((20 * per_call - 6000) / 100, abs=per_call / 100)
+
+
+def test_retry_after_is_waited_out_before_the_next_attempt(clock):
+    limiter = RequestScheduler(max_retries=5, base_delay=0.001)
+    fake = FakeCompletion(latency=0, error_rate=1.0, retry_after=7)
+    times = []
+
+    def recovering(messages, model, on_delta=None, **params):
+        # 前两次限流，第三次恢复
+        if len(times) == 3:
+            fake.error_rate = 0
+        return fake(messages, model, on_delta=on_delta, **params)
+
+    completion = limiter.wrap(timed(recovering, clock, times))
+    assert "Fake review output" in completion(MESSAGES)
+    assert len(times) == 3
+    assert all(later - earlier >= 7 for earlier, later in zip(times, times[1:]))
+    assert limiter.stats() == {"queued": 0, "in_flight": 0, "retried": 2, "completed": 1, "failed": 0}
+
+
+@pytest.mark.parametrize("retry_after", [None, 3])
+def test_retries_stop_at_max_retries(clock, retry_after):
+    limiter = RequestScheduler(max_retries=3, base_delay=1.0, max_delay=4.0)
+    fake = FakeCompletion(latency=0, error_rate=1.0, retry_after=retry_after)
+    completion = limiter.wrap(fake)
+    with pytest.raises(FakeRateLimitError):
+        completion(MESSAGES)
+    assert fake.calls == 4
+    assert limiter.stats() == {"queued": 0, "in_flight": 0, "retried": 3, "completed": 0, "failed": 1}
+
+
+def test_non_retryable_errors_are_not_retried(clock):
+    limiter = RequestScheduler(max_retries=3)
+    calls = []
+
+    def broken(messages, model, on_delta=None, **params):
+        calls.append(model)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        limiter.wrap(broken)(MESSAGES)
+    assert len(calls) == 1
+    assert limiter.stats()["failed"] == 1
@@ -0,0 +1,74 @@
+from section_index import SectionIndex
+
+TOPICS = {
+    "graphs": ("graph neural networks message passing over nodes and edges",
+               "we aggregate neighbour node embeddings with attention over graph edges and pool the nodes"),
+    "proteins": ("protein structure prediction from amino acid sequences",
+                 "residues are embedded and a folding module predicts the distance between residue pairs"),
+    "speech": ("speech recognition from raw audio waveforms",
+               "the acoustic encoder turns spectrogram frames into phoneme probabilities for decoding"),
+}
+
+
+class _Paper:
+    def __init__(self, topic, source_hash=None, title=None):
+        abstract, method = TOPICS[topic]
+        self.title = title or f"A Paper About {topic.title()}"
+        self.path = f"{topic}.pdf"
+        self.source_hash = source_hash or f"hash-{topic}"
+        self.section_text_dict = {"title": self.title, "Abstract": f"We study {abstract}. " * 3,
+                                  "Method": f"In our method {method}. " * 5,
+                                  "Conclusion": "The results improve over the baselines on every benchmark. " * 2,
+                                  "References": "[1] A. Author. Some paper. 2020."}
+
+
+def _rows_on_disk(directory):
+    with open(directory / "rows.jsonl", encoding="utf-8") as f:
+        return len(f.readlines())
+
+
+def test_query_returns_the_matching_section_first(tmp_path):
+    index = SectionIndex(str(tmp_path))
+    for topic in TOPICS:
+        assert index.add_paper(_Paper(topic)) == 3
+    query = "folding module predicts distance between residue pairs"
+    score, row, record = index.search(query, k=3)[0]
+    assert (record["paper"], record["section"]) == ("hash-proteins", "Method")
+    assert "folding module" in index.text(row)
+    # 排除这篇以后最相似的就不是它了
+    results = index.search(query, exclude_paper="hash-proteins")
+    assert all(record["paper"] != "hash-proteins" for _, _, record in results)
+    _, _, record = index.search("speech recognition from audio", sections={"Abstract"})[0]
+    assert (record["paper"], record["section"]) == ("hash-speech", "Abstract")
+    index.close()
+
+
+def test_adding_the_same_pdf_twice_does_not_duplicate_rows(tmp_path):
+    index = SectionIndex(str(tmp_path))
+    index.add_paper(_Paper("graphs"))
+    assert index.add_paper(_Paper("graphs", title="Renamed copy")) == 0
+    assert index.count == 3 and _rows_on_disk(tmp_path) == 3
+    index.close()
+    # 重新打开后仍然认得这篇论文
+    reopened = SectionIndex(str(tmp_path))
+    assert reopened.add_paper(_Paper("graphs")) == 0
+    assert reopened.count == 3 and _rows_on_disk(tmp_path) == 3
+    assert reopened.add_paper(_Paper("speech")) == 3
+    assert reopened.count == 6
+    reopened.close()
+
+
+def test_related_context_comes_from_other_papers(tmp_path):
+    index = SectionIndex(str(tmp_path))
+    for topic in TOPICS:
+        index.add_paper(_Paper(topic))
+    # 一篇新的图网络论文：相关内容来自已有的图网络论文，不包括它自己
+    paper = _Paper("graphs", source_hash="hash-new-graphs", title="Another Graph Paper")
+    index.add_paper(paper)
+    context = index.related_context(paper, k=1)
+    assert context.startswith("- A Paper About Graphs (")
+    assert "Another Graph Paper" not in context
+    # 同一篇论文的其他版本（标题相同）不算相关工作
+    version = _Paper("graphs", source_hash="hash-graphs-v2")
+    assert "A Paper About Graphs" not in index.related_context(version, k=1)
+    index.close()
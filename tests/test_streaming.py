@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from conftest import StubPaper
+from fake_llm import FakeCompletion
+from utils import COMBINED_MARKERS, review_by_chatgpt
+
+COMBINED_REPLY = (f"{COMBINED_MARKERS['summary']}\n1. Title: Paper\n\n{COMBINED_MARKERS['method']}\n"
+                  f"7. - (1): encode;\n{COMBINED_MARKERS['conclusion']}\n8. Conclusion: - (4): Score: 7;")
+
+
+class _SmallDeltas:
+    # 按3个字符一段流式输出，合并模式的分段标记会被拆在两次回调里
+    def __init__(self, reply):
+        self.reply = reply
+
+    def __call__(self, messages, model="gpt-3.5-turbo", on_delta=None, **params):
+        if on_delta is not None:
+            for start in range(0, len(self.reply), 3):
+                on_delta(self.reply[start:start + 3])
+        return self.reply
+
+
+def _without_streaming(completion):
+    # 不支持流式的补全函数：忽略on_delta，只返回完整回答
+    def complete(messages, model="gpt-3.5-turbo", on_delta=None, **params):
+        return completion(messages, model=model, **params)
+
+    return complete
+
+
+def _reports(export_path, completion, combined):
+    names = [f"paper-{index}" for index in range(3)]
+    report_paths = review_by_chatgpt([StubPaper(index) for index in range(3)], api_key='', key_word="Test",
+                                     export_path=str(export_path), file_format="txt", file_names=names,
+                                     max_workers=3, completion=completion, combined=combined,
+                                     progress=lambda line: None)
+    reports = {}
+    for path in report_paths:
+        with open(path, encoding="utf-8") as f:
+            reports[os.path.basename(path)] = f.read()
+    return reports
+
+
+@pytest.mark.parametrize("combined", [False, True])
+@pytest.mark.parametrize("make_completion", [
+    lambda: FakeCompletion(latency=0.01, reply=COMBINED_REPLY),
+    lambda: _SmallDeltas(COMBINED_REPLY),
+], ids=["fake-llm", "small-deltas"])
+def test_streamed_reports_match_non_streamed(tmp_path, make_completion, combined):
+    streamed = _reports(tmp_path / "streamed", make_completion(), combined)
+    buffered = _reports(tmp_path / "buffered", _without_streaming(make_completion()), combined)
+    assert len(streamed) == 3
+    assert streamed == buffered
+    if combined:
+        # 标记不写进报告，三部分分在报告的三段里
+        for report in streamed.values():
+            assert "<<<" not in report
+            assert report.index("1. Title") < report.index("7. - (1)") < report.index("8. Conclusion")
@@ -0,0 +1,91 @@
+import shutil
+import threading
+import time
+
+import pytest
+
+from fake_llm import FakeCompletion
+from watch_folder import run_daemon
+
+SETTLE = 0.5
+
+
+class Daemon:
+    # 在后台线程里跑run_daemon（定时扫描，不用inotify），记下每行进度和它出现的时间
+    def __init__(self, inbox, output_dir, **review_options):
+        self.lines = []
+        self.stop = threading.Event()
+        options = dict(workers=2, settle=SETTLE, poll_interval=0.05, use_inotify=False, use_cache=False,
+                       parse_workers=1, completion=FakeCompletion(latency=0))
+        options.update(review_options)
+        self.thread = threading.Thread(target=run_daemon, args=(str(inbox), "ML"),
+                                       kwargs=dict(output_dir=str(output_dir), stop=self.stop,
+                                                   progress=lambda line: self.lines.append((time.monotonic(), line)),
+                                                   **options))
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join(timeout=60)
+
+    def wait_for(self, prefix, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for at, line in list(self.lines):
+                if line.startswith(prefix):
+                    return at
+            time.sleep(0.02)
+        raise AssertionError(f"no {prefix!r} line in {[line for _, line in self.lines]}")
+
+    def count(self, prefix):
+        return sum(line.startswith(prefix) for _, line in list(self.lines))
+
+
+def test_partial_file_waits_for_settle_and_eof(tmp_path, pdfs):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    with open(pdfs[0], "rb") as f:
+        data = f.read()
+    target = inbox / "paper.pdf"
+    # 拷贝到一半：大小不再变化，但末尾还没有%%EOF
+    target.write_bytes(data[:len(data) // 2])
+    with Daemon(inbox, tmp_path / "review") as daemon:
+        time.sleep(SETTLE * 3)
+        assert daemon.count("New file") == 0
+        target.write_bytes(data)
+        written = time.monotonic()
+        started = daemon.wait_for("New file paper")
+        daemon.wait_for("Reviewed paper")
+    # 写完后还要等文件settle秒不再变化
+    assert started - written >= SETTLE
+    assert daemon.count("New file") == 1 and daemon.count("Failed") == 0
+
+
+def test_already_reviewed_file_is_skipped_for_the_same_domain_and_mode(tmp_path, pdfs):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    shutil.copy(pdfs[1], inbox / "paper.pdf")
+    with Daemon(inbox, tmp_path / "review") as daemon:
+        daemon.wait_for("Reviewed paper")
+    # 重新启动：同一领域、同一审阅模式下已经审过，跳过
+    with Daemon(inbox, tmp_path / "review") as daemon:
+        daemon.wait_for("Skipping paper: already reviewed")
+        time.sleep(SETTLE)
+        assert daemon.count("New file") == 0
+    # 换成合并审阅模式是另一项任务，重新审阅
+    with Daemon(inbox, tmp_path / "review", combined=True) as daemon:
+        daemon.wait_for("Reviewed paper")
+        assert daemon.count("Skipping") == 0
+
+
+def test_file_that_fails_to_parse_is_logged_as_failed(tmp_path):
+    pytest.importorskip("fitz")
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    (inbox / "broken.pdf").write_bytes(b"not really a pdf\n%%EOF\n")
+    with Daemon(inbox, tmp_path / "review") as daemon:
+        daemon.wait_for("Failed to review broken")
+    assert daemon.count("Reviewed") == 0
@@ -0,0 +1,119 @@
+import multiprocessing
+import os
+import signal
+import time
+
+import pytest
+
+from fake_llm import FakeCompletion
+from work_queue import DONE, FAILED, LEASED, WorkQueue, run_worker
+
+pytest.importorskip("fitz")
+
+
+def worker_process(queue_path, output_dir, worker_id, calls_path, latency=0.1, lease_seconds=0.6,
+                   own_group=False):
+    # 在spawn出来的子进程里跑一个worker；每次LLM调用往calls_path追加一行worker id，各进程的调用数合起来数。
+    # own_group: 自成一个进程组，测试可以连同它的解析子进程一起杀掉
+    if own_group:
+        os.setpgrp()
+    completion = FakeCompletion(latency=latency)
+
+    def counted(messages, model, on_delta=None, **params):
+        with open(calls_path, "a") as f:
+            f.write(worker_id + "\n")
+        return completion(messages, model, on_delta=on_delta, **params)
+
+    # 租约比审阅一批的时间短，要靠心跳续约，否则别的worker会重复审阅
+    run_worker(queue_path, output_dir=output_dir, worker_id=worker_id, batch=2, lease_seconds=lease_seconds,
+               poll_interval=0.1, use_cache=False, parse_workers=1, completion=counted, progress=lambda line: None)
+
+
+def start_workers(tmp_path, worker_ids, **kwargs):
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=worker_process, args=(str(tmp_path / "queue.sqlite"), str(tmp_path / "review"),
+                                                              worker_id, str(tmp_path / "calls.txt")), kwargs=kwargs)
+                 for worker_id in worker_ids]
+    for process in processes:
+        process.start()
+    return processes
+
+
+def calls_by_worker(tmp_path):
+    with open(tmp_path / "calls.txt") as f:
+        lines = f.read().split()
+    return {worker_id: lines.count(worker_id) for worker_id in set(lines)}
+
+
+def join(processes):
+    for process in processes:
+        process.join(timeout=120)
+        assert process.exitcode == 0
+
+
+def test_worker_processes_share_the_queue_and_requeue_expired_leases(tmp_path, pdfs):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), lease_seconds=0.3)
+    assert queue.enqueue(pdfs, "ML") == len(pdfs)
+    # 一个worker领了两个任务后失联，不再续约
+    lost = queue.claim("lost-worker", 2)
+    join(start_workers(tmp_path, [f"worker-{index}" for index in range(3)]))
+    assert queue.stats() == {"queued": 0, "leased": 0, "done": len(pdfs), "failed": 0}
+    jobs = {job["id"]: job for job in queue.jobs()}
+    for job in lost:
+        assert jobs[job["id"]]["attempts"] == 2
+        assert jobs[job["id"]]["worker"] != "lost-worker"
+    assert all(job["status"] == DONE and job["report_path"] for job in jobs.values())
+    # 每篇只审阅了一次（三步，每步一次调用）
+    assert sum(calls_by_worker(tmp_path).values()) == len(pdfs) * 3
+    queue.close()
+
+
+@pytest.mark.skipif(not hasattr(os, "killpg"), reason="needs POSIX process groups")
+def test_jobs_of_a_killed_worker_are_finished_by_the_others(tmp_path, pdfs):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"))
+    queue.enqueue(pdfs, "ML")
+    # 这个worker的LLM调用很慢，领到任务、开始审阅后被杀掉，心跳随之停止
+    doomed, = start_workers(tmp_path, ["doomed"], latency=60, lease_seconds=1.0, own_group=True)
+    deadline = time.time() + 60
+    while not (tmp_path / "calls.txt").exists() and time.time() < deadline:
+        time.sleep(0.05)
+    held = [job for job in queue.jobs(LEASED) if job["worker"] == "doomed"]
+    assert len(held) == 2
+    os.killpg(doomed.pid, signal.SIGKILL)
+    doomed.join()
+    join(start_workers(tmp_path, ["worker-0", "worker-1"]))
+    assert queue.stats() == {"queued": 0, "leased": 0, "done": len(pdfs), "failed": 0}
+    jobs = {job["id"]: job for job in queue.jobs()}
+    for job in held:
+        assert jobs[job["id"]]["attempts"] == 2
+        assert jobs[job["id"]]["worker"] in ("worker-0", "worker-1")
+    calls = calls_by_worker(tmp_path)
+    assert calls["worker-0"] + calls["worker-1"] == len(pdfs) * 3
+    queue.close()
+
+
+def test_failed_job_records_the_parse_error(tmp_path):
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"this is not a pdf")
+    queue_path = str(tmp_path / "queue.sqlite")
+    queue = WorkQueue(queue_path)
+    queue.enqueue([str(broken)], "ML")
+    run_worker(queue_path, output_dir=str(tmp_path / "review"), max_attempts=1, use_cache=False, parse_workers=1,
+               completion=FakeCompletion(latency=0), progress=lambda line: None)
+    job, = queue.jobs(FAILED)
+    # 记下的是解析器抛出的错误，而不是笼统的“没有报告”
+    assert job["error"] and job["error"] != "no report was written"
+    queue.close()
+
+
+def test_late_result_from_an_expired_lease_still_counts(tmp_path, pdfs):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), lease_seconds=0.1)
+    queue.enqueue(pdfs[:1], "ML")
+    job = queue.claim("slow-worker")[0]
+    time.sleep(0.2)
+    # 租约过期、任务回到队列后，慢的worker才写完报告
+    assert queue.stats()["queued"] == 1
+    queue.complete(job["id"], "slow-worker", "report.txt", 7.0)
+    assert queue.claim("other-worker") == []
+    assert queue.jobs(DONE)[0]["score"] == 7.0
+    queue.close()
@@ -0,0 +1,96 @@
+"""
+基于tokenizer的prompt预算：计数、按token截断、按token切块。
+优先使用本地可用的tiktoken编码，不可用（未安装或离线无法加载词表）时退回到估算函数；
+也可以用set_token_counter换成任意计数函数。
+"""
+import math
+import re
+
+_counter = None
+_encoding = None
+
+# 段落、句子、空白，按粒度从粗到细依次尝试作为切分点
+_SPLIT_PATTERNS = [re.compile(r"\n\s*\n"), re.compile(r"(?<=[.!?。])\s+"), re.compile(r"\s+")]
+
+
+def estimate_tokens(text):
+    # 离线估算：英文大约4个字符一个token，单词很短时按单词数兜底
+    return max(math.ceil(len(text) / 4), len(text.split()))
+
+
+def _load_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # 未安装tiktoken，或离线时词表不在本地缓存里
+            _encoding = False
+    return _encoding
+
+
+def set_token_counter(counter):
+    """替换token计数函数，counter(text) -> int；传None恢复默认（tiktoken或估算）。"""
+    global _counter
+    _counter = counter
+
+
+def count_tokens(text):
+    if _counter is not None:
+        return _counter(text)
+    encoding = _load_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """截断到不超过max_tokens个token。"""
+    if max_tokens <= 0:
+        return ''
+    if _counter is None and _load_encoding():
+        tokens = _encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else _encoding.decode(tokens[:max_tokens])
+    n_tokens = count_tokens(text)
+    while n_tokens > max_tokens:
+        # 按比例估计截断位置，每次至少缩短一个字符
+        cut = min(len(text) - 1, int(len(text) * max_tokens / n_tokens * 0.98))
+        text = text[:cut]
+        n_tokens = count_tokens(text)
+    return text
+
+
+def split_into_chunks(text, max_tokens):
+    """
+    按段落、句子、空白的优先级把文本切成每块不超过max_tokens的块，尽量不在句子中间切开。
+    """
+    if count_tokens(text) <= max_tokens:
+        return [text] if text else []
+    for pattern in _SPLIT_PATTERNS:
+        pieces = [piece for piece in pattern.split(text) if piece.strip()]
+        if len(pieces) > 1:
+            break
+    else:
+        # 没有任何切分点，只能硬截断
+        head = truncate_to_tokens(text, max_tokens)
+        return [head] + split_into_chunks(text[len(head):], max_tokens)
+
+    # 逐片累加token数（加1近似分隔空格），避免反复对整块重新计数
+    chunks = []
+    current = []
+    current_tokens = 0
+    for piece in pieces:
+        piece_tokens = count_tokens(piece)
+        if current and current_tokens + piece_tokens + 1 > max_tokens:
+            chunks.append(' '.join(current))
+            current, current_tokens = [], 0
+        if piece_tokens > max_tokens:
+            # 单个片段本身超出预算，用更细的切分点继续切
+            chunks.extend(split_into_chunks(piece, max_tokens))
+            continue
+        current.append(piece)
+        current_tokens += piece_tokens + 1
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
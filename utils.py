@@ -1,15 +1,43 @@
-import openai 
-from pdf_parser import Paper
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import contextlib
+import contextvars
 import datetime
+import hashlib
 import os
 import re
+import time
+from llm_backend import default_backend
+from token_budget import count_tokens, split_into_chunks, truncate_to_tokens
 
 
 
-def chat_summary(api_key, key_word, text):
-    openai.api_key = api_key
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
+def openai_completion(messages, api_key=None, model="gpt-3.5-turbo", on_delta=None, **params):
+    """
+    on_delta: 可选回调，传入时以流式方式请求，每收到一段文本就调用一次on_delta(text)。
+    无论是否流式，都返回完整的回答文本。
+    """
+    # 延迟导入，只在真正调用API时才加载openai
+    import openai
+    # api_key随请求传入，不修改openai.api_key全局状态，多线程并发调用时互不干扰
+    if on_delta is None:
+        response = openai.ChatCompletion.create(model=model, messages=messages, api_key=api_key, **params)
+        result = ''
+        for choice in response.choices:
+            result += choice.message.content
+        return result
+    result = ''
+    for chunk in openai.ChatCompletion.create(model=model, messages=messages, api_key=api_key, stream=True, **params):
+        delta = chunk.choices[0].delta.get("content", '') if chunk.choices else ''
+        if delta:
+            result += delta
+            on_delta(delta)
+    return result
+
+def chat_summary(api_key, key_word, text, completion=None, model="gpt-3.5-turbo", **params):
+    completion = completion or default_backend(api_key)
+    return completion(
+        model=model,
+        **params,
         messages=[
             {"role": "system",
              "content": "You are a researcher in the [" + key_word + "] field, proficient in using concise language to summarize research papers."},
@@ -35,16 +63,12 @@ def chat_summary(api_key, key_word, text):
                 """},
         ]
     )
-    result = ''
-    for choice in response.choices:
-        result += choice.message.content
-    # print("summary_result:\n", result)
-    return result
 
-def chat_method(api_key, key_word, text):
-    openai.api_key = api_key
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
+def chat_method(api_key, key_word, text, completion=None, model="gpt-3.5-turbo", **params):
+    completion = completion or default_backend(api_key)
+    return completion(
+        model=model,
+        **params,
         messages=[
             {"role": "system",
              "content": "You are a researcher in the [" + key_word + "] field, proficient in using concise language to summarize research papers."},
@@ -68,16 +92,12 @@ def chat_method(api_key, key_word, text):
                     """},
         ]
     )
-    result = ''
-    for choice in response.choices:
-        result += choice.message.content
-    # print("method_result:\n", result)
-    return result
 
-def chat_conclusion(api_key, key_word, text):
-    openai.api_key = api_key
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
+def chat_conclusion(api_key, key_word, text, completion=None, model="gpt-3.5-turbo", **params):
+    completion = completion or default_backend(api_key)
+    return completion(
+        model=model,
+        **params,
         # prompt需要用英语替换，少占用token。
         messages=[
             {"role": "system",
@@ -121,11 +141,109 @@ def chat_conclusion(api_key, key_word, text):
                     """},
         ]
     )
-    result = ''
-    for choice in response.choices:
-        result += choice.message.content
-    # print("conclusion_result:\n", result)
-    return result
+
+def chat_condense(api_key, key_word, text, completion=None, model="gpt-3.5-turbo", section_name='', max_words=300):
+    # map-reduce中的map步骤：把超长章节的一个片段压缩成要点
+    completion = completion or default_backend(api_key)
+    return completion(
+        model=model,
+        messages=[
+            {"role": "system",
+             "content": "You are a researcher in the [" + key_word + "] field, proficient in using concise language to summarize research papers."},
+            {"role": "assistant",
+             "content": "This is one part of the <" + section_name + "> section of an English literature: " + text},
+            {"role": "user", "content": """
+                         Condense this part into its key points in no more than """ + str(max_words) + """ words.
+                         Keep all method steps, equations in words, settings and the original numerical values; drop repetition and citations.
+                         Output plain text without any preface.
+                    """},
+        ]
+    )
+
+# 合并审阅模式下回答里分隔三部分的标记，每个标记单独占一行
+COMBINED_MARKERS = {"summary": "<<<SUMMARY>>>", "method": "<<<METHOD>>>", "conclusion": "<<<CONCLUSION>>>"}
+_COMBINED_MARKER = re.compile("|".join(re.escape(marker) for marker in COMBINED_MARKERS.values()))
+
+def chat_combined(api_key, key_word, text, completion=None, model="gpt-3.5-turbo", with_method=True, **params):
+    # 一次请求完成summary、method、conclusion三部分，回答用COMBINED_MARKERS分段
+    completion = completion or default_backend(api_key)
+    method_part = """
+                     """ + COMBINED_MARKERS["method"] + """
+                     7. The detailed methods can be summarized as follows: \n\n
+                        - (1):xxx;\n
+                        - (2):xxx;\n
+                        - (3):xxx;\n
+                        .......\n\n""" if with_method else ''
+    return completion(
+        model=model,
+        **params,
+        messages=[
+            {"role": "system",
+             "content": "You are a researcher and a rigorous reviewer in the [" + key_word + "] field, proficient in using concise language to summarize research papers."},
+            {"role": "assistant",
+             "content": "This is the title, Abstract and Introduction" + (", <Methods>" if with_method else '') + " and <Conclusion> sections of an English literature. I need your help to read it, summarize it and review it: " + text},
+            {"role": "user", "content": """
+                     Answer in """ + ("three" if with_method else "two") + """ parts. Start each part with its marker on its own line, exactly as written below, and output nothing before the first marker.
+                     """ + COMBINED_MARKERS["summary"] + """
+                     1. Title: xxx\n\n
+                     2. Keywords: xxx\n\n
+                     3. Summary: one paragraph on (1) the research background, (2) previous methods, their problems and how this work differs, (3) the proposed method, (4) the tasks, the performance obtained and whether it supports the goals.\n\n""" + method_part + """
+                     """ + COMBINED_MARKERS["conclusion"] + """
+                     8. Conclusion: \n\n
+                        - (1): significance of this work;\n
+                        - (2): Strengths (innovation, performance, workload): \n -a. xxx;\n -b. xxx;\n ......
+                        - (3): Weaknesses (innovation, performance, workload): \n -a. xxx;\n -b. xxx;\n ......
+                        - (4): Score (0~10): xxx;\n -Justifications: xxx;\n
+                        - (5): Detailed Feedback:\n - a. xxx;\n - b. xxx;\n ......
+                     Use concise and academic language, use the original numerical values, do not repeat content across the parts, strictly follow the format, and use \n for line breaks.
+                     The "......." represents filling in according to actual needs; if there is none, you do not need to write it.
+                     Point out the really important weaknesses and score as rigorously as possible.
+                """},
+        ]
+    )
+
+def split_combined_review(text):
+    """
+    把合并审阅的回答按标记拆回 {阶段: 文本}；缺少的部分为空字符串，
+    没有任何标记时整段作为summary。
+    """
+    parts = {stage: '' for stage in COMBINED_MARKERS}
+    stages = {marker: stage for stage, marker in COMBINED_MARKERS.items()}
+    matches = list(_COMBINED_MARKER.finditer(text))
+    if not matches:
+        parts["summary"] = text.strip()
+        return parts
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+        parts[stages[match.group()]] = text[match.end():end].strip()
+    return parts
+
+def condense_section(api_key, key_word, section_name, text, max_tokens, completion=None, max_call_tokens=2500,
+                     max_workers=4, model="gpt-3.5-turbo"):
+    """
+    map-reduce压缩超长章节：按单次调用的token预算切块，并行压缩每一块，再把各块的要点拼起来；
+    拼起来仍超出max_tokens时对结果再做一轮，直到满足预算。
+    max_workers只限制这一个章节同时压缩的块数；整个批次同时在途的请求数由completion所经过的
+    scheduler.RequestScheduler的max_in_flight统一限制（run_review里默认等于同时在审的论文数）。
+    """
+    # 给prompt本身留出余量
+    chunk_tokens = max(max_call_tokens - 400, 200)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while count_tokens(text) > max_tokens:
+            chunks = split_into_chunks(text, chunk_tokens)
+            max_words = max(int(max_tokens * 0.75 / len(chunks)), 50)
+            # 每个分块在提交线程的上下文副本里执行，telemetry能把请求记到当前论文和阶段名下
+            futures = [executor.submit(contextvars.copy_context().run, chat_condense, api_key=api_key,
+                                       key_word=key_word, text=chunk, completion=completion, model=model,
+                                       section_name=section_name, max_words=max_words)
+                       for chunk in chunks]
+            partials = [future.result() for future in futures]
+            condensed = "\n".join(partials)
+            if len(chunks) == 1 or count_tokens(condensed) >= count_tokens(text):
+                # 已经压不动了，直接截断
+                return truncate_to_tokens(condensed, max_tokens)
+            text = condensed
+    return text
 
 def validateTitle(title):
     # 将论文的乱七八糟的路径格式修正
@@ -133,6 +251,42 @@ def validateTitle(title):
     new_title = re.sub(rstr, "_", title)  # 替换为下划线
     return new_title
 
+class ReportWriter:
+    """
+    边生成边写报告：每段写入后立即flush，中途中断也会留下可读的部分报告。
+    各段之间用换行分隔，最终内容与 "\n".join(各段) 一致。
+    """
+
+    def __init__(self, file_name=None):
+        self.parts = []
+        self.file = open(file_name, 'w', encoding="utf-8") if file_name else None
+
+    def begin_part(self):
+        if self.parts:
+            self._write_file("\n")
+        self.parts.append('')
+
+    def write(self, text):
+        # 追加到当前段，流式输出时每收到一段token调用一次
+        self.parts[-1] += text
+        self._write_file(text)
+
+    def add(self, text):
+        self.begin_part()
+        self.write(text)
+
+    def _write_file(self, text):
+        if self.file is not None:
+            self.file.write(text)
+            self.file.flush()
+
+    def text(self):
+        return "\n".join(self.parts)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
 def export_to_markdown(text, file_name, mode='w'):
     # 使用markdown模块的convert方法，将文本转换为html格式
     # html = markdown.markdown(text)
@@ -141,79 +295,436 @@ def export_to_markdown(text, file_name, mode='w'):
         # 将html格式的内容写入文件
         f.write(text)
 
-def review_by_chatgpt(paper_list, api_key, key_word, export_path, file_format, file_names):
-    htmls = []
-    for paper_index, paper in enumerate(paper_list):
-        # 第一步先用title，abs，和introduction进行总结。
-        text = ''
-        text += 'Title:' + paper.title
-        # # text += 'Url:' + paper.url
-        # text += 'Abstrat:' + paper.abs
-        # intro
-        text += list(paper.section_text_dict.values())[0]
-        max_token = 2500 * 4
-        text = text[:max_token]
-        chat_summary_text = chat_summary(api_key=api_key, text=text,key_word=key_word)
-        htmls.append('## Paper:' + str(paper_index + 1))
-        htmls.append('\n\n\n')
-        htmls.append(chat_summary_text)
-
-        # 第二步总结方法：
-        # TODO，由于有些文章的方法章节名是算法名，所以简单的通过关键词来筛选，很难获取，后面需要用其他的方案去优化。
-        method_key = ''
-        for parse_key in paper.section_text_dict.keys():
-            if 'method' in parse_key.lower() or 'approach' in parse_key.lower() or 'semantic memory model' in parse_key.lower():
-                method_key = parse_key
-                break
+def find_method_key(section_keys):
+    """
+    找到方法章节的key：优先按关键词匹配；方法章节以算法名命名时，
+    取引言、相关工作、背景等前置章节之后，实验、结论等后置章节之前的第一个章节。
+    """
+    section_keys = [key for key in section_keys if key != 'title']
+    for parse_key in section_keys:
+        if 'method' in parse_key.lower() or 'approach' in parse_key.lower() or 'semantic memory model' in parse_key.lower():
+            return parse_key
+    front_words = ('abstract', 'keyword', 'index terms', 'introduction', 'related', 'background', 'preliminar',
+                   'problem', 'motivation', 'overview')
+    back_words = ('experiment', 'evaluation', 'result', 'discussion', 'conclu', 'reference', 'acknowledg',
+                  'appendix', 'finding', 'data analysis', 'limitation')
+    for parse_key in section_keys:
+        key = parse_key.lower()
+        if any(word in key for word in back_words):
+            break
+        if not any(word in key for word in front_words):
+            return parse_key
+    return ''
+
+class _CombinedReportStream:
+    """
+    合并审阅的流式回答：遇到标记就切换到报告的下一段，标记本身不写入。
+    标记可能被拆在两次回调里，所以缓冲区末尾不足一个标记长度的内容先留着，等下一次回调或结束时再写。
+    start_part(stage): 开始写报告里的某一段，返回该段的写入函数。
+    """
 
-        if method_key != '':
-            text = ''
-            method_text = ''
-            summary_text = ''
-            summary_text += "<summary>" + chat_summary_text
-            # methods
-            method_text += paper.section_text_dict[method_key]
-            # TODO 把这个变成tenacity的自动判别！
-            max_token = 2500 * 4
-            text = summary_text + "\n\n<Methods>:\n\n" + method_text
-            text = text[:max_token]
-            chat_method_text = chat_method(api_key=api_key, text=text,key_word=key_word)
-            htmls.append(chat_method_text)
-        else:
-            chat_method_text = ''
-        htmls.append("\n" * 4)
-
-        # 第三步总结全文，并打分：
-        conclusion_key = ''
-        for parse_key in paper.section_text_dict.keys():
-            if 'conclu' in parse_key.lower():
-                conclusion_key = parse_key
+    def __init__(self, start_part):
+        self.start_part = start_part
+        self.stages = {marker: stage for stage, marker in COMBINED_MARKERS.items()}
+        self.hold = max(len(marker) for marker in COMBINED_MARKERS.values()) - 1
+        self.buffer = ''
+        self.write = None
+        self.fresh = True
+        self.streamed = False
+
+    def feed(self, delta):
+        self.streamed = True
+        self.buffer += delta
+        self._drain(final=False)
+
+    def close(self):
+        if self.streamed:
+            self._drain(final=True)
+
+    def _drain(self, final):
+        while True:
+            match = _COMBINED_MARKER.search(self.buffer)
+            if match is None:
                 break
+            if self.write is not None:
+                self._emit(self.buffer[:match.start()].rstrip())
+            self.write = self.start_part(self.stages[match.group()])
+            self.fresh = True
+            self.buffer = self.buffer[match.end():]
+        if self.write is None:
+            # 还没出现任何标记；到结束都没有时整段作为summary
+            if not final:
+                return
+            self.write = self.start_part("summary")
+        end = len(self.buffer) if final else max(len(self.buffer) - self.hold, 0)
+        self._emit(self.buffer[:end])
+        self.buffer = self.buffer[end:]
+
+    def _emit(self, text):
+        if self.fresh:
+            # 每段开头的空白（标记后的换行）不写入
+            text = text.lstrip()
+            self.fresh = text == ''
+        if text:
+            self.write(text)
+
+def review_paper(paper, paper_index, api_key, key_word, completion=None, manifest=None, paper_key=None,
+                 max_prompt_tokens=2500, map_reduce=False, writer=None, progress=None, name='', telemetry=None,
+                 models=None, combined=False, related=None, triage=False, outputs=None):
+    """
+    对单篇论文依次执行 summary -> method -> conclusion 三步，三步之间有依赖，必须串行。
+    triage: 为True时只做summary一步（标题和第一个章节，通常是摘要），用于快速分拣大批论文；
+            配合惰性解析的Paper（lazy=True）时后面的页面完全不会被解析。
+    combined: 为True时改用一次请求完成三部分（见chat_combined），回答按标记拆回报告的三段，
+              延迟约为三步模式的1/3，也不再重复发送前面步骤的回答；三步模式保真度更高，仍是默认。
+    related: 可选的 related(paper) -> str，返回其他论文里的相关内容（如section_index.SectionIndex.related_context），
+             作为相关工作放进conclusion阶段的prompt。
+    manifest: 可选的review_manifest.ReviewManifest，已完成的阶段直接读取上次的输出，新完成的阶段立即记录。
+    max_prompt_tokens: 每次调用送入的论文内容的token预算。
+    map_reduce: 为True时超出预算的method/conclusion章节先分块并行压缩再合并，否则直接截断。
+    writer: 可选的ReportWriter，回答以流式方式边生成边写入报告文件。
+    progress: 可选的进度回调，阶段开始和生成过程中收到 name 开头的状态文本（约每秒一次）。
+    telemetry: 可选的telemetry.Telemetry，按 name 和阶段记录耗时（包括map-reduce压缩）。
+    models: 可选的 阶段 -> 模型名 字典（见llm_backend.stage_models），未列出的阶段用gpt-3.5-turbo。
+    outputs: 可选的字典，填入各阶段的输出 {阶段: 文本}，供review_store等结构化保存。
+    返回该论文的报告文本。
+    """
+    writer = writer or ReportWriter()
+    models = models or {}
+    outputs = {} if outputs is None else outputs
+    def fit_section(section_name, prefix, section_text, limit=None):
+        # 让 prefix + 章节内容 不超过limit（默认是单次调用的token预算）
+        limit = limit or max_prompt_tokens
+        budget = limit - count_tokens(prefix)
+        if map_reduce and count_tokens(section_text) > budget > 0:
+            section_text = condense_section(api_key, key_word, section_name, section_text, budget,
+                                            completion=completion, max_call_tokens=max_prompt_tokens,
+                                            model=models.get("condense", "gpt-3.5-turbo"))
+        return truncate_to_tokens(prefix + section_text, limit)
+
+    def run_stage(stage, chat, build_text):
+        # build_text只在该阶段确实需要调用时才执行，已完成的阶段不会再做map-reduce压缩
+        if manifest is not None:
+            done_text = manifest.get_stage(paper_key, stage)
+            if done_text is not None:
+                writer.add(done_text)
+                outputs[stage] = done_text
+                return done_text
+        with telemetry.stage(name, stage) if telemetry is not None else contextlib.nullcontext():
+            text = build_text()
+            if progress is not None:
+                progress(f"Reviewing {name}: {stage}...")
+            writer.begin_part()
+            last_report = [time.monotonic()]
+
+            def on_delta(delta):
+                writer.write(delta)
+                if progress is not None and time.monotonic() - last_report[0] > 1:
+                    last_report[0] = time.monotonic()
+                    progress(f"Reviewing {name}: {stage} ({len(writer.parts[-1])} chars)")
+
+            result = chat(api_key=api_key, text=text, key_word=key_word, completion=completion,
+                          model=models.get(stage, "gpt-3.5-turbo"), on_delta=on_delta)
+        if writer.parts[-1] == '':
+            # 补全函数不支持流式时，一次性写入完整回答
+            writer.write(result)
+        if manifest is not None:
+            manifest.mark_stage(paper_key, stage, result)
+        outputs[stage] = result
+        return result
+
+    def start_part(stage):
+        # 报告的段落布局与三步模式一致：summary、method，空行，conclusion，空行
+        if stage == "conclusion":
+            writer.add("\n" * 4)
+        writer.begin_part()
+        return writer.write
+
+    def run_combined(method_key, conclusion_key):
+        stages = ["summary"] + (["method"] if method_key else []) + ["conclusion"]
+        if manifest is not None:
+            done = {stage: manifest.get_stage(paper_key, stage) for stage in stages}
+            if all(text is not None for text in done.values()):
+                for stage in stages:
+                    start_part(stage)(done[stage])
+                writer.add("\n" * 4)
+                outputs.update(done)
+                return
+        with telemetry.stage(name, "combined") if telemetry is not None else contextlib.nullcontext():
+            # 论文内容的总预算是两次调用的量，按 引言40%、方法35%、结论25% 分配，前面用不完的顺延给后面
+            total = 2 * max_prompt_tokens
+            text = truncate_to_tokens('Title:' + paper.title + next(iter(paper.section_text_dict.values())),
+                                      int(total * 0.4))
+            remaining = total - count_tokens(text)
+            if method_key:
+                method_text = fit_section("Method", "\n\n<Methods>:\n\n", paper.section_text_dict[method_key],
+                                          limit=max(remaining - int(total * 0.25), 1))
+                text += method_text
+                remaining -= count_tokens(method_text)
+            related_text = related(paper) if related is not None else ''
+            if related_text:
+                related_text = truncate_to_tokens("\n\n<Related work from other papers>:\n" + related_text,
+                                                  max(remaining // 3, 1))
+                text += related_text
+                remaining -= count_tokens(related_text)
+            if conclusion_key and remaining > 0:
+                text += fit_section("Conclusion", "\n\n<Conclusion>:\n\n", paper.section_text_dict[conclusion_key],
+                                    limit=remaining)
+            if progress is not None:
+                progress(f"Reviewing {name}: combined...")
+            stream = _CombinedReportStream(start_part)
+            last_report = [time.monotonic()]
+            received = [0]
+
+            def on_delta(delta):
+                stream.feed(delta)
+                received[0] += len(delta)
+                if progress is not None and time.monotonic() - last_report[0] > 1:
+                    last_report[0] = time.monotonic()
+                    progress(f"Reviewing {name}: combined ({received[0]} chars)")
+
+            result = chat_combined(api_key=api_key, text=text, key_word=key_word, completion=completion,
+                                   model=models.get("combined", "gpt-3.5-turbo"), with_method=bool(method_key),
+                                   on_delta=on_delta)
+            stream.close()
+        parts = split_combined_review(result)
+        if not stream.streamed:
+            # 补全函数不支持流式时，按标记拆分后一次性写入
+            for stage in stages:
+                start_part(stage)(parts[stage])
+        writer.add("\n" * 4)
+        outputs.update((stage, parts[stage]) for stage in stages)
+        if manifest is not None:
+            for stage in stages:
+                manifest.mark_stage(paper_key, stage, parts[stage])
 
-        text = ''
-        conclusion_text = ''
-        summary_text = ''
-        summary_text += "<summary>" + chat_summary_text + "\n <Method summary>:\n" + chat_method_text
-        if conclusion_key != '':
-            # conclusion
-            conclusion_text += paper.section_text_dict[conclusion_key]
-            max_token = 2500 * 4
-            text = summary_text + "\n\n<Conclusion>:\n\n" + conclusion_text
-        else:
-            text = summary_text
-        text = text[:max_token]
-        chat_conclusion_text = chat_conclusion(api_key=api_key, text=text,key_word=key_word)
-        htmls.append(chat_conclusion_text)
-        htmls.append("\n" * 4)
-
-        # # 整合成一个文件，打包保存下来。
+    if combined and not triage:
+        writer.add('## Paper:' + str(paper_index + 1))
+        writer.add('\n\n\n')
+        conclusion_key = next((key for key in paper.section_text_dict.keys() if 'conclu' in key.lower()), '')
+        run_combined(find_method_key(paper.section_text_dict.keys()), conclusion_key)
+        return writer.text()
+
+    # 第一步先用title，abs，和introduction进行总结。
+    text = ''
+    text += 'Title:' + paper.title
+    # # text += 'Url:' + paper.url
+    # text += 'Abstrat:' + paper.abs
+    # intro
+    text += next(iter(paper.section_text_dict.values()))
+    text = truncate_to_tokens(text, max_prompt_tokens)
+    writer.add('## Paper:' + str(paper_index + 1))
+    writer.add('\n\n\n')
+    chat_summary_text = run_stage("summary", chat_summary, lambda: text)
+    if triage:
+        writer.add("\n" * 4)
+        return writer.text()
+
+    # 第二步总结方法：
+    method_key = find_method_key(paper.section_text_dict.keys())
+
+    if method_key != '':
+        summary_text = "<summary>" + chat_summary_text
+        # methods
+        method_text = paper.section_text_dict[method_key]
+        chat_method_text = run_stage("method", chat_method,
+                                     lambda: fit_section("Method", summary_text + "\n\n<Methods>:\n\n", method_text))
+    else:
+        chat_method_text = ''
+    writer.add("\n" * 4)
+
+    # 第三步总结全文，并打分：
+    conclusion_key = ''
+    for parse_key in paper.section_text_dict.keys():
+        if 'conclu' in parse_key.lower():
+            conclusion_key = parse_key
+            break
+
+    summary_text = "<summary>" + chat_summary_text + "\n <Method summary>:\n" + chat_method_text
+
+    def with_related(text):
+        # 相关工作放在summary之后、conclusion之前，最多占预算的1/4
+        related_text = related(paper) if related is not None else ''
+        if not related_text:
+            return text
+        return text + truncate_to_tokens("\n\n<Related work from other papers>:\n" + related_text,
+                                         max_prompt_tokens // 4)
+
+    if conclusion_key != '':
+        # conclusion
+        conclusion_text = paper.section_text_dict[conclusion_key]
+        build_text = lambda: fit_section("Conclusion", with_related(summary_text) + "\n\n<Conclusion>:\n\n",
+                                         conclusion_text)
+    else:
+        build_text = lambda: truncate_to_tokens(with_related(summary_text), max_prompt_tokens)
+    chat_conclusion_text = run_stage("conclusion", chat_conclusion, build_text)
+    writer.add("\n" * 4)
+    return writer.text()
+
+def review_by_chatgpt(paper_list, api_key, key_word, export_path, file_format, file_names=None, max_workers=4,
+                      completion=None, cache=None, manifest=None, max_prompt_tokens=2500, map_reduce=False,
+                      progress=print, scheduler=None, telemetry=None, models=None, combined=False, dedup=None,
+                      related=None, compressor=None, triage=False, store=None, on_failure=None):
+    """
+    并发审阅多篇论文：不同论文之间并行，同一篇论文内部的三步保持串行。
+    paper_list: Paper的列表或生成器；生成器会被边解析边消费，论文一解析完就开始审阅。
+    file_names: 与paper_list一一对应的文件名，None时用pdf文件名。
+    max_workers: 同时在审的论文数上限，在审的论文达到上限时才从paper_list取下一篇，
+                 内存占用与并发数有关、与整批大小无关。不用map_reduce时也就是同时在途的LLM请求数上限；
+                 map_reduce的分块请求会超出它，要限制总的在途请求数时传入带max_in_flight的scheduler。
+    completion: 可替换的补全函数，签名为 completion(messages, model, **params) -> str，
+                默认是llm_backend.default_backend(api_key)（连接池复用的HTTP后端）。
+    models: 可选的 阶段 -> 模型名 字典，每个阶段可以用不同的模型。
+    cache: 可选的llm_cache.CompletionCache，相同的请求直接用缓存答案（replay_only时完全不调用API）。
+    manifest: 可选的review_manifest.ReviewManifest，重新运行时跳过已写出报告的论文和已完成的阶段。
+    max_prompt_tokens / map_reduce / combined / related / triage: 见review_paper。
+    dedup: 可选的dedup.Deduplicator，与前面某篇重复（同一文件、同一正文或近似重复的版本）的论文不再审阅，
+           复用那篇的报告（报告末尾注明并入的文件，返回值里对应位置也是那篇的报告路径）。
+    compressor: 可选的prompt_compression.PromptCompressor，章节文本送进prompt前先去掉参考文献、页眉页脚、
+                图表标题和模板文字；每篇论文省下的token数记入telemetry并在进度里显示。
+    store: 可选的review_store.ReviewStore，每篇论文的各阶段输出、解析出的分数、耗时和token数写入sqlite，
+           可以按分数和领域查询，汇总报告由它按需生成。
+    scheduler: 可选的scheduler.RequestScheduler，所有实际发出的请求（包括map-reduce的分块请求）都经过它
+               限速、重试和限制在途请求数（缓存命中的不经过）。
+    telemetry: 可选的telemetry.Telemetry，记录每篇论文各阶段的耗时和每次实际请求的token数、估算费用。
+    progress: 进度回调，接收一行状态文本：每篇论文各阶段的生成进度，以及完成或失败。
+    on_failure: 可选回调 on_failure(path, error)，某篇论文审阅失败时以它的pdf路径和抛出的异常调用；
+                代表论文审阅失败时，并入它的重复论文也各调用一次。
+    报告在生成过程中就逐段写入文件，中途中断也会留下部分报告。
+    返回成功写出的报告路径列表，单篇失败不会影响其他论文。
+    """
+    os.makedirs(export_path, exist_ok=True)
+    completion = completion or default_backend(api_key)
+    if telemetry is not None:
+        completion = telemetry.wrap(completion)
+    if scheduler is not None:
+        completion = scheduler.wrap(completion)
+    if cache is not None:
+        completion = cache.wrap(completion)
+
+    def review_and_export(paper_index, paper, name, key):
+        paper_key = None
+        if manifest is not None:
+            from review_store import review_mode
+            # 分拣、合并和三步审阅的输出各不相同，分开记录
+            paper_key = manifest.paper_key(paper, name, key_word, review_mode(triage, combined))
+            report_path = manifest.get_report(paper_key)
+            if report_path is not None:
+                return report_path
+        # # 每篇论文单独成一个文件，边生成边保存下来。
+        # 文件名带上pdf hash（没有时用pdf路径的hash），前25个字符相同或不同目录下同名的两篇论文不会写到同一个文件
         date_str = str(datetime.datetime.now())[:13].replace(' ', '-')
-        try:
-            os.makedirs(export_path)
-        except:
-            pass
-        mode = 'w' if paper_index == 0 else 'a'
+        digest = getattr(paper, "source_hash", None) or hashlib.sha1(key.encode("utf-8")).hexdigest()
         file_name = os.path.join(export_path,
-                                 date_str + '-' + file_names[paper_index][:25] + "." + file_format)
-        export_to_markdown("\n".join(htmls), file_name=file_name, mode=mode)
-        htmls.clear()
\ No newline at end of file
+                                 date_str + '-' + name[:25] + '-' + digest[:8] + "." + file_format)
+        writer = ReportWriter(file_name)
+        outputs = {}
+        start = time.perf_counter()
+        if compressor is not None:
+            paper = compressor.wrap(paper)
+        try:
+            review_paper(paper, paper_index, api_key=api_key, key_word=key_word, completion=completion,
+                         manifest=manifest, paper_key=paper_key, max_prompt_tokens=max_prompt_tokens,
+                         map_reduce=map_reduce, writer=writer, progress=progress, name=name, telemetry=telemetry,
+                         models=models, combined=combined, related=related, triage=triage, outputs=outputs)
+        finally:
+            writer.close()
+            if compressor is not None:
+                before, after = paper.section_text_dict.tokens_saved()
+                compressed[key] = before - after
+                if telemetry is not None:
+                    telemetry.record("compression", paper=name, tokens_before=before, tokens_after=after,
+                                     tokens_saved=before - after)
+        totals = None
+        if telemetry is not None:
+            totals = telemetry.finish_paper(name, time.perf_counter() - start)
+        if store is not None:
+            from review_store import review_mode
+            store.add(paper, name, key_word, outputs, mode=review_mode(triage, combined), report_path=file_name,
+                      totals=totals)
+        if manifest is not None:
+            manifest.mark_report(paper_key, file_name, name)
+        return file_name
+
+    report_paths = []
+    # 论文都按pdf路径区分（不同目录下的同名pdf是不同的论文），显示时才用name。
+    # 代表论文 -> 报告路径或审阅失败的异常，以及 代表论文 -> 被并入的重复论文 [(name, 路径), ...]
+    names = {}
+    report_by_key = {}
+    error_by_key = {}
+    folded = {}
+    # 论文 -> 压缩省下的token数
+    compressed = {}
+
+    def collect(done):
+        for future in done:
+            key = futures.pop(future)
+            name = names[key]
+            try:
+                report_by_key[key] = future.result()
+                report_paths.append(report_by_key[key])
+                details = []
+                if key in compressed:
+                    details.append(f"compression saved {compressed[key]} tokens")
+                if telemetry is not None:
+                    totals = telemetry.paper_summary(name)
+                    details.append(f"{totals['calls']} calls, "
+                                   f"{totals['prompt_tokens'] + totals['completion_tokens']} tokens, "
+                                   f"~${totals['cost']:.4f}, {totals['review_s']:.1f}s")
+                if scheduler is not None:
+                    stats = scheduler.stats()
+                    details.append(f"calls queued {stats['queued']}, in flight {stats['in_flight']}, "
+                                   f"retried {stats['retried']}")
+                if details:
+                    progress(f"Finished reviewing {name} ({'; '.join(details)}).")
+                else:
+                    progress(f"Finished reviewing {name}.")
+            except Exception as e:
+                error_by_key[key] = e
+                progress(f"Failed to review {name}: {e}")
+                if on_failure is not None:
+                    on_failure(key, e)
+
+    futures = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for paper_index, paper in enumerate(paper_list):
+            if file_names is not None:
+                name = file_names[paper_index]
+            else:
+                name = os.path.splitext(os.path.basename(paper.path))[0]
+            key = paper.path
+            canonical = dedup.check(paper, key) if dedup is not None else None
+            if canonical is not None:
+                # 重复的论文不再调用LLM，复用代表论文的报告
+                folded.setdefault(canonical, []).append((name, key))
+                progress(f"Skipping {name}: duplicate of {names[canonical]}.")
+                continue
+            names[key] = name
+            futures[executor.submit(review_and_export, paper_index, paper, name, key)] = key
+            # 在审的论文达到上限时先等一篇完成，再取下一篇
+            if len(futures) >= max_workers:
+                collect(wait(futures, return_when=FIRST_COMPLETED).done)
+        collect(list(futures))
+    for canonical, duplicates in folded.items():
+        report_path = report_by_key.get(canonical)
+        if report_path is None:
+            # 代表论文审阅失败，并入它的重复论文同样没有报告
+            error = error_by_key.get(canonical)
+            for name, key in duplicates:
+                progress(f"Failed to review {name}: its duplicate {names[canonical]} failed ({error}).")
+                if on_failure is not None:
+                    on_failure(key, error)
+            continue
+        note_folded_duplicates(report_path, [name for name, _ in duplicates])
+        report_paths.extend([report_path] * len(duplicates))
+    return report_paths
+
+
+def note_folded_duplicates(report_path, names):
+    # 在代表论文的报告末尾注明并入的重复文件；断点续跑时已经注明过的不重复追加
+    note = "Folded duplicates (reviewed once): " + ", ".join(names)
+    with open(report_path, encoding="utf-8") as f:
+        if note in f.read():
+            return
+    with open(report_path, 'a', encoding="utf-8") as f:
+        f.write("\n" + note + "\n")
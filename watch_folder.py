@@ -0,0 +1,259 @@
+"""
+监视目录的常驻模式：新的pdf一放进目录就解析和审阅，不用再整批重新审阅。
+- Linux上用inotify（通过ctypes调用libc，不需要额外的包），其他系统或inotify不可用时退回定时扫描目录；
+- 写到一半的文件要等大小和修改时间在settle秒内不再变化、且文件末尾有%%EOF才处理（防抖）；
+- 按pdf内容hash跳过已经审阅过的（review_store里有记录的，或本次运行中正在审的），内容变了的文件重新审阅；
+- 每个就绪的文件单独走一遍 解析 -> 审阅，最多同时审workers篇，一篇论文从放入到报告写完只需要它自己的处理时间；
+  各篇共用一个补全后端、请求调度器和解析进程池，同时审几篇都不会超出rpm/tpm配额。
+
+    python cli.py watch ./inbox --domain Biology --output ./review/
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# <sys/inotify.h>
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_Q_OVERFLOW = 0x4000
+IN_ISDIR = 0x40000000
+_EVENT = struct.Struct("iIII")
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+
+class _Inotify:
+    # inotify的最小封装：add_watch添加目录，read返回发生变化的文件路径列表
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories = {}
+
+    def add_watch(self, directory):
+        wd = self._add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self.directories[wd] = directory
+
+    def read(self, timeout):
+        """
+        等待最多timeout秒，返回 (变化的路径列表, 新建的子目录列表, 是否溢出)。
+        溢出时内核丢了事件，调用方应该重新扫描目录。
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return [], [], False
+        paths, directories, overflow = [], [], False
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return paths, directories, overflow
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            if wd not in self.directories or not name:
+                continue
+            path = os.path.join(self.directories[wd], os.fsdecode(name))
+            (directories if mask & IN_ISDIR else paths).append(path)
+        return paths, directories, overflow
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _looks_complete(path):
+    # pdf以%%EOF结尾（后面可能还有换行和增量更新的空白）；写到一半的文件通常还没有
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(f.tell() - 1024, 0))
+            return b"%%EOF" in f.read()
+    except OSError:
+        return False
+
+
+class FolderWatcher:
+    def __init__(self, directory, recursive=False, settle=2.0, poll_interval=2.0, use_inotify=True):
+        """
+        settle: 文件大小和修改时间保持不变这么多秒后才算写完；
+        poll_interval: 不用inotify时扫描目录的间隔（秒）；用inotify时也按这个间隔检查待定的文件。
+        use_inotify: False时总是定时扫描，例如网络文件系统上inotify收不到别的机器写入的事件。
+        """
+        self.directory = directory
+        self.recursive = recursive
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.inotify = None
+        if use_inotify:
+            try:
+                self.inotify = _Inotify()
+            except (OSError, AttributeError):
+                # 不是Linux，或者inotify实例数用完了
+                self.inotify = None
+        # 路径 -> (大小, 修改时间, 最近一次变化的时间)，等待写完的文件
+        self.pending = {}
+        # 路径 -> (大小, 修改时间)，已经产出过的文件，内容不变时不再产出
+        self.seen = {}
+
+    @property
+    def mode(self):
+        return "inotify" if self.inotify is not None else "polling"
+
+    def _directories(self):
+        if not self.recursive:
+            return [self.directory]
+        return [root for root, _, _ in os.walk(self.directory)]
+
+    def _scan(self, directories=None):
+        for directory in directories or self._directories():
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                self._touch(os.path.join(directory, name))
+
+    def _touch(self, path):
+        # 文件有变化（或可能有变化）：放进待定列表，由_ready判断是否写完
+        if not path.lower().endswith(".pdf") or path in self.pending:
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        if self.seen.get(path) == (stat.st_size, stat.st_mtime):
+            return
+        self.pending[path] = (stat.st_size, stat.st_mtime, time.monotonic())
+
+    def _ready(self):
+        now = time.monotonic()
+        ready = []
+        for path, (size, mtime, changed) in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # 被删除或移走了
+                del self.pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime) != (size, mtime):
+                self.pending[path] = (stat.st_size, stat.st_mtime, now)
+            elif now - changed >= self.settle and stat.st_size > 0 and _looks_complete(path):
+                del self.pending[path]
+                self.seen[path] = (size, mtime)
+                ready.append(path)
+        return ready
+
+    def watch(self, stop):
+        """
+        生成器：产出写完的pdf路径，直到stop（threading.Event）被设置。启动时目录里已有的pdf也会产出。
+        """
+        if self.inotify is not None:
+            for directory in self._directories():
+                self.inotify.add_watch(directory)
+        self._scan()
+        try:
+            while not stop.is_set():
+                timeout = min(self.poll_interval, self.settle / 2) if self.pending else self.poll_interval
+                if self.inotify is not None:
+                    paths, directories, overflow = self.inotify.read(timeout)
+                    for directory in directories:
+                        if self.recursive:
+                            self.inotify.add_watch(directory)
+                            self._scan([directory])
+                    if overflow:
+                        self._scan()
+                    for path in paths:
+                        # 写入过程中不断有修改事件，重新计时
+                        self.pending.pop(path, None)
+                        self.seen.pop(path, None)
+                        self._touch(path)
+                else:
+                    stop.wait(timeout)
+                    self._scan()
+                yield from self._ready()
+        finally:
+            if self.inotify is not None:
+                self.inotify.close()
+
+
+def run_daemon(directory, domain, output_dir='./review/', workers=2, recursive=False, settle=2.0,
+               poll_interval=2.0, use_inotify=True, stop=None, progress=print, **review_options):
+    """
+    监视directory，把新的或内容变了的pdf逐篇送进 解析 -> 审阅，最多同时审workers篇，直到stop被设置。
+    已经审阅过的（review_store里有这份pdf在这个领域、这个审阅模式下的记录）直接跳过。
+    review_options: 传给run_review的其余参数（api_key、completion、backend、cache_dir等）。
+    返回本次运行写出的报告数。
+    """
+    from pdf_parser import file_digest
+    from review_engine import file_stem, run_review, shared_review_options
+    from review_store import ReviewStore, review_mode
+
+    stop = stop or threading.Event()
+    store_path = review_options.pop("store_path", '') or os.path.join(output_dir, "reviews.sqlite")
+    # 每篇论文各自调用一次run_review，几篇同时在审：断点清单和章节索引不能被并发的调用共用，由review_store判断是否审过
+    review_options.update(resume=False, index_sections=False, dedup_threshold=None)
+    # 并发的各次调用共用一个补全后端、调度器（rpm/tpm是整个进程的配额）和解析进程池
+    parse_pool = shared_review_options(review_options, workers=workers)
+    store = ReviewStore(store_path)
+    # 只做过分拣的pdf在完整审阅模式下不算审阅过
+    mode = review_mode(review_options.get("triage", False), review_options.get("combined", False))
+    in_flight = set()
+    lock = threading.Lock()
+    reviewed = [0]
+
+    def review(path, source_hash):
+        start = time.perf_counter()
+        errors = []
+        try:
+            report_paths = run_review([path], domain=domain, output_dir=output_dir, store_path=store_path,
+                                      progress=progress, on_failure=lambda _, error: errors.append(error),
+                                      **review_options)
+            with lock:
+                reviewed[0] += len(report_paths)
+            if report_paths:
+                progress(f"Reviewed {file_stem(path)} in {time.perf_counter() - start:.1f}s.")
+            else:
+                # 解析或审阅失败时run_review不抛异常，只是没有写出报告
+                progress(f"Failed to review {file_stem(path)}: {errors[0] if errors else 'no report was written'}")
+        except Exception as e:
+            progress(f"Failed to review {file_stem(path)}: {e}")
+        finally:
+            with lock:
+                in_flight.discard(source_hash)
+
+    watcher = FolderWatcher(directory, recursive=recursive, settle=settle, poll_interval=poll_interval,
+                            use_inotify=use_inotify)
+    progress(f"Watching {directory} ({watcher.mode}).")
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for path in watcher.watch(stop):
+                try:
+                    source_hash = file_digest(path)
+                except OSError as e:
+                    progress(f"Failed to read {file_stem(path)}: {e}")
+                    continue
+                with lock:
+                    if source_hash in in_flight or store.reviewed(source_hash, domain, mode):
+                        progress(f"Skipping {file_stem(path)}: already reviewed.")
+                        continue
+                    in_flight.add(source_hash)
+                progress(f"New file {file_stem(path)}, reviewing.")
+                executor.submit(review, path, source_hash)
+    finally:
+        store.close()
+        parse_pool.shutdown()
+    return reviewed[0]
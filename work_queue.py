@@ -0,0 +1,268 @@
+"""
+多进程、多机器共享一批审阅任务的工作队列（sqlite）。
+协调者把pdf入队，任意多个worker进程（同一台机器，或挂载了同一文件系统的多台机器）
+按租约领取任务、解析和审阅、记录结果；worker崩溃或失联时租约过期，任务自动回到队列。
+
+    python cli.py enqueue papers/ --queue ./queue.sqlite --domain Biology
+    python cli.py worker --queue ./queue.sqlite --output ./review/        # 每台机器起一个或多个
+    python cli.py queue-status --queue ./queue.sqlite
+
+领取任务用 BEGIN IMMEDIATE 事务，同一时刻只有一个worker能改队列，不会重复领取；
+使用sqlite默认的回滚日志而不是WAL，WAL不能用在网络文件系统上。
+每个任务的结果（报告路径和分数）记在队列库里，任务是否完成只以队列库为准；
+review_store用WAL，多台机器时各自放在本地，不用来判断是否完成。
+"""
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+QUEUED, LEASED, DONE, FAILED = "queued", "leased", "done", "failed"
+
+
+class WorkQueue:
+    def __init__(self, db_path='./queue.sqlite', lease_seconds=600, max_attempts=3):
+        """
+        lease_seconds: 租约时长，worker在此期间没有续约，任务就会被别的worker重新领取；
+        max_attempts: 一个任务最多领取几次，失败或租约过期达到这个次数后标记为failed。
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # 自己管理事务（isolation_level=None），领取任务时显式BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                source_hash TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                status TEXT NOT NULL,
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                report_path TEXT,
+                score REAL,
+                error TEXT,
+                enqueued_at REAL,
+                finished_at REAL,
+                UNIQUE (source_hash, domain)
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, lease_expires)")
+
+    def _transaction(self):
+        return _Transaction(self._conn, self._lock)
+
+    def enqueue(self, paths, domain):
+        """
+        把pdf入队，同一份pdf（按内容hash）在同一领域只入队一次，已失败的重新入队；返回新入队的任务数。
+        """
+        from pdf_parser import file_digest
+
+        now = time.time()
+        rows = [(path, file_digest(path), domain, QUEUED, now) for path in paths]
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany("INSERT INTO jobs (path, source_hash, domain, status, enqueued_at) VALUES (?, ?, ?, ?, ?) "
+                             "ON CONFLICT (source_hash, domain) DO UPDATE SET status = 'queued', attempts = 0, "
+                             "path = excluded.path, error = NULL WHERE status = 'failed'", rows)
+            return conn.total_changes - before
+
+    def claim(self, worker, count=1):
+        """
+        领取最多count个任务，返回任务（dict）列表。先把租约已过期的任务放回队列（次数用完的标记失败）。
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            self._requeue_expired(conn, now)
+            jobs = [dict(row) for row in conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY id LIMIT ?", (QUEUED, count))]
+            for job in jobs:
+                job.update(status=LEASED, worker=worker, lease_expires=now + self.lease_seconds,
+                           attempts=job["attempts"] + 1)
+                conn.execute("UPDATE jobs SET status = ?, worker = ?, lease_expires = ?, attempts = ? WHERE id = ?",
+                             (LEASED, worker, job["lease_expires"], job["attempts"], job["id"]))
+            return jobs
+
+    def _requeue_expired(self, conn, now):
+        conn.execute("UPDATE jobs SET status = ?, worker = NULL, error = 'lease expired' "
+                     "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                     (FAILED, LEASED, now, self.max_attempts))
+        conn.execute("UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND lease_expires < ?",
+                     (QUEUED, LEASED, now))
+
+    def renew(self, job_ids, worker):
+        # 续约；返回仍由这个worker持有的任务数（租约已被别人接手的不再续）
+        expires = time.time() + self.lease_seconds
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany("UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND status = ?",
+                             [(expires, job_id, worker, LEASED) for job_id in job_ids])
+            return conn.total_changes - before
+
+    def held(self, job_ids, worker):
+        # 这些任务里仍由这个worker持有（没有过期被别人接手、也没有被别人完成）的任务id
+        with self._lock:
+            return {row["id"] for row in self._conn.execute(
+                f"SELECT id FROM jobs WHERE id IN ({', '.join('?' * len(job_ids))}) AND worker = ? AND status = ?",
+                (*job_ids, worker, LEASED))}
+
+    def complete(self, job_id, worker, report_path=None, score=None):
+        # 记录结果；租约已经过期（任务回到队列、被别人领取或标记失败）时审阅结果同样有效，别人不必再审一遍
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET status = ?, worker = ?, report_path = ?, score = ?, finished_at = ?, "
+                         "lease_expires = NULL WHERE id = ? AND status != ?",
+                         (DONE, worker, report_path, score, time.time(), job_id, DONE))
+
+    def fail(self, job_id, worker, error):
+        # 还有领取次数的放回队列，否则标记失败
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, worker = NULL, "
+                         "error = ?, lease_expires = NULL WHERE id = ? AND worker = ? AND status = ?",
+                         (self.max_attempts, FAILED, QUEUED, str(error)[:500], job_id, worker, LEASED))
+
+    def stats(self):
+        # 各状态的任务数
+        with self._transaction() as conn:
+            self._requeue_expired(conn, time.time())
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in (QUEUED, LEASED, DONE, FAILED)}
+
+    def jobs(self, status=None):
+        sql, args = "SELECT * FROM jobs", ()
+        if status is not None:
+            sql, args = sql + " WHERE status = ?", (status,)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql + " ORDER BY id", args)]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _Transaction:
+    # BEGIN IMMEDIATE ... COMMIT/ROLLBACK；进程内用锁串行，进程间靠sqlite的写锁（等待timeout秒）
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self.lock.release()
+            raise
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type is not None else "COMMIT")
+        finally:
+            self.lock.release()
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def run_worker(queue_path, output_dir='./review/', worker_id=None, batch=4, lease_seconds=600, max_attempts=3,
+               wait=False, poll_interval=5.0, progress=print, **review_options):
+    """
+    worker主循环：每次领取batch篇，用review_engine.run_review解析和审阅，把每篇的报告路径和分数记回队列。
+    审阅期间后台线程每lease_seconds/3秒续约一次。
+    wait: 队列空了以后继续等新任务（每poll_interval秒查一次），否则队列里没有排队和在审的任务时退出。
+    review_options: 传给run_review的其余参数（api_key、completion、backend、cache_dir等）。
+    返回这个worker完成的任务数。
+    """
+    from review_engine import run_review, shared_review_options
+    from review_store import ReviewStore
+
+    worker_id = worker_id or default_worker_id()
+    queue = WorkQueue(queue_path, lease_seconds=lease_seconds, max_attempts=max_attempts)
+    store_path = review_options.pop("store_path", '') or os.path.join(output_dir, "reviews.sqlite")
+    # 多个进程共用输出目录：断点清单和章节索引都不是多进程安全的，由队列负责重试，LLM缓存照常共用
+    review_options.update(resume=False, index_sections=False, dedup_threshold=None)
+    # 各批次共用一个补全后端、调度器和解析进程池，不必每批重建
+    parse_pool = shared_review_options(review_options)
+    completed = 0
+    try:
+        while True:
+            jobs = queue.claim(worker_id, batch)
+            if not jobs:
+                stats = queue.stats()
+                if not wait and stats[QUEUED] == 0 and stats[LEASED] == 0:
+                    break
+                # 还有别的worker在审（可能会失联、租约过期后回到队列），或者在等新任务
+                time.sleep(poll_interval)
+                continue
+            progress(f"[{worker_id}] claimed {len(jobs)} jobs.")
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=_renew_leases, daemon=True,
+                                         args=(queue, [job["id"] for job in jobs], worker_id, stop,
+                                               lease_seconds / 3))
+            heartbeat.start()
+            try:
+                outcomes = _Outcomes(ReviewStore(store_path))
+                try:
+                    by_domain = {}
+                    for job in jobs:
+                        by_domain.setdefault(job["domain"], []).append(job)
+                    for domain, domain_jobs in by_domain.items():
+                        # 审阅同一批里前面的任务期间，租约过期、被别的worker接手或完成的任务不再审阅
+                        held = queue.held([job["id"] for job in domain_jobs], worker_id)
+                        domain_jobs = [job for job in domain_jobs if job["id"] in held]
+                        if not domain_jobs:
+                            continue
+                        # 每个pdf解析或审阅失败的原因，记进队列库
+                        errors = {}
+                        try:
+                            run_review([job["path"] for job in domain_jobs], domain=domain, output_dir=output_dir,
+                                       store=outcomes, progress=progress, on_failure=errors.__setitem__,
+                                       **review_options)
+                            batch_error = None
+                        except Exception as e:
+                            batch_error = e
+                        for job in domain_jobs:
+                            outcome = outcomes.results.pop(job["source_hash"], None)
+                            if outcome is not None:
+                                queue.complete(job["id"], worker_id, *outcome)
+                                completed += 1
+                            else:
+                                error = errors.get(job["path"]) or batch_error
+                                queue.fail(job["id"], worker_id, "no report was written" if error is None
+                                           else f"{type(error).__name__}: {error}")
+                finally:
+                    outcomes.store.close()
+            finally:
+                stop.set()
+                heartbeat.join()
+    finally:
+        queue.close()
+        parse_pool.shutdown()
+    progress(f"[{worker_id}] finished {completed} jobs.")
+    return completed
+
+
+class _Outcomes:
+    # 交给run_review的review_store：照常写入本地的审阅库，同时按pdf hash记下每篇的 (报告路径, 分数)
+    def __init__(self, store):
+        self.store = store
+        self.results = {}
+
+    def add(self, paper, name, domain, stages, mode="full", report_path=None, totals=None):
+        from review_store import parse_score
+
+        self.store.add(paper, name, domain, stages, mode=mode, report_path=report_path, totals=totals)
+        self.results[paper.source_hash] = (report_path, parse_score(stages.get("conclusion", '')))
+
+
+def _renew_leases(queue, job_ids, worker_id, stop, interval):
+    while not stop.wait(interval):
+        queue.renew(job_ids, worker_id)